@@ -49,10 +49,17 @@ from libs.pascal_voc_io import PascalVocReader
 from libs.yolo_io import YoloReader
 from libs.ustr import ustr
 from libs.version import __version__
-from libs.backendThread import BackendThread
+from libs.backendThread import BackendThread, PackSeriesThread, AnnotationIndexThread
+from libs.labelsCache import makeShapes
+from libs.annotationIndex import AnnotationIndex
+from libs.dirScanner import DirScanner
+from libs.dirWatcher import DirWatcher
+from libs.labelledFrames import LabelledFrames
+from libs.imageSeries import ImageSeries
 from libs.preprocessing import PreprocessThread
 from libs.measureScaleDialog import scaleDialog
 from libs.statisticalReport import NumDensityReporter, TrackReporter
+from libs.trackReport import reportTrack
 
 __appname__ = 'labelSeires'
 
@@ -113,7 +120,7 @@ class MainWindow(QMainWindow, WindowMixin):
         self.usingYoloFormat = False
 
         # For loading all image under a directory
-        self.mImgList = []
+        self.mImgList = ImageSeries()
         self.dirname = None
         self.labelHist = []
         self.defaultLabelHist = []
@@ -123,6 +130,14 @@ class MainWindow(QMainWindow, WindowMixin):
         self.backend_cache = None
         self.currIndex = None   # acompanied by backend always
         self.backend_pre = None
+        self.annotationIndex = None  # of defaultSaveDir, see getAnnotationIndex()
+        self.annotationIndexThread = None  # updating it, see updateAnnotationIndex()
+        self.annotationIndexPending = False  # another update is due when it is done
+        self.labelledFrames = LabelledFrames([])  # frames of mImgList with an annotation
+        self.labelFilter = None  # label the labelled-image navigation goes to, any if None
+        self.saveDirWatcher = DirWatcher()
+        self.saveDirWatcher.changed.connect(self.saveDirChanged)
+        self.showingPreview = False  # the current frame is downscaled until the cache decodes it
 
         # Added by Jerry: used when change the scale
         self.lengthValue = 1
@@ -265,6 +280,9 @@ class MainWindow(QMainWindow, WindowMixin):
         
         openPrevImgWithLabel = action('Prev Labeled Image', self.openPrevImgWithLabel,
                                         'Alt+a', 'prev label', u'Open Prev Label')
+
+        chooseLabelFilter = action('Labeled Image Filter...', self.chooseLabelFilter,
+                                        'Alt+f', None, u'Go only to the images holding a given label, e.g. Broken')
         
         openNextNImg = action('Next n Image', partial(self.openNextImg, n=const.N_NEXT),
                              'Shift+D', 'next n-th image', u'Open Next N')
@@ -376,6 +394,14 @@ class MainWindow(QMainWindow, WindowMixin):
         fianlReport = action('Generate Report', self.generateReport,
                                 tip=u'Generate final report of labels in this dir, and store it as file')
 
+        packSeries = action('Pack Series', self.packSeries,
+                                tip=u'Decode all images of this dir once into a memory-mapped file, which is then read instead of the images')
+
+        self.watchSaveDir = action('Watch Save Dir', self.updateSaveDirWatcher,
+                                tip=u'Update the labels of the save dir as soon as its files are changed by another program',
+                                checkable=True)
+        self.watchSaveDir.setChecked(settings.get(const.SETTING_WATCH_SAVE_DIR, False))
+
         easyTrackReport = action('Easily Track Report', self.generateEasyTrackReport,
                                 tip=u"Generate track report of lables in this dir, and store it as file in a easier way")
 
@@ -455,6 +481,10 @@ class MainWindow(QMainWindow, WindowMixin):
                                 shortcut="C", tip=u'Show preprocessed image',
                                 checkable=True, enabled=False)
         self.showPreprocessed.setChecked(settings.get(const.SETTING_SHOW_PREPROCESS, False))
+        self.rollingBackground = action("Rolling Background", self.toggleRollingBackground,
+                                tip=u'Subtract the background of the neighbouring frames instead of the whole series',
+                                checkable=True)
+        self.rollingBackground.setChecked(settings.get(const.SETTING_ROLLING_BACKGROUND, False))
 
         addActions(self.menus.file,
                    (open_, opendir, changeSavedir, openAnnotation, self.menus.recentFiles, save, save_format, saveAs, close, resetAll, quit_))
@@ -465,16 +495,19 @@ class MainWindow(QMainWindow, WindowMixin):
             labels, advancedMode, None,
             hideAll, showAll, None,
             self.hasObserveWindow, None,
-            self.showPreprocessed, None,
+            self.showPreprocessed, self.rollingBackground, None,
             zoomIn, zoomOut, zoomOrg, None,
             fitWindow, fitWidth, None,
             openPrevImg, openNextImg,
-            openPrevImgWithLabel, openNextImgWithLabel,
+            openPrevImgWithLabel, openNextImgWithLabel, chooseLabelFilter,
             openPrevNImg, openNextNImg))
         addActions(self.menus.data, (
             measureScale, 
             fianlReport,
             easyTrackReport,
+            None,
+            packSeries,
+            self.watchSaveDir,
             ))
 
         self.menus.file.aboutToShow.connect(self.updateFileMenu)
@@ -875,35 +908,9 @@ class MainWindow(QMainWindow, WindowMixin):
         del self.itemsToShapes[item]
 
     def loadLabels(self, shapes):
-        s = []
-        shapeFac = shapeFactory()
-        for shapeType, label, points, line_color, fill_color, difficult in shapes:
-
-            shapeFac.setType(shapeType)
-            shape = shapeFac.getShape()
-            shape.label = label
-            for x, y in points:
-                shape.addPoint(QPointF(x, y))
-            shape.difficult = difficult
-            shape.close()
-            s.append(shape)
-
-            if line_color:
-                shape.line_color = QColor(*line_color)
-            else:
-                shape.line_color = generateColorByText(label)
-
-            if fill_color:
-                shape.fill_color = QColor(*fill_color)
-            else:
-                shape.fill_color = generateColorByText(label)
-
+        s = makeShapes(shapes)
+        for shape in s:
             self.addLabel(shape)
-
-            # update the labels cache
-            if self.backend_cache is not None:  # self.cache and self.currIndex is always interlinked
-                self.backend_cache.labels_cache[self.currIndex] = s
-
         self.canvas.loadShapes(s)
 
     def saveLabels(self, annotationFilePath):
@@ -951,8 +958,8 @@ class MainWindow(QMainWindow, WindowMixin):
     def updateLabelsList(self, annotationFilePath, shapes):
         if self.backend_cache is None:
             return    
-        # index = self.mImgList.index(annotationFilePath + const.JPG_EXT)
-        self.backend_cache.labels_cache[self.currIndex] = shapes
+        # the file is rewritten, its records are parsed again on the next read
+        del self.backend_cache.labels_cache[self.currIndex]
 
     def copySelectedShape(self):
         self.addLabel(self.canvas.copySelectedShape())
@@ -1028,6 +1035,20 @@ class MainWindow(QMainWindow, WindowMixin):
 
     def enablePreprocessedImg(self):
         self.showPreprocessed.setEnabled(True)
+        # the background is refined while it is estimated, show the latest one
+        self.refreshPreprocessedImg()
+
+    def toggleRollingBackground(self):
+        if self.backend_pre is None:
+            return
+        self.backend_pre.setMode(const.PREPROCESS_MODE_ROLLING if self.rollingBackground.isChecked()
+                                 else const.PREPROCESS_MODE_GLOBAL)
+        self.refreshPreprocessedImg()
+
+    def refreshPreprocessedImg(self):
+        if self.showPreprocessed.isChecked() and self.isCurrIndexValid(self.currIndex):
+            self.image = self.backend_pre[self.currIndex]
+            self.canvas.replacePixmap(QPixmap.fromImage(self.image))
 
     def scrollRequest(self, delta, orientation):
         units = - delta / (8 * 15)
@@ -1142,15 +1163,13 @@ class MainWindow(QMainWindow, WindowMixin):
 
         if currIndex is not None:  # DoubleClicked(replace=True), openPrev(), openNext()
             assert self.backend_cache is not None, "only cache can be called by index"
-            # load image and labels
-            image, labels = self.backend_cache[self.currIndex]
+            # load image (or its preview), the labels are read with the annotation file below
+            image = self.backend_cache.preview(self.currIndex)
 
             # show preprocessed img
             if self.showPreprocessed.isChecked():
                 image = self.backend_pre[self.currIndex]
 
-            if labels:
-                self.canvas.loadShapes(labels)
             # load filepath
             filePath = self.mImgList[self.currIndex]
             unicodeFilePath = ustr(filePath)
@@ -1173,7 +1192,14 @@ class MainWindow(QMainWindow, WindowMixin):
         self.status("Loaded %s" % os.path.basename(unicodeFilePath))
         self.image = image
         self.filePath = unicodeFilePath
-        self.canvas.loadPixmap(QPixmap.fromImage(image))
+        pixmap = QPixmap.fromImage(image)
+        fullSize = self.backend_cache.fullSize(self.currIndex) if currIndex is not None else None
+        self.showingPreview = fullSize is not None and image.size() != fullSize
+        if self.showingPreview:  # keep labels in full scale
+            pixmap = pixmap.scaled(fullSize)
+        self.canvas.loadPixmap(pixmap)
+        if self.showingPreview:  # its loaded signal may have come before the preview was shown
+            self.fullFrameLoaded(self.currIndex)
                 
         self.setClean()
         self.canvas.setEnabled(True)
@@ -1212,6 +1238,18 @@ class MainWindow(QMainWindow, WindowMixin):
         self.canvas.setFocus(True)
         return True
 
+    def fullFrameLoaded(self, i):
+        """swap the preview of the current frame for its full resolution, once the cache decoded it"""
+        if (not self.showingPreview or self.backend_cache is None or i != self.currIndex or
+                self.showPreprocessed.isChecked()):
+            return
+        image = self.backend_cache.cache.peek(i)
+        if image is None or image.isNull():
+            return
+        self.showingPreview = False
+        self.image = image
+        self.canvas.replacePixmap(QPixmap.fromImage(image))
+
     def updateLabelFile(self, filename):
         unicodeFilePath = ustr(filename)
         if unicodeFilePath and os.path.exists(unicodeFilePath):
@@ -1295,6 +1333,8 @@ class MainWindow(QMainWindow, WindowMixin):
         settings[const.SETTING_SINGLE_CLASS] = self.singleClassMode.isChecked()
         settings[const.SETTING_OBSERVE_WINDOW] = self.hasObserveWindow.isChecked()
         settings[const.SETTING_SHOW_PREPROCESS] = self.showPreprocessed.isChecked()
+        settings[const.SETTING_ROLLING_BACKGROUND] = self.rollingBackground.isChecked()
+        settings[const.SETTING_WATCH_SAVE_DIR] = self.watchSaveDir.isChecked()
         settings.save()
     ## User Dialogs ##
 
@@ -1304,52 +1344,95 @@ class MainWindow(QMainWindow, WindowMixin):
 
     def scanAllImages(self, folderPath):
         extensions = ['.%s' % fmt.data().decode("ascii").lower() for fmt in QImageReader.supportedImageFormats()]
-        images = []
-
-        for root, dirs, files in os.walk(folderPath):
-            for file in files:
-                if file.lower().endswith(tuple(extensions)):
-                    # add by Jerry
-                    if file in const.OMIT_FILENAME:
-                        continue
-                    relativePath = os.path.join(root, file)
-                    path = ustr(os.path.abspath(relativePath))
-                    images.append(path)
-        images.sort(key=lambda x: x.lower())
-        return images
+        # only the directories changed since the last import are listed again
+        scanner = DirScanner(folderPath, extensions, manifestPath=DirScanner.manifestPathOf(folderPath, 'images'))
+        scanner.scan()
+        try:
+            scanner.save()
+        except OSError:
+            pass
+        # add by Jerry
+        return [ustr(path) for path in scanner.paths() if os.path.basename(path) not in const.OMIT_FILENAME]
     
-    def scanAllXmls(self):
-        def scanAllFiles(folderPath, extensions=['.xml']):
-            if folderPath is None:
-                QMessageBox.information(self, u'notice', '请先选择数据文件存储文件夹 Save Dir')
-                return []
-                # QMessageBox.warning(self,'warning','请先选择数据文件存储文件夹 Save Dir',QMessageBox.Yes|QMessageBox.No,QMessageBox.Yes)
-            if not isinstance(extensions, (list, tuple)):
-                extensions = [extensions]
-            filelist = []
-
-            for root, dirs, files in os.walk(folderPath):
-                for file in files:
-                    if file.lower().endswith(tuple(extensions)):
-                        relativePath = os.path.join(root, file)
-                        path = os.path.abspath(relativePath)
-                        filelist.append(path)
-            filelist.sort(key=lambda x: x.lower())
-            return filelist
-        
-        xmls = scanAllFiles(self.defaultSaveDir)
-        xml2ImgIndices = []
-        mImgBasenameList = [os.path.basename(i) for i in self.mImgList]
-        for xml in xmls:
-            xmlfile = os.path.basename(xml)
-            imgfile = xmlfile[:len(xmlfile)-len(const.XML_EXT)] + const.JPG_EXT
-            try:
-                ind = mImgBasenameList.index(imgfile)
-                xml2ImgIndices.append(ind)
-            except:
-                pass
+    def getAnnotationIndex(self):
+        """the annotation index of defaultSaveDir, None if there is no save dir"""
+        if self.defaultSaveDir is None:
+            return None
+        if self.annotationIndex is None or self.annotationIndex.root != os.path.abspath(self.defaultSaveDir):
+            if self.annotationIndex is not None:
+                if self.annotationIndexThread is not None:
+                    self.annotationIndexThread.wait()  # before closing the index it updates
+                self.annotationIndex.close()
+            self.annotationIndex = AnnotationIndex(self.defaultSaveDir)
+        return self.annotationIndex
+
+    def scanAllXmls(self, update=True):
+        index = self.getAnnotationIndex()
+        if index is None:
+            QMessageBox.information(self, u'notice', '请先选择数据文件存储文件夹 Save Dir')
+            return LabelledFrames(self.mImgList)
+            # QMessageBox.warning(self,'warning','请先选择数据文件存储文件夹 Save Dir',QMessageBox.Yes|QMessageBox.No,QMessageBox.Yes)
+        if update:  # reparses only the files changed on disk since the last scan, on a thread
+            self.updateAnnotationIndex()
+        return LabelledFrames(self.mImgList, index.contents())
+
+    def updateAnnotationIndex(self, dirs=None):
+        """bring the annotation index of the whole save dir, or of `dirs`, up to date on a thread
+
+        The labelled frames are updated once it is done; an update asked for
+        meanwhile runs after it, over the whole save dir.
+        """
+        index = self.getAnnotationIndex()
+        if index is None:
+            return
+        if self.annotationIndexThread is not None and self.annotationIndexThread.isRunning():
+            self.annotationIndexPending = True
+            return
+        self.annotationIndexThread = AnnotationIndexThread(index, dirs)
+        self.annotationIndexThread.updated.connect(self.annotationIndexUpdated)
+        self.annotationIndexThread.start()
+
+    def annotationIndexUpdated(self, index, changed, errors):
+        if index is self.annotationIndex:
+            if changed:
+                self.updateLabelledFrames(changed)
+            self.reportAnnotationErrors(errors)
+            self.updateSaveDirWatcher()
+        if self.annotationIndexPending:
+            self.annotationIndexPending = False
+            self.updateAnnotationIndex()
+
+    def reportAnnotationErrors(self, errors):
+        """tell about the annotation files which could not be parsed, {path: message}"""
+        if errors:
+            path = sorted(errors)[0]
+            self.status(u'%d annotation file(s) cannot be parsed, e.g. %s: %s' % (len(errors), path, errors[path]))
+
+    def updateLabelledFrames(self, xmlPaths):
+        """bring the labelled frames of the changed annotation files up to date"""
+        contents = self.annotationIndex.contents(xmlPaths)
+        for xmlPath in xmlPaths:
+            if xmlPath in contents:
+                self.labelledFrames.set(xmlPath, contents[xmlPath])
+            else:
+                self.labelledFrames.remove(xmlPath)
+
+    def updateSaveDirWatcher(self, _value=False):
+        watched = self.watchSaveDir.isChecked() and self.annotationIndex is not None
+        self.saveDirWatcher.setDirs(self.annotationIndex.dirs() if watched else [])
 
-        return xml2ImgIndices
+    def saveDirChanged(self, dirs):
+        self.updateAnnotationIndex(dirs)  # watches the new subdirectories once done
+
+    def chooseLabelFilter(self, _value=False):
+        anyLabel = u'<any label>'
+        labels = [anyLabel] + self.labelledFrames.labels()
+        current = labels.index(self.labelFilter) if self.labelFilter in labels else 0
+        label, ok = QInputDialog.getItem(self, u'Labeled Image Filter',
+                                         u'Go to the next and previous images holding:', labels, current, False)
+        if ok:
+            self.labelFilter = None if label == anyLabel else label
+            self.status(u'Labeled images: %s' % label)
 
     def changeSavedirDialog(self, _value=False):
         if self.defaultSaveDir is not None:
@@ -1363,6 +1446,8 @@ class MainWindow(QMainWindow, WindowMixin):
 
         if dirpath is not None and len(dirpath) > 1:
             self.defaultSaveDir = dirpath
+            if self.backend_cache is not None:
+                self.backend_cache.labels_cache.setSaveDir(dirpath)
 
         self.statusBar().showMessage('%s . Annotation will be saved to %s' %
                                      ('Change saved folder', self.defaultSaveDir))
@@ -1411,8 +1496,8 @@ class MainWindow(QMainWindow, WindowMixin):
         self.dirname = dirpath
         self.filePath = None
         self.fileListWidget.clear()
-        self.mImgList = self.scanAllImages(dirpath)
-        self.xml2imgList = self.scanAllXmls()
+        self.mImgList = ImageSeries(self.scanAllImages(dirpath))
+        self.labelledFrames = self.scanAllXmls()
         for imgPath in self.mImgList:
             item = QListWidgetItem(imgPath)
             self.fileListWidget.addItem(item)
@@ -1420,12 +1505,20 @@ class MainWindow(QMainWindow, WindowMixin):
         self.currIndex = -1
     
         # connect and start after choosing a dirname
-        self.backend_cache = BackendThread(self.mImgList)
+        if self.backend_cache is not None:
+            self.backend_cache.stop()
+        self.backend_cache = BackendThread(self.mImgList, saveDir=self.defaultSaveDir)
+        self.backend_cache.cache.loaded.connect(self.fullFrameLoaded)
         self.backend_cache.start()
 
         self.showPreprocessed.setEnabled(False)
-        self.backend_pre = PreprocessThread(self.mImgList)
+        if self.backend_pre is not None:
+            self.backend_pre.stop()
+        self.backend_pre = PreprocessThread(self.mImgList, mode=const.PREPROCESS_MODE_ROLLING
+                                            if self.rollingBackground.isChecked() else const.PREPROCESS_MODE_GLOBAL)
         self.backend_pre.backgroundGenerated.connect(self.enablePreprocessedImg)
+        self.backend_pre.backgroundProgress.connect(
+            lambda done, total: self.status("Estimating background: %d/%d" % (done, total)))
         self.backend_pre.start()
 
         self.openNextImg()
@@ -1532,12 +1625,8 @@ class MainWindow(QMainWindow, WindowMixin):
             else:
                 return
         else:                           # seires
-            nextImgIndex = self.currIndex
-            for index in self.xml2imgList:
-                if index > nextImgIndex:
-                    nextImgIndex = index
-                    break
-            if nextImgIndex == self.currIndex:
+            nextImgIndex = self.labelledFrames.next(self.currIndex, label=self.labelFilter)
+            if nextImgIndex is None:
                 return
             if self.isCurrIndexValid(nextImgIndex, replace=True):
                 self.loadFile(currIndex=nextImgIndex)
@@ -1563,12 +1652,8 @@ class MainWindow(QMainWindow, WindowMixin):
             else:
                 return
         else:                           # seires
-            nextImgIndex = self.currIndex
-            for index in reversed(self.xml2imgList):
-                if index < nextImgIndex:
-                    nextImgIndex = index
-                    break
-            if nextImgIndex == self.currIndex:
+            nextImgIndex = self.labelledFrames.prev(self.currIndex, label=self.labelFilter)
+            if nextImgIndex is None:
                 return
             if self.isCurrIndexValid(nextImgIndex, replace=True):
                 self.loadFile(currIndex=nextImgIndex)
@@ -1628,7 +1713,11 @@ class MainWindow(QMainWindow, WindowMixin):
             self.setClean()
             self.statusBar().showMessage('Saved to  %s' % annotationFilePath)
             self.statusBar().show()
-        self.xml2imgList = self.scanAllXmls()
+            if self.usingPascalVocFormat and self.getAnnotationIndex() is not None:
+                if not annotationFilePath.endswith(const.XML_EXT):
+                    annotationFilePath += const.XML_EXT
+                self.annotationIndex.updateFile(annotationFilePath)
+                self.updateLabelledFrames([os.path.abspath(annotationFilePath)])
 
     def closeFile(self, _value=False):
         if not self.mayContinue():
@@ -1722,10 +1811,13 @@ class MainWindow(QMainWindow, WindowMixin):
 
         self.set_format("PascalVOC")
 
-        tVocParseReader = PascalVocReader(xmlPath)
-        shapes = tVocParseReader.getShapes()
+        if self.backend_cache is not None:  # parsed ahead around the current frame
+            shapes, verified = self.backend_cache.labels_cache.read(xmlPath)
+        else:
+            tVocParseReader = PascalVocReader(xmlPath)
+            shapes, verified = tVocParseReader.getShapes(), tVocParseReader.verified
         self.loadLabels(shapes)
-        self.canvas.verified = tVocParseReader.verified
+        self.canvas.verified = verified
 
     def loadYOLOTXTByFilename(self, txtPath):
         if self.filePath is None:
@@ -1772,6 +1864,23 @@ class MainWindow(QMainWindow, WindowMixin):
         self.easyTrackReportGen.finished.connect(partial(QMessageBox.about,self, "Broken Frequency of Droplet Report Done"))
         self.easyTrackReportGen.start()
 
+    def packSeries(self):
+        if self.backend_cache is None or len(self.mImgList) == 0:
+            return
+        self.packSeriesThread = PackSeriesThread(self.mImgList)
+        self.packSeriesThread.progress.connect(
+            lambda done, total: self.status("Packing series: %d/%d" % (done, total)))
+        self.packSeriesThread.packed.connect(self.useFrameStore)
+        self.packSeriesThread.failed.connect(partial(self.errorMessage, u'Error packing series'))
+        self.packSeriesThread.start()
+
+    def useFrameStore(self, frameStore):
+        if self.backend_cache is not None:
+            self.backend_cache.setFrameStore(frameStore)
+        if self.backend_pre is not None:
+            self.backend_pre.frameStore = frameStore
+        self.status("Series packed in %s" % frameStore.dirpath)
+
 
 def inverted(color):
     return QColor(*[255 - v for v in color.getRgb()])
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Tzutalin
+# Create by Jerry Yang <yangjjie94@gmail.com>
+
+import os
+import json
+import sqlite3
+import threading
+import numpy as np
+from libs.annotationLoader import loadAnnotations, parseFile
+from libs.shapeType import shapeTypes
+from libs.dirScanner import DirScanner
+from libs.imageSeries import frameOf
+from libs.geometry import diameters
+import const
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    subdir TEXT,
+    frame INTEGER,
+    mtime_ns INTEGER,
+    size INTEGER,
+    verified INTEGER
+);
+CREATE TABLE IF NOT EXISTS shapes (
+    path TEXT REFERENCES files(path) ON DELETE CASCADE,
+    idx INTEGER,
+    shapeType TEXT,
+    label TEXT,
+    points TEXT,
+    diameter REAL,
+    difficult INTEGER,
+    PRIMARY KEY (path, idx)
+);
+CREATE TABLE IF NOT EXISTS errors (
+    path TEXT PRIMARY KEY REFERENCES files(path) ON DELETE CASCADE,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS shapes_label ON shapes(label);
+CREATE INDEX IF NOT EXISTS shapes_shapeType ON shapes(shapeType);
+"""
+
+TABLE_COLUMNS = ['path', 'subdir', 'frame', 'verified', 'mtime_ns', 'idx', 'shapeType', 'label', 'points',
+                 'diameter', 'difficult']
+
+def subdirOf(xmlPath):
+    """experiment a file belongs to: its path up to the last '_', as the reports group them"""
+    *dir_, _ = xmlPath.split('_')
+    return os.path.basename("_".join(dir_)) if isinstance(dir_, (list, tuple)) else os.path.basename(dir_)
+
+def diametersOf(shapes):
+    """average diameters of the ellipses of `shapes`, [(shapeType, label, points, difficult)], None for the others"""
+    ellipses = [i for i, (shapeType, _, points, _) in enumerate(shapes)
+                if shapeType == shapeTypes.ellipse and len(points) == 4]
+    diameters_ = [None] * len(shapes)
+    if ellipses:
+        for i, diameter in zip(ellipses, diameters(np.stack([shapes[i][2] for i in ellipses])).tolist()):
+            diameters_[i] = diameter
+    return diameters_
+
+def chunked(paths):
+    """`paths` in chunks small enough for an IN clause, [None] for all the paths"""
+    if paths is None:
+        return [None]
+    paths = [os.path.abspath(path) for path in paths]
+    return [paths[i:i + const.ANNOTATION_INDEX_CHUNK] for i in range(0, len(paths), const.ANNOTATION_INDEX_CHUNK)]
+
+
+class AnnotationIndex(object):
+    """SQLite index of every PascalVOC annotation under a save dir.
+
+    Each file is recorded with its mtime and size, and its shapes with their
+    points and, for ellipses, their diameter in pixels. update() reparses only
+    the files which changed since the last call and forgets the deleted ones,
+    so the reports query the database instead of reparsing the directory.
+    A file which cannot be parsed is indexed with the shapes read before the
+    error, and the error is kept until the file is parsed again, see errors().
+    The database lives in the save dir as ANNOTATION_INDEX_FILENAME, and is
+    the manifest of the DirScanner which finds the changes.
+    """
+
+    def __init__(self, root, dbPath=None):
+        self.root = os.path.abspath(root)
+        self.dbPath = dbPath if dbPath is not None else os.path.join(self.root, const.ANNOTATION_INDEX_FILENAME)
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(self.dbPath, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.executescript(SCHEMA)
+        self.scanner = DirScanner(self.root, (const.XML_EXT,), stat=True)
+        self.scanner.seed({path: (mtime, size) for path, mtime, size in
+                           self.db.execute("SELECT path, mtime_ns, size FROM files")})
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def update(self, dirs=None):
+        """bring the index of the whole save dir, or of `dirs` only, in line with the disk
+
+        Returns the paths of the files reparsed or removed; those which cannot
+        be parsed are logged, and listed by errors().
+        """
+        if dirs is not None:
+            dirs = [dirpath for dirpath in dirs if self.contains(dirpath)]
+        with self.lock:
+            added, changed, removed = self.scanner.scan(dirs)
+            scanned = {path: self.scanner.value(path) for path in added + changed}
+        # parsed without the lock, so that the index answers meanwhile; on a process pool when there
+        # are many, e.g. on the first update of a save dir
+        annotations = loadAnnotations(added + changed)
+        with self.lock, self.db:
+            for i, path in enumerate(annotations.files):
+                if self.scanner.value(path) != scanned[path]:
+                    continue  # saved and reindexed by updateFile() while it was parsed here
+                self._index(path, scanned[path], annotations.verified[i], annotations.shapesOf(i),
+                            annotations.errors[i])
+            for path in removed:
+                self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+        return added + changed + removed
+
+    def updateFile(self, path):
+        """reindex the file at `path`, or forget it if it is gone"""
+        path = os.path.abspath(path)
+        if not self.contains(path):
+            return
+        with self.lock, self.db:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+                self.scanner.forget(path)
+                return
+            _, verified, shapes, error = parseFile(path)
+            self._index(path, (stat.st_mtime_ns, stat.st_size), verified, shapes, error)
+            self.scanner.record(path, (stat.st_mtime_ns, stat.st_size))
+
+    def dirs(self):
+        """the directories of the save dir, as the last update found them"""
+        with self.lock:
+            return list(self.scanner.dirs)
+
+    def contains(self, path):
+        path = os.path.abspath(path)
+        return path == self.root or path.startswith(os.path.join(self.root, ''))
+
+    def _index(self, path, stat, verified, shapes, error=None):
+        mtime, size = stat
+        self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+        self.db.execute("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                        (path, subdirOf(path), frameOf(path), mtime, size, int(verified)))
+        if error is not None:
+            print("cannot parse {}: {}".format(path, error))
+            self.db.execute("INSERT INTO errors VALUES (?, ?)", (path, error))
+        rows = [(path, idx, shapeType, label, json.dumps(points.tolist()), diameter, int(difficult))
+                for idx, ((shapeType, label, points, difficult), diameter) in enumerate(zip(shapes, diametersOf(shapes)))]
+        self.db.executemany("INSERT INTO shapes VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def files(self, label=None, shapeType=None):
+        """paths of the indexed files, or of those holding a shape of `label` and `shapeType` if given"""
+        where, args = self._where(label, shapeType)
+        query = ("SELECT DISTINCT f.path FROM files f JOIN shapes s ON s.path = f.path" if where
+                 else "SELECT f.path FROM files f")
+        with self.lock:
+            return [path for path, in self.db.execute(query + where + " ORDER BY f.path COLLATE NOCASE", args)]
+
+    def contents(self, paths=None):
+        """{path: [(label, shapeType)]} of the indexed files, or of those of `paths`"""
+        query = "SELECT f.path, s.label, s.shapeType FROM files f LEFT JOIN shapes s ON s.path = f.path"
+        contents = {}
+        with self.lock:
+            for chunk in chunked(paths):
+                where = "" if chunk is None else " WHERE f.path IN ({})".format(", ".join("?" * len(chunk)))
+                for path, label, shapeType in self.db.execute(query + where, chunk or []):
+                    shapes = contents.setdefault(path, [])
+                    if label is not None:
+                        shapes.append((label, shapeType))
+        return contents
+
+    def shapes(self, label=None, shapeType=None, excludeLabels=None):
+        """(path, subdir, frame, idx, shapeType, label, points, diameter, difficult) ordered by file"""
+        query = ("SELECT f.path, f.subdir, f.frame, s.idx, s.shapeType, s.label, s.points, s.diameter, s.difficult "
+                 "FROM shapes s JOIN files f ON s.path = f.path")
+        where, args = self._where(label, shapeType)
+        if excludeLabels:
+            excludeLabels = list(excludeLabels)
+            where += (" AND " if where else " WHERE ") + \
+                "s.label NOT IN ({})".format(", ".join("?" * len(excludeLabels)))
+            args += excludeLabels
+        with self.lock:
+            rows = self.db.execute(query + where + " ORDER BY f.path COLLATE NOCASE, s.idx", args).fetchall()
+        return [(path, subdir, frame, idx, shapeType_, label_, [tuple(p) for p in json.loads(points)],
+                 diameter, bool(difficult))
+                for path, subdir, frame, idx, shapeType_, label_, points, diameter, difficult in rows]
+
+    def errors(self, paths=None):
+        """{path: message} of the indexed files, or of those of `paths`, which could not be parsed"""
+        errors = {}
+        with self.lock:
+            for chunk in chunked(paths):
+                where = "" if chunk is None else " WHERE path IN ({})".format(", ".join("?" * len(chunk)))
+                errors.update(self.db.execute("SELECT path, message FROM errors" + where, chunk or []))
+        return errors
+
+    def stats(self):
+        """{path: mtime_ns} of the indexed files"""
+        with self.lock:
+            return dict(self.db.execute("SELECT path, mtime_ns FROM files"))
+
+    def table(self, paths=None):
+        """the shapes of the indexed files, or of those of `paths`, as {column: list}
+
+        One row per shape with the metadata of its file, see TABLE_COLUMNS;
+        the files without a frame number have frame -1 and the shapes which
+        are not ellipses a NaN diameter.
+        """
+        query = ("SELECT f.path, f.subdir, f.frame, f.verified, f.mtime_ns, s.idx, s.shapeType, s.label, s.points, "
+                 "s.diameter, s.difficult FROM shapes s JOIN files f ON s.path = f.path")
+        table = {column: [] for column in TABLE_COLUMNS}
+        columns = [table[column] for column in TABLE_COLUMNS]
+        with self.lock:
+            for chunk in chunked(paths):
+                where = "" if chunk is None else " WHERE f.path IN ({})".format(", ".join("?" * len(chunk)))
+                for row in self.db.execute(query + where + " ORDER BY f.path COLLATE NOCASE, s.idx", chunk or []):
+                    for column, value in zip(columns, row):
+                        column.append(value)
+        table['frame'] = [-1 if frame is None else frame for frame in table['frame']]
+        table['verified'] = [bool(verified) for verified in table['verified']]
+        table['points'] = [[tuple(p) for p in json.loads(points)] for points in table['points']]
+        table['diameter'] = [float('nan') if diameter is None else diameter for diameter in table['diameter']]
+        table['difficult'] = [bool(difficult) for difficult in table['difficult']]
+        return table
+
+    def _where(self, label, shapeType):
+        clauses, args = [], []
+        if label is not None:
+            clauses.append("s.label = ?")
+            args.append(label)
+        if shapeType is not None:
+            clauses.append("s.shapeType = ?")
+            args.append(shapeType)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+    @staticmethod
+    def open(root):
+        """index of `root`, brought up to date"""
+        index = AnnotationIndex(root)
+        index.update()
+        return index
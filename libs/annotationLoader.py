@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Tzutalin
+# Create by Jerry Yang <yangjjie94@gmail.com>
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+
+import libs.constants
+import const
+from libs.pascal_voc_io import PascalVocStreamReader, PascalVocParseError
+from libs.dirScanner import DirScanner
+
+def parseFile(path):
+    """(path, verified, shapes, error) of one annotation file
+
+    The shapes read before a parse error are kept, as PascalVocReader does.
+    """
+    reader = PascalVocStreamReader(path)
+    shapes = []
+    error = None
+    try:
+        for shape in reader:
+            shapes.append(shape)
+    except PascalVocParseError as e:
+        error = str(e)
+    return path, reader.verified, shapes, error
+
+def parseChunk(paths):
+    return [parseFile(path) for path in paths]
+
+
+class Annotations(object):
+    """The shapes of many annotation files, column by column.
+
+    The per file columns (files, verified, errors) are in the order the files
+    were given; the per shape columns (fileIndex, idx, shapeType, label,
+    points, difficult) follow that order, the shapes of file i being those
+    in offsets[i]:offsets[i + 1].
+    """
+
+    def __init__(self):
+        self.files = []
+        self.verified = []
+        self.errors = []
+        self.offsets = [0]
+        self.fileIndex = []
+        self.idx = []
+        self.shapeType = []
+        self.label = []
+        self.points = []
+        self.difficult = []
+
+    def add(self, path, verified, shapes, error=None):
+        i = len(self.files)
+        self.files.append(path)
+        self.verified.append(verified)
+        self.errors.append(error)
+        for idx, (shapeType, label, points, difficult) in enumerate(shapes):
+            self.fileIndex.append(i)
+            self.idx.append(idx)
+            self.shapeType.append(shapeType)
+            self.label.append(label)
+            self.points.append(points)
+            self.difficult.append(difficult)
+        self.offsets.append(len(self.label))
+
+    def finish(self):
+        self.verified = np.array(self.verified, dtype=bool)
+        self.offsets = np.array(self.offsets, dtype=np.int64)
+        self.fileIndex = np.array(self.fileIndex, dtype=np.int64)
+        self.idx = np.array(self.idx, dtype=np.int64)
+        self.difficult = np.array(self.difficult, dtype=bool)
+        return self
+
+    def __len__(self):
+        return len(self.label)
+
+    def shapesOf(self, i):
+        """[(shapeType, label, points, difficult)] of the i-th file"""
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return list(zip(self.shapeType[start:stop], self.label[start:stop],
+                        self.points[start:stop], self.difficult[start:stop]))
+
+    def failed(self):
+        return [(path, error) for path, error in zip(self.files, self.errors) if error is not None]
+
+    def toDataFrame(self):
+        import pandas as pd
+        return pd.DataFrame({
+            'path': [self.files[i] for i in self.fileIndex],
+            'idx': self.idx,
+            'label': self.label,
+            'shapeType': self.shapeType,
+            'points': self.points,
+            'difficult': self.difficult}, columns=['path', 'idx', 'label', 'shapeType', 'points', 'difficult'])
+
+
+def annotationPaths(source):
+    """the annotation files under the directory `source`, or the paths of `source` as given"""
+    if isinstance(source, str):
+        scanner = DirScanner(source, (const.XML_EXT,))
+        scanner.scan()
+        return scanner.paths()
+    return list(source)
+
+def loadAnnotations(source, workers=None, chunkSize=const.ANNOTATION_LOAD_CHUNK, threads=False):
+    """parse the annotation files of a directory, or a list of them, into Annotations
+
+    The files are parsed in chunks of `chunkSize` on a pool of `workers`
+    processes (threads if `threads`), the results are gathered in the order
+    of the files. A single chunk, or workers=1, is parsed in this process.
+    The processes are started by ANNOTATION_LOAD_START_METHOD, spawned rather
+    than forked, as a fork of the GUI, which runs many threads, may deadlock.
+    """
+    paths = annotationPaths(source)
+    chunks = [paths[i:i + chunkSize] for i in range(0, len(paths), chunkSize)]
+    if workers == 1 or len(chunks) <= 1:
+        return gather(map(parseChunk, chunks))
+    if threads:
+        executor = ThreadPoolExecutor(max_workers=workers)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers,
+                                       mp_context=multiprocessing.get_context(const.ANNOTATION_LOAD_START_METHOD))
+    with executor:
+        # map yields the chunks in order, whichever worker finished first
+        return gather(executor.map(parseChunk, chunks))
+
+def gather(results):
+    annotations = Annotations()
+    for result in results:
+        for parsed in result:
+            annotations.add(*parsed)
+    return annotations.finish()
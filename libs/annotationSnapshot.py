@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Tzutalin
+# Create by Jerry Yang <yangjjie94@gmail.com>
+
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    SNAPSHOT_FORMAT = 'parquet'
+except ImportError:
+    SNAPSHOT_FORMAT = 'npz'
+
+import const
+from libs.annotationIndex import AnnotationIndex, TABLE_COLUMNS
+
+DTYPES = {'frame': np.int64, 'verified': bool, 'mtime_ns': np.int64, 'idx': np.int64,
+          'diameter': np.float64, 'difficult': bool}
+
+def tableToDataFrame(table):
+    df = pd.DataFrame(table, columns=TABLE_COLUMNS)
+    return df.astype(DTYPES)
+
+
+class AnnotationSnapshot(object):
+    """Every shape of a save dir in one columnar file, for the reports to load at once.
+
+    One row per shape, with the columns of AnnotationIndex.table(): the file,
+    experiment and frame it belongs to, its points and, for an ellipse, its
+    diameter. It is written as Parquet when pyarrow is there, else as .npz,
+    beside the annotation index. refresh() rereads from the index only the
+    files whose mtime is not the one in the snapshot, and rewrites it only
+    when something changed.
+    """
+
+    def __init__(self, root, format=SNAPSHOT_FORMAT):
+        self.root = os.path.abspath(root)
+        self.format = format
+        self.path = os.path.join(self.root, "{}.{}".format(const.ANNOTATION_SNAPSHOT_FILENAME, format))
+
+    def load(self):
+        """the snapshot as a DataFrame, None if there is none yet"""
+        if not os.path.isfile(self.path):
+            return None
+        if self.format == 'parquet':
+            df = pd.read_parquet(self.path)
+            df['points'] = [[tuple(point) for point in points] for points in df['points']]
+            return df
+        with np.load(self.path) as data:
+            table = {column: data[column].tolist() for column in TABLE_COLUMNS if column != 'points'}
+            coords, offsets = data['coords'].tolist(), data['offsets']
+        table['points'] = [[tuple(point) for point in coords[start:stop]]
+                           for start, stop in zip(offsets[:-1], offsets[1:])]
+        return tableToDataFrame(table)
+
+    def save(self, df):
+        fd, tmp_path = tempfile.mkstemp(suffix='.' + self.format, dir=self.root)
+        os.close(fd)
+        if self.format == 'parquet':
+            df.to_parquet(tmp_path, index=False)
+        else:
+            # the points of all the shapes one after another, those of row i in coords[offsets[i]:offsets[i + 1]]
+            offsets = np.zeros(len(df) + 1, dtype=np.int64)
+            np.cumsum([len(points) for points in df['points']], out=offsets[1:])
+            coords = np.array([point for points in df['points'] for point in points]).reshape(-1, 2)
+            columns = {column: df[column].to_numpy(dtype=str if df[column].dtype.kind not in 'biuf' else None)
+                       for column in TABLE_COLUMNS if column != 'points'}
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, coords=coords, offsets=offsets, **columns)
+        os.replace(tmp_path, self.path)
+
+    def refresh(self, index):
+        """the snapshot brought in line with `index`, an up to date AnnotationIndex of the save dir"""
+        df = self.load()
+        if df is None:
+            df = tableToDataFrame(index.table())
+            self.save(df)
+            return df
+
+        stats = index.stats()
+        known = dict(zip(df['path'], df['mtime_ns']))
+        # the files without shapes have no row, they are looked up again but cost nothing to rewrite
+        changed = [path for path, mtime in stats.items() if known.get(path) != mtime]
+        stale = set(path for path in changed if path in known) | set(path for path in known if path not in stats)
+        fresh = tableToDataFrame(index.table(changed)) if changed else tableToDataFrame({})
+        if not stale and len(fresh) == 0:
+            return df
+
+        df = pd.concat([df[~df['path'].isin(stale)], fresh], ignore_index=True)
+        df = df.sort_values(['path', 'idx'], key=lambda column: column.str.lower() if column.name == 'path' else column)
+        df = df.reset_index(drop=True)
+        self.save(df)
+        return df
+
+    @staticmethod
+    def open(root):
+        """the shapes under `root` as a DataFrame, from the snapshot brought up to date"""
+        index = AnnotationIndex.open(root)
+        try:
+            return AnnotationSnapshot(root).refresh(index)
+        finally:
+            index.close()
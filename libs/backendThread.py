@@ -5,18 +5,24 @@
 # Create by Jerry Yang <yangjjie94@gmail.com>
 
 from PyQt5.QtCore import QThread, pyqtSignal
-from libs.cache import Cache
+from libs.cache import Cache, PreviewCache
 from libs.labelsCache import LabelsCache
+from libs.diskCache import DiskCache
+from libs.frameStore import FrameStore, FrameStoreError
+from libs.imageSeries import ImageSeries
 
 class BackendThread(QThread):
     
-    def __init__(self, imgList):
+    def __init__(self, imgList, saveDir=None):
         super(BackendThread, self).__init__()
         if imgList is None or len(imgList) == 0:
             return None
-        self.imgPathList = imgList
-        self.cache = Cache(self.imgPathList)
-        self.labels_cache = LabelsCache(self.imgPathList)
+        self.imgPathList = ImageSeries.of(imgList)
+        self.diskCache = DiskCache()
+        self.frameStore = FrameStore.open(self.imgPathList)
+        self.cache = Cache(self.imgPathList, diskCache=self.diskCache, frameStore=self.frameStore)
+        self.previews = PreviewCache(self.imgPathList, diskCache=self.diskCache, frameStore=self.frameStore)
+        self.labels_cache = LabelsCache(self.imgPathList, saveDir=saveDir)
         self.i = 0
         self._stop = False
 
@@ -26,6 +32,17 @@ class BackendThread(QThread):
     def __getitem__(self,i):
         return (self.cache[i], self.labels_cache[i])
 
+    def preview(self, i):
+        """the full frame if it is cached already, else its downscaled preview"""
+        self.labels_cache.moveTo(i)
+        if i in self.cache:
+            return self.cache[i]
+        self.cache.moveTo(i)
+        return self.previews[i]
+
+    def fullSize(self, i):
+        return self.previews.fullSize(i)
+
     def get(self, filepath=None, currIndex=None):
         if filepath is not None:
             try:
@@ -35,15 +52,55 @@ class BackendThread(QThread):
             else:
                 return (self.cache[index], self.labels_cache[index])
         elif currIndex is not None:
-            return (self.cache[currIndex], self.labels_cache[index])
+            return (self.cache[currIndex], self.labels_cache[currIndex])
         else:
             return None
 
+    def setFrameStore(self, frameStore):
+        self.frameStore = frameStore
+        self.cache.frameStore = frameStore
+        self.previews.frameStore = frameStore
+
     def run(self):
+        self.previews.start()
         self.cache.start()
         self.labels_cache.start()
 
 
     def stop(self):
+        self.previews.stop()
         self.cache.stop()
         self.labels_cache.stop()
+
+
+class PackSeriesThread(QThread):
+    """decodes a series into its FrameStore"""
+    progress = pyqtSignal(int, int)
+    packed = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, imgList):
+        super(PackSeriesThread, self).__init__()
+        self.imgPathList = imgList
+
+    def run(self):
+        try:
+            frameStore = FrameStore.pack(self.imgPathList, progress=self.progress.emit)
+        except (FrameStoreError, OSError) as e:
+            self.failed.emit(str(e))
+            return
+        self.packed.emit(frameStore)
+
+
+class AnnotationIndexThread(QThread):
+    """brings an AnnotationIndex up to date, the whole save dir or `dirs` only, off the GUI thread"""
+    updated = pyqtSignal(object, list, dict)  # the index, the paths reparsed or removed, {path: parse error}
+
+    def __init__(self, index, dirs=None):
+        super(AnnotationIndexThread, self).__init__()
+        self.index = index
+        self.dirs = dirs
+
+    def run(self):
+        changed = self.index.update(self.dirs)
+        self.updated.emit(self.index, changed, self.index.errors(changed))
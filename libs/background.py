@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Tzutalin
+# Create by Jerry Yang <yangjjie94@gmail.com>
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import const
+
+class MeanBackground(object):
+    """average of the frames"""
+    chronological = False
+
+    def __init__(self, n_frames):
+        self.sum = None
+        self.count = 0
+
+    def update(self, frame):
+        if self.sum is None:
+            self.sum = np.zeros(frame.shape, dtype=np.int64)
+        self.sum += frame
+        self.count += 1
+
+    def estimate(self):
+        return (self.sum / self.count).astype(np.float32) if self.count else None
+
+
+class MedianBackground(object):
+    """pixelwise median of at most `samples` frames spread over the series
+
+    Droplets crossing a pixel in less than half of the sampled frames do not
+    show in the median, unlike in the mean.
+    """
+    chronological = False
+
+    def __init__(self, n_frames, samples=const.BACKGROUND_MEDIAN_SAMPLES):
+        self.n_frames = n_frames
+        self.samples = min(samples, n_frames)
+        self.stack = None
+        self.count = 0
+
+    def wants(self, i):
+        return i * self.samples // self.n_frames != (i + 1) * self.samples // self.n_frames
+
+    def update(self, frame):
+        if self.stack is None:
+            self.stack = np.empty((self.samples,) + frame.shape, dtype=np.uint8)
+        if self.count < self.samples:
+            self.stack[self.count] = frame
+            self.count += 1
+
+    def estimate(self):
+        return np.median(self.stack[:self.count], axis=0).astype(np.float32) if self.count else None
+
+
+class RunningBackground(object):
+    """exponential moving average, weighting the latest frames by `alpha`"""
+    chronological = True
+
+    def __init__(self, n_frames, alpha=const.BACKGROUND_RUNNING_ALPHA):
+        self.alpha = alpha
+        self.background = None
+
+    def update(self, frame):
+        if self.background is None:
+            self.background = frame.astype(np.float32)
+        else:
+            cv2.accumulateWeighted(frame, self.background, self.alpha)
+
+    def estimate(self):
+        return self.background.copy() if self.background is not None else None
+
+
+class RollingWindow(object):
+    """the sum of the frames [lo, hi) of a series, slid along it by moveTo
+
+    The frames up to `margin` beyond either end are kept as well, so that
+    a window going back and forth by a few frames reads none again.
+    """
+
+    def __init__(self, margin=const.BACKGROUND_ROLLING_MARGIN):
+        self.margin = margin
+        self.frames = {}  # the frames in the window and in its margins, by index
+        self.sum = None
+        self.used = 0  # when it was last taken, see RollingBackground.at
+        self.lo, self.hi = 0, 0
+
+    def cost(self, lo, hi):
+        """number of frames to read to move the window to [lo, hi)"""
+        if self.sum is None:
+            return hi - lo
+        return sum(1 for j in range(lo, hi) if j not in self.frames)
+
+    def moveTo(self, lo, hi, load):
+        if self.sum is None or hi <= self.lo or lo >= self.hi:
+            leaving, entering = range(self.lo, self.hi), range(lo, hi)
+        else:
+            leaving = list(range(self.lo, lo)) + list(range(hi, self.hi))
+            entering = list(range(lo, self.lo)) + list(range(self.hi, hi))
+        try:
+            for j in leaving:
+                if self.sum is not None:
+                    self.sum -= self.frames[j]
+            for j in entering:
+                frame = self.frames.get(j)
+                if frame is None:
+                    frame = self.frames[j] = load(j)
+                if self.sum is None:
+                    self.sum = np.zeros(frame.shape, dtype=np.int32)
+                self.sum += frame
+        except Exception:
+            self.__init__(self.margin)  # a frame which cannot be read leaves the window empty, not wrong
+            raise
+        self.lo, self.hi = lo, hi
+        self.prune()
+
+    def prune(self):
+        for j in [j for j in self.frames if j < self.lo - self.margin or j >= self.hi + self.margin]:
+            del self.frames[j]
+
+
+class RollingBackground(object):
+    """mean of the `window` frames around each frame, kept as running sums
+
+    Going to a neighbouring frame adds the frames entering the window to the
+    sum and subtracts the ones leaving it, so stepping through the series
+    costs O(H*W) per frame instead of O(window*H*W). The frames are asked
+    for out of order by the workers prefetching ahead of and behind the
+    user, so there are `cursors` windows, each call sliding the one nearest
+    to the frame; a frame far from all of them rebuilds the least recently
+    used.
+    `load(i)` returns frame i and is called without any lock held, so that
+    the workers decode in parallel.
+    Each window holds up to window + 2 * margin frames and its sum. To stay
+    within `budget` (bytes, unbounded if None), windows are dropped, down to
+    a single one, and the margins narrowed once the first frame tells their
+    size.
+    """
+
+    def __init__(self, load, n_frames, window=const.BACKGROUND_ROLLING_WINDOW,
+                 cursors=const.BACKGROUND_ROLLING_CURSORS, budget=None):
+        self.load = load
+        self.n_frames = n_frames
+        self.window = max(1, min(window, n_frames))
+        self.cursors = [RollingWindow() for _ in range(max(1, cursors))]
+        self.idle = list(self.cursors)
+        self.uses = 0
+        self.condition = threading.Condition()
+        self.budget = budget
+        self.maxCursors = len(self.cursors)  # lowered by fit()
+        self.fitted = budget is None
+
+    def bounds(self, i):
+        lo = min(max(i - self.window // 2, 0), self.n_frames - self.window)
+        return lo, lo + self.window
+
+    def nbytes(self, cursors, margin, frameBytes, sumBytes):
+        """memory held by `cursors` windows, full and with `margin` frames beyond either end"""
+        return cursors * ((self.window + 2 * margin) * frameBytes + sumBytes)
+
+    def fit(self, cursor):
+        """narrow the margins and drop windows to stay within the budget, from the frames of `cursor`"""
+        frameBytes = next(iter(cursor.frames.values())).nbytes
+        sumBytes = cursor.sum.nbytes
+        cursors = len(self.cursors)
+        while cursors > 1 and self.nbytes(cursors, 0, frameBytes, sumBytes) > self.budget:
+            cursors -= 1
+        margin = cursor.margin
+        while margin > 0 and self.nbytes(cursors, margin, frameBytes, sumBytes) > self.budget:
+            margin -= 1
+        for each in self.cursors:
+            each.margin = margin
+        for each in self.idle + [cursor]:  # the busy ones prune when they are done moving
+            each.prune()
+        self.maxCursors = cursors
+        for each in [each for each in self.idle if each.sum is None][:len(self.cursors) - cursors]:
+            self.idle.remove(each)
+            self.cursors.remove(each)
+        self.fitted = True
+
+    def clear(self):
+        """free the frames of the windows not in use"""
+        with self.condition:
+            for cursor in self.idle:
+                cursor.__init__(cursor.margin)
+
+    def at(self, i):
+        lo, hi = self.bounds(i)
+        with self.condition:
+            # the nearest window, waited for when it is busy and no idle one is as near; for a frame far
+            # from every window, the least recently used one is rebuilt rather than pulled to and fro
+            while True:
+                cost = min(cursor.cost(lo, hi) for cursor in self.cursors)
+                if cost > self.window // 4 and self.idle:
+                    cursor = min(self.idle, key=lambda cursor: cursor.used)
+                    break
+                nearest = [cursor for cursor in self.idle if cursor.cost(lo, hi) == cost]
+                if nearest:
+                    cursor = nearest[0]
+                    break
+                self.condition.wait()
+            self.idle.remove(cursor)
+            self.uses += 1
+            cursor.used = self.uses
+        try:
+            cursor.moveTo(lo, hi, self.load)
+            return (cursor.sum / float(self.window)).astype(np.float32)
+        finally:
+            with self.condition:
+                if not self.fitted and cursor.sum is not None:
+                    self.fit(cursor)
+                if len(self.cursors) > self.maxCursors:
+                    self.cursors.remove(cursor)
+                else:
+                    self.idle.append(cursor)
+                self.condition.notify_all()
+
+
+ESTIMATORS = {
+    'mean': MeanBackground,
+    'median': MedianBackground,
+    'running': RunningBackground,
+}
+
+def coarseToFine(n):
+    """range(n) ordered so that every prefix is spread over the whole range"""
+    order = []
+    seen = np.zeros(n, dtype=bool)
+    step = 1 << max(n - 1, 1).bit_length()
+    while step >= 1:
+        for i in range(0, n, step):
+            if not seen[i]:
+                seen[i] = True
+                order.append(i)
+        step //= 2
+    return order
+
+def imapBounded(executor, fn, items, window):
+    """executor.map which runs at most `window` items ahead of the consumer"""
+    futures = deque()
+    for item in items:
+        futures.append(executor.submit(fn, item))
+        if len(futures) >= window:
+            yield futures.popleft().result()
+    while futures:
+        yield futures.popleft().result()
+
+def estimateBackground(imgList, method=const.PREPROSSESS_BACKGROUND_METHOD, length=const.PREPROSSESS_BACKGROUND_LENGTH,
+                       imread_format=const.IMREAD_FORMAT, workers=const.CACHE_WORKERS, frameStore=None,
+                       progress=None, refine=None):
+    """background of the first `length` frames of `imgList`
+
+    Frames are decoded on `workers` threads, or read from `frameStore`.
+    progress(done, total) is called as frames are read and refine(background)
+    every BACKGROUND_REFINE_STEP frames with the estimate so far; unless the
+    method needs the frames in order, they are read coarse to fine, so that
+    the first estimates already cover the whole range.
+    """
+    n_frames = min(length, len(imgList))
+    estimator = ESTIMATORS[method](n_frames)
+    indices = range(n_frames) if estimator.chronological else coarseToFine(n_frames)
+    if hasattr(estimator, 'wants'):
+        indices = [i for i in indices if estimator.wants(i)]
+
+    def load(i):
+        if frameStore is not None:
+            return frameStore[i]
+        return cv2.imread(imgList[i], imread_format)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for done, frame in enumerate(imapBounded(executor, load, indices, 2 * workers), 1):
+            if frame is not None:
+                estimator.update(frame)
+            if progress is not None:
+                progress(done, len(indices))
+            if refine is not None and done % const.BACKGROUND_REFINE_STEP == 0 and done < len(indices):
+                refine(estimator.estimate())
+    return estimator.estimate()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Tzutalin
+# Create by Jerry Yang <yangjjie94@gmail.com>
+
+"""Preprocess a whole image series without the GUI.
+
+Subtracts the background from every frame and equalizes its histogram, as
+"Show Preprocessed Image" does, on a process pool, and writes the processed
+frames beside the originals or packs them into a FrameStore:
+
+    python -m libs.batchPreprocess DIR [--out OUT] [--mode rolling] [--pack]
+"""
+
+import os
+import sys
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+import numpy as np
+
+import libs.constants
+import const
+from libs.background import estimateBackground, RollingBackground
+
+def scanAllImages(folderPath, omit=()):
+    images = []
+    for root, dirs, files in os.walk(folderPath):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) not in omit]
+        for file in files:
+            if file.lower().endswith(const.IMAGE_EXTS) and file not in const.OMIT_FILENAME:
+                images.append(os.path.abspath(os.path.join(root, file)))
+    images.sort(key=lambda x: x.lower())
+    return images
+
+# state of a worker process, set once by initWorker instead of pickled with every chunk
+_worker = {}
+
+def initWorker(imgList, background, beta, mode, window, imread_format, rootDir, outDir, packPath, shape, chunkSize):
+    _worker.update(imgList=imgList, beta=beta, mode=mode, imread_format=imread_format,
+                   rootDir=rootDir, outDir=outDir, packPath=packPath, shape=shape, chunkSize=chunkSize)
+    _worker['scaledBackground'] = (np.multiply(background, beta, dtype=np.float32)
+                                   if background is not None else None)
+    # one window for all the chunks of the worker, slid from one frame to the next
+    _worker['rolling'] = (RollingBackground(load, len(imgList), window=window, cursors=1)
+                          if mode == const.PREPROCESS_MODE_ROLLING else None)
+
+def load(i):
+    return cv2.imread(_worker['imgList'][i], _worker['imread_format'])
+
+def processSpan(start, stop):
+    """preprocesses frames [start, stop) chunk by chunk, returns the number of frames"""
+    for chunkStart in range(start, stop, _worker['chunkSize']):
+        processChunk(chunkStart, min(chunkStart + _worker['chunkSize'], stop))
+    return stop - start
+
+def processChunk(start, stop):
+    """preprocesses frames [start, stop) and writes them"""
+    frames = np.stack([load(i) for i in range(start, stop)])
+    if _worker['rolling'] is not None:
+        backgrounds = np.stack([_worker['rolling'].at(i) for i in range(start, stop)])
+        backgrounds *= _worker['beta']
+    else:
+        backgrounds = _worker['scaledBackground']
+    # subtraction of the whole chunk at once, then one histogram per frame
+    result = np.abs(np.subtract(frames, backgrounds, dtype=np.float32)).astype(np.uint8)
+    for k in range(len(result)):
+        result[k] = cv2.equalizeHist(result[k])
+
+    if _worker['packPath'] is not None:
+        packed = np.memmap(_worker['packPath'], dtype=np.uint8, mode='r+', shape=_worker['shape'])
+        packed[start:stop] = result
+        packed.flush()
+        del packed
+    else:
+        for k, i in enumerate(range(start, stop)):
+            cv2.imwrite(outputPath(_worker['imgList'][i], _worker['rootDir'], _worker['outDir']), result[k])
+
+def outputPath(imgPath, rootDir, outDir):
+    """path of the processed image, relative to outDir as imgPath is to rootDir"""
+    path = os.path.join(outDir, os.path.relpath(imgPath, rootDir))
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+def preprocessSeries(dirpath, outDir=None, mode=const.PREPROCESS_MODE_GLOBAL,
+                     method=const.PREPROSSESS_BACKGROUND_METHOD, beta=const.PREPROSSESS_BACKGROUND_BETA,
+                     window=const.BACKGROUND_ROLLING_WINDOW, pack=False, workers=None,
+                     chunkSize=const.BATCH_CHUNK_SIZE, imread_format=const.IMREAD_FORMAT, progress=None):
+    """preprocesses every image under `dirpath` into `outDir`, returns the output dir"""
+    if outDir is None:
+        # beside the series rather than in it, where labelSeries would scan the processed frames too
+        outDir = os.path.normpath(dirpath) + const.BATCH_OUTPUT_SUFFIX
+    imgList = scanAllImages(dirpath, omit=(os.path.abspath(outDir),))
+    if len(imgList) == 0:
+        raise ValueError("no image in {}".format(dirpath))
+    if not os.path.isdir(outDir):
+        os.makedirs(outDir)
+
+    background = None
+    if mode == const.PREPROCESS_MODE_GLOBAL:
+        backgroundFilePath = os.path.join(os.path.dirname(imgList[0]), const.BACKGROUND_FILENAME)
+        if os.path.exists(backgroundFilePath):
+            background = cv2.imread(backgroundFilePath, imread_format)
+        if background is None:
+            background = estimateBackground(imgList, method=method, imread_format=imread_format)
+            cv2.imwrite(backgroundFilePath, background)
+
+    first = cv2.imread(imgList[0], imread_format)
+    shape = (len(imgList),) + first.shape
+    packPath = None
+    if pack:
+        packPath = os.path.join(outDir, const.FRAME_STORE_FILENAME)
+        np.memmap(packPath, dtype=np.uint8, mode='w+', shape=shape).flush()
+
+    spanSize = chunkSize
+    if mode == const.PREPROCESS_MODE_ROLLING:
+        # a span of frames a task, longer than a chunk, so that the window of a worker is built once a span
+        spans = (workers or os.cpu_count() or 1) * const.BATCH_ROLLING_SPANS
+        spanSize = max(chunkSize, -(-len(imgList) // spans))
+    spans = [(start, min(start + spanSize, len(imgList))) for start in range(0, len(imgList), spanSize)]
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=initWorker,
+                             initargs=(imgList, background, beta, mode, window, imread_format,
+                                       os.path.abspath(dirpath), outDir, packPath, shape, chunkSize)) as executor:
+        futures = [executor.submit(processSpan, start, stop) for start, stop in spans]
+        for future in as_completed(futures):
+            done += future.result()
+            if progress is not None:
+                progress(done, len(imgList))
+
+    if pack:
+        frames = []
+        for filepath in imgList:
+            stat = os.stat(filepath)
+            frames.append([os.path.relpath(filepath, outDir), stat.st_mtime_ns, stat.st_size])
+        with open(os.path.join(outDir, const.FRAME_STORE_INDEX), 'w') as f:
+            json.dump({'shape': shape, 'dtype': 'uint8', 'frames': frames}, f)
+    return outDir
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Preprocess an image series (background subtraction "
+                                                 "and histogram equalization) without the GUI.")
+    parser.add_argument('dir', help="directory of the image series")
+    parser.add_argument('--out', default=None,
+                        help="output directory, default: DIR{}".format(const.BATCH_OUTPUT_SUFFIX))
+    parser.add_argument('--mode', default=const.PREPROCESS_MODE_GLOBAL,
+                        choices=[const.PREPROCESS_MODE_GLOBAL, const.PREPROCESS_MODE_ROLLING])
+    parser.add_argument('--method', default=const.PREPROSSESS_BACKGROUND_METHOD,
+                        choices=['mean', 'median', 'running'], help="estimator of the global background")
+    parser.add_argument('--beta', type=float, default=const.PREPROSSESS_BACKGROUND_BETA)
+    parser.add_argument('--window', type=int, default=const.BACKGROUND_ROLLING_WINDOW,
+                        help="frames of the rolling background")
+    parser.add_argument('--pack', action='store_true',
+                        help="write one memory-mapped array ({}) instead of images".format(const.FRAME_STORE_FILENAME))
+    parser.add_argument('--workers', type=int, default=None, help="processes, default: one per core")
+    parser.add_argument('--chunk', type=int, default=const.BATCH_CHUNK_SIZE, help="frames processed at once")
+    args = parser.parse_args(argv)
+
+    def progress(done, total):
+        sys.stderr.write("\rpreprocessed {}/{}".format(done, total))
+        sys.stderr.flush()
+
+    outDir = preprocessSeries(args.dir, outDir=args.out, mode=args.mode, method=args.method, beta=args.beta,
+                              window=args.window, pack=args.pack, workers=args.workers,
+                              chunkSize=args.chunk, progress=progress)
+    sys.stderr.write("\n")
+    print(outDir)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Tzutalin
+# Create by Jerry Yang <yangjjie94@gmail.com>
+
+from collections import defaultdict
+import numpy as np
+
+from libs.geometry import boxesOverlap
+
+class BoxGrid(object):
+    """Uniform grid over axis-aligned boxes (x1, y1, x2, y2), to find the ones a box overlaps.
+
+    Each box is put in the cells it covers, so a query looks only at the
+    boxes of the cells the queried box covers, then keeps those which do
+    overlap it. The cells are as large as the median box by default, so that
+    most boxes cover a few cells and a cell holds a few boxes; the few boxes
+    covering more than MAX_CELLS cells are kept aside and tested every time.
+    """
+    MAX_CELLS = 64
+
+    def __init__(self, boxes, cellSize=None):
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if cellSize is None:
+            sizes = np.maximum(self.boxes[:, 2] - self.boxes[:, 0], self.boxes[:, 3] - self.boxes[:, 1])
+            sizes = sizes[np.isfinite(sizes)]
+            cellSize = float(np.median(sizes)) if len(sizes) else 1.
+        self.cellSize = max(cellSize, 1e-9)
+        self.cells = defaultdict(list)
+        self.large = []
+        finite = np.isfinite(self.boxes).all(axis=1)  # a degenerate shape has NaN bounds and overlaps nothing
+        for i, (cx1, cy1, cx2, cy2) in zip(np.flatnonzero(finite).tolist(), self.cellsOf(self.boxes[finite]).tolist()):
+            if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > self.MAX_CELLS:
+                self.large.append(i)
+                continue
+            for cx in range(cx1, cx2 + 1):
+                for cy in range(cy1, cy2 + 1):
+                    self.cells[(cx, cy)].append(i)
+
+    def cellsOf(self, boxes):
+        return np.floor(boxes / self.cellSize).astype(np.int64)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def query(self, box):
+        """indices of the boxes which overlap or touch `box`, in increasing order"""
+        box = np.asarray(box, dtype=np.float64)
+        if not np.isfinite(box).all():
+            return []
+        cx1, cy1, cx2, cy2 = self.cellsOf(box).tolist()
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(self.cells):
+            return np.flatnonzero(boxesOverlap(box, self.boxes)).tolist()
+        candidates = set(self.large)
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                candidates.update(self.cells.get((cx, cy), ()))
+        if not candidates:
+            return []
+        candidates = np.array(sorted(candidates))
+        return candidates[boxesOverlap(box, self.boxes[candidates])].tolist()
@@ -4,12 +4,18 @@
 # Copyright (c) 2018 Tzutalin
 # Create by Jerry Yang <yangjjie94@gmail.com>
 
-from math import floor, ceil
-from PyQt5.QtGui import QImage
+import threading
+import time
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+from PyQt5.QtGui import QImage, QImageReader
 import qimage2ndarray
 import numpy as np
+import cv2
 import const
-from PyQt5.QtCore import pyqtSignal, QObject
+from PyQt5.QtCore import pyqtSignal, QObject, QSize
+from libs.lib import ndarray2qimage
 
 def read(filename, default=None):
     try:
@@ -18,71 +24,311 @@ def read(filename, default=None):
     except:
         return default
 
+def imageBytes(image):
+    return image.byteCount() if image is not None else 0
+
+def qimage2array(image):
+    """copy of `image` as an ndarray, (h, w) if it is grayscale else (h, w, 3)"""
+    if image.isGrayscale():
+        return qimage2ndarray.byte_view(image.convertToFormat(QImage.Format_Grayscale8))[..., 0].copy()
+    return qimage2ndarray.rgb_view(image.convertToFormat(QImage.Format_RGB32)).copy()
+
+def array2qimage(array):
+    if array.ndim == 2:
+        return qimage2ndarray.gray2qimage(array)
+    return qimage2ndarray.array2qimage(array)
+
+class ReadAhead(object):
+    """Learns the stride and the speed of navigation from the visited indices.
+
+    A step of at most READAHEAD_MAX_STRIDE frames (1 for the arrow keys, N_NEXT
+    for the jumps) sets the stride; anything longer is a seek and forgets the
+    history. The rate is the number of visits per second over the last
+    READAHEAD_WINDOW seconds, which is high while an arrow key is held down.
+    """
+
+    def __init__(self, history=const.READAHEAD_HISTORY):
+        self.visits = deque(maxlen=history)  # (index, time)
+        self.stride = 1
+
+    def visit(self, i, now=None):
+        now = time.time() if now is None else now
+        if self.visits:
+            last, _ = self.visits[-1]
+            if last == i:
+                return
+            delta = i - last
+            if abs(delta) <= const.READAHEAD_MAX_STRIDE:
+                self.stride = delta
+            else:
+                self.stride = 1
+                self.visits.clear()
+        self.visits.append((i, now))
+
+    def rate(self, now=None):
+        now = time.time() if now is None else now
+        recent = [t for _, t in self.visits if now - t <= const.READAHEAD_WINDOW]
+        if len(recent) < 2 or recent[-1] <= recent[0]:
+            return 0.
+        return (len(recent) - 1) / (recent[-1] - recent[0])
+
+    def behindShare(self, now=None):
+        """part of the budget spent behind the user: none while scrubbing fast"""
+        slowness = max(0., 1. - self.rate(now) / const.READAHEAD_FAST_RATE)
+        return const.READAHEAD_BEHIND_SHARE * slowness
+
+    def order(self, current, n, total, now=None):
+        """first `n` indices to keep around `current`, most wanted first
+
+        Ahead of the user only the frames on the stride are read, so the
+        budget follows 5-frame jumps as far as it follows single steps.
+        """
+        step = abs(self.stride)
+        sign = 1 if self.stride > 0 else -1
+        share = self.behindShare(now)
+        n_behind = int(round((n - 1) * share))
+
+        last = total - 1 if sign > 0 else 0
+        ahead = range(current + sign * step, last + sign, sign * step)
+        behind = range(current - sign, total - 1 - last - sign, -sign)
+        # the share one side cannot use near the ends of the series goes to the other
+        n_ahead = n - 1 - min(n_behind, len(behind))
+        ahead = list(islice(ahead, n_ahead))
+        behind = list(islice(behind, n - 1 - len(ahead)))
+
+        # nearest first, the distance behind weighted by the share of the budget it gets: with a
+        # quarter of it, a frame just behind comes with the third one ahead, at any place in the series
+        weight = (1. - share) / share if share > 0 else float('inf')
+        wanted = [(k, i) for k, i in enumerate(ahead, 1)] + [(k * weight, i) for k, i in enumerate(behind, 1)]
+        wanted.sort(key=lambda x: x[0])  # stable, ahead first on a tie
+        return [current] + [i for _, i in wanted]
+
+
 class Cache(QObject):
-    update_around = pyqtSignal(int)
+    """Image cache which decodes frames around the current index on a worker pool.
 
-    def __init__(self, imgList):
+    The frames kept in memory are bounded by `budget` (bytes). They are chosen
+    by ReadAhead from the direction, the stride and the speed of navigation.
+    Frames are read from `frameStore` if the series is packed; otherwise
+    grayscale frames are also kept in `diskCache`, if given, for the next
+    sessions.
+    """
+    loaded = pyqtSignal(int)
+    kind = 'gray'
+
+    def __init__(self, imgList, budget=const.CACHE_MEMORY_BUDGET, workers=const.CACHE_WORKERS,
+                 diskCache=None, frameStore=None):
         super(Cache, self).__init__()
+        self.diskCache = diskCache
+        self.frameStore = frameStore
         if imgList is None or len(imgList) == 0:
             return None
         self.imgPathList = imgList
         self.total = len(self.imgPathList)
-        self.data = [None for _ in range(self.total)]
+        self.budget = budget
+        self.data = {}
+        self.nbytes = 0
+        self.frameBytes = None  # size of one decoded frame, known after the first decode
 
-        self.update_around.connect(self.update)
-        self.scope = (0, const.LOAD_WHEN_INIT)
+        self.generation = 0  # bumped by invalidate(), decodes of older generations are dropped
+        self.current = 0
+        self.readAhead = ReadAhead()
+        self.window = set()
+        self.pending = {}
+        self.lock = threading.RLock()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self._stop = False
 
     def start(self):
-        self.update(0, const.LOAD_WHEN_INIT)
-        
+        self.prefetch()
 
     def __len__(self):
-        return len(self.data)
+        return self.total
+
+    def __contains__(self, i):
+        return i in self.data
 
-    def __getitem__(self,i):
-        if self.data[i] is None:
-            self.load_each(i)
+    def __getitem__(self, i):
+        with self.lock:
+            generation = self.generation
+            image = self.data.get(i)
+            future = self.pending.get(i) if image is None else None
+            if future is not None and future.cancel():  # still queued behind the prefetching, decode it here
+                del self.pending[i]
+                future = None
+        if image is None and future is not None:  # being decoded
+            try:
+                image = future.result()
+            except CancelledError:
+                image = None
+            if generation != self.generation:  # invalidated meanwhile
+                image = None
+        if image is None:
+            image = self.load_each(i)
 
-        self.update_around.emit(i-const.UPDATE_STEP)
-        return self.data[i]
+        self.moveTo(i)
+        return image
+
+    def peek(self, i):
+        """the frame if it is decoded already, else None, without waiting nor reading ahead"""
+        with self.lock:
+            return self.data.get(i)
 
     def __setitem__(self, i, image):
-        self.data[i] = image
+        with self.lock:
+            del self[i]
+            if image is None:
+                return
+            self.data[i] = image
+            self.nbytes += imageBytes(image)
+            if self.frameBytes is None:
+                self.frameBytes = max(imageBytes(image), 1)
 
     def __delitem__(self, i):
-        to_del, self.data[i] = self.data[i], None
+        with self.lock:
+            to_del = self.data.pop(i, None)
+            self.nbytes -= imageBytes(to_del)
         del to_del
 
-    def update(self, start, stop=None):
-        
-        begin = max(start, 0)
-        end = stop if stop is not None else min(start + 2 * const.UPDATE_STEP, self.total)
-        if (self.scope[1] <= begin) or (self.scope[0] >= end):
-            for i in range(self.scope[0], self.scope[1]):
-                del self[i]
+    def capacity(self):
+        """number of frames which fit in the memory budget"""
+        if self.frameBytes is None:
+            return 1
+        return max(1, min(self.total, self.budget // self.frameBytes))
 
-        elif self.scope[0] <= begin and self.scope[1] <= end:
-            for i in range(self.scope[0], begin):
-                del self[i]
-                    
-        elif self.scope[0] >= begin and self.scope[1] >= end:
-            for i in range(end, self.scope[1]):
+    def moveTo(self, i):
+        with self.lock:  # the visits are read by prefetch() on the pool threads
+            self.current = i
+            self.readAhead.visit(i)
+        self.prefetch()
+
+    def prefetch(self):
+        if self._stop:
+            return
+        with self.lock:
+            order = self.readAhead.order(self.current, self.capacity(), self.total)
+            self.window = set(order)
+            for i in [i for i in self.data if i not in self.window]:
                 del self[i]
-        else:
-            raise IndexError("scope ({lower},{upper}) is not expected".format(lower=begin, upper=end))
+            for i in [i for i in self.pending if i not in self.window]:
+                if self.pending[i].cancel():
+                    del self.pending[i]
+            for i in order:
+                if i not in self.data and i not in self.pending:
+                    self.pending[i] = self.executor.submit(self._prefetchEach, i)
+
+    def _prefetchEach(self, i):
+        image = None
+        generation = self.generation
+        try:
+            if not self._stop:
+                image = self.decode(i)
+        finally:
+            with self.lock:
+                if generation == self.generation:
+                    self.pending.pop(i, None)
+                    if image is not None and i in self.window:
+                        self[i] = image
+        if image is not None:
+            self.loaded.emit(i)
+            if self.frameBytes is not None and len(self.window) < self.capacity():
+                self.prefetch()  # the first decoded frame tells how many frames fit in the budget
+        return image
+
+    def decode(self, i):
+        if self.frameStore is not None:
+            return self.decodeStore(i)
+        filepath = self.imgPathList[i]
+        if self.diskCache is not None:
+            array = self.diskCache.get(filepath, self.kind)
+            if array is not None:
+                return array2qimage(array)
+        image = self.decodeFile(i)
+        if self.diskCache is not None and not image.isNull() and self.persistable(image):
+            self.diskCache.put(filepath, self.kind, qimage2array(image))
+        return image
 
-        for i in range(begin, end):
-            if self.data[i] is None:
-                self.load_each(i)
+    def decodeFile(self, i):
+        imageData = read(self.imgPathList[i], None)
+        return QImage.fromData(imageData)
+
+    def decodeStore(self, i):
+        return ndarray2qimage(self.frameStore[i])
+
+    def persistable(self, image):
+        return image.isGrayscale()
 
-        assert len(self) == self.total, "deletion on mistake"
-        self.scope = (begin, end)
-        
     def load_each(self, i):
-        if self.data[i] is None:
-            imageData = read(self.imgPathList[i], None)
-            image = QImage.fromData(imageData)
-            self.data[i] = image
+        image = self.data.get(i)
+        if image is None:
+            generation = self.generation
+            image = self.decode(i)
+            with self.lock:
+                if generation == self.generation:  # else decoded for what invalidate() dropped
+                    self[i] = image
+        return image
+
+    def invalidate(self):
+        """drop every frame, as what decode() returns has changed"""
+        with self.lock:
+            self.generation += 1
+            for future in self.pending.values():
+                future.cancel()
+            self.pending.clear()
+            for i in list(self.data):
+                del self[i]
+        if self.window:  # do not start prefetching for a cache nobody has read yet
+            self.prefetch()
 
     def stop(self):
-        pass
+        self._stop = True
+        with self.lock:
+            for future in self.pending.values():
+                future.cancel()
+            self.pending.clear()
+        self.executor.shutdown(wait=False)
+
+
+class PreviewCache(Cache):
+    """Cache of frames downscaled by `scale`, served while the full frames are read.
+
+    QImageReader decodes JPEG frames directly at the reduced size, which costs
+    a fraction of a full decode and of its memory. The formats it can only
+    scale after a full decode are decoded plainly, their preview being the
+    full frame.
+    """
+
+    def __init__(self, imgList, budget=const.PREVIEW_MEMORY_BUDGET, workers=const.CACHE_WORKERS,
+                 diskCache=None, frameStore=None, scale=const.PREVIEW_SCALE):
+        super(PreviewCache, self).__init__(imgList, budget=budget, workers=workers,
+                                           diskCache=diskCache, frameStore=frameStore)
+        self.scale = scale
+        self.kind = 'preview-{}'.format(scale)
+        self.sizes = {}
+
+    def decodeFile(self, i):
+        reader = QImageReader(self.imgPathList[i])
+        size = reader.size()  # reads the header only
+        if size.isValid():
+            self.sizes[i] = size
+            if bytes(reader.format()) in const.PREVIEW_SCALED_FORMATS:
+                reader.setScaledSize(size * self.scale)
+        return reader.read()
+
+    def decodeStore(self, i):
+        frame = self.frameStore[i]
+        self.sizes[i] = QSize(frame.shape[1], frame.shape[0])
+        size = (int(frame.shape[1] * self.scale), int(frame.shape[0] * self.scale))
+        return ndarray2qimage(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+
+    def persistable(self, image):
+        return True
+
+    def fullSize(self, i):
+        """size of the full frame, read from the header of the file if its preview came from the disk cache"""
+        if i not in self.sizes:
+            size = QImageReader(self.imgPathList[i]).size()
+            if not size.isValid():
+                return None
+            self.sizes[i] = size
+        return self.sizes[i]
@@ -835,6 +835,11 @@ class Canvas(QWidget):
         self.shapes = []
         self.repaint()
 
+    def replacePixmap(self, pixmap):
+        """swap the pixmap of the same frame, keeping its shapes"""
+        self.pixmap = pixmap
+        self.update()
+
     def loadShapes(self, shapes):
         self.shapes = list(shapes)
         self.storeShapes()
@@ -1,3 +1,4 @@
+import os
 import sys
 import cv2
 
@@ -35,6 +36,8 @@ const.SETTING_AUTO_SAVE = 'autosave'
 const.SETTING_SINGLE_CLASS = 'singleclass'
 const.SETTING_OBSERVE_WINDOW = 'observeWindow'
 const.SETTING_SHOW_PREPROCESS = 'showPreprossedImage'
+const.SETTING_ROLLING_BACKGROUND = 'rollingBackground'
+const.SETTING_WATCH_SAVE_DIR = 'watchSaveDir'
 
 const.N_NEXT = 5
 const.N_PREV = 5
@@ -49,6 +52,38 @@ const.LOAD_WHEN_INIT = 100
 const.UPDATE_STEP = 100
 const.UPDATE_STEP_LABEL = 100000
 const.UPDATE_INTERVAL = 500  # ms
+const.CACHE_MEMORY_BUDGET = 512 * 1024 * 1024  # bytes
+const.CACHE_WORKERS = 4
+const.READAHEAD_HISTORY = 8
+const.READAHEAD_MAX_STRIDE = 2 * const.N_NEXT  # longer steps are seeks
+const.READAHEAD_WINDOW = 2.  # s
+const.READAHEAD_FAST_RATE = 10.  # visits/s, about the auto-repeat of a held-down key
+const.READAHEAD_BEHIND_SHARE = 0.25
+const.PREVIEW_MEMORY_BUDGET = 128 * 1024 * 1024  # bytes
+const.PREVIEW_SCALE = 0.25
+const.PREVIEW_SCALED_FORMATS = (b'jpeg',)  # decoded at the reduced size, the others are scaled after a full decode
+# diskCache.py
+const.DISK_CACHE_DIR = os.path.join(os.path.expanduser("~"), '.labelSeriesCache')
+const.DISK_CACHE_LIMIT = 4 * 1024 * 1024 * 1024  # bytes
+const.NPY_EXT = '.npy'
+# labelsCache.py
+const.LABELS_CACHE_RADIUS = 50  # frames around the current one whose annotations are parsed ahead
+const.LABELS_CACHE_SIZE = 5000  # annotation files whose records are kept
+# dirScanner.py
+const.SCAN_MANIFEST_DIR = os.path.join(const.DISK_CACHE_DIR, 'scans')
+const.SCAN_RACY_INTERVAL = 2.  # s, directories changed more recently than this are listed again
+# annotationIndex.py
+const.ANNOTATION_INDEX_FILENAME = '.annotations.sqlite'
+const.ANNOTATION_INDEX_CHUNK = 500  # paths per query, below the limit of SQLite on parameters
+# annotationSnapshot.py
+const.ANNOTATION_SNAPSHOT_FILENAME = '.annotations'  # + '.parquet' or '.npz'
+# annotationLoader.py
+const.ANNOTATION_LOAD_CHUNK = 256  # files parsed per task of the pool
+const.ANNOTATION_LOAD_START_METHOD = 'spawn'  # of the processes of the pool, never fork the GUI
+# frameStore.py
+const.FRAME_STORE_FILENAME = 'series.u8'
+const.FRAME_STORE_INDEX = 'series.json'
+const.FRAME_STORE_PROGRESS_STEP = 100
 
 # canvas.py
 const.OBS_WIN_X = [150, 950]
@@ -60,7 +95,24 @@ const.BACKGROUND_FILENAME = "background.jpg"
 const.OMIT_FILENAME = [const.BACKGROUND_FILENAME]
 const.PREPROSSESS_BACKGROUND_LENGTH = 500
 const.PREPROSSESS_BACKGROUND_BETA = 0.85
+const.PREPROSSESS_BACKGROUND_METHOD = 'mean'  # 'mean', 'median' or 'running', see background.py
+const.BACKGROUND_MEDIAN_SAMPLES = 64
+const.BACKGROUND_RUNNING_ALPHA = 0.02
+const.BACKGROUND_REFINE_STEP = 32  # frames read between two estimates
+const.BACKGROUND_ROLLING_WINDOW = 50  # frames
+const.BACKGROUND_ROLLING_CURSORS = 2  # windows slid independently, e.g. ahead of and behind the user
+const.BACKGROUND_ROLLING_MARGIN = 8  # frames kept beyond either end of a window
+const.PREPROCESS_MODE_GLOBAL = 'global'  # one background for the series
+const.PREPROCESS_MODE_ROLLING = 'rolling'  # background of the neighbouring frames
 const.IMREAD_FORMAT = cv2.IMREAD_GRAYSCALE
+const.PREPROCESS_MEMORY_BUDGET = 256 * 1024 * 1024  # bytes, of the preprocessed frames and the rolling windows
+const.PREPROCESS_ROLLING_SHARE = 0.5  # of the budget held by the rolling windows in rolling mode
+
+# batchPreprocess.py
+const.BATCH_OUTPUT_SUFFIX = '_preprocessed'  # default output dir is a sibling of the series
+const.BATCH_CHUNK_SIZE = 64
+const.BATCH_ROLLING_SPANS = 4  # tasks a worker in rolling mode, each rebuilding the window once
+const.IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
 
 # shape.py
 # const.DEFAULT_LINE_COLOR = QColor(0, 255, 0, 128)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Tzutalin
+# Create by Jerry Yang <yangjjie94@gmail.com>
+
+import os
+import time
+import json
+import hashlib
+import tempfile
+import const
+
+class DirScanner(object):
+    """Files with one of `extensions` under `root`, rescanned incrementally.
+
+    The scanner remembers the mtime of every directory with the files and
+    subdirectories it holds. A rescan lists again only the directories whose
+    mtime changed, i.e. where files were added, removed or renamed; those
+    changed within SCAN_RACY_INTERVAL of a scan are listed again anyway, as a
+    change in the same clock tick would leave their mtime as it was. With
+    stat=True the mtime and size of every file are recorded too, and all
+    files are stat'ed on a rescan so that modified ones are found as well.
+    The state is kept in `manifestPath` between sessions, if given.
+    """
+
+    def __init__(self, root, extensions, stat=False, manifestPath=None, omit=()):
+        self.root = os.path.abspath(root)
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.stat = stat
+        self.manifestPath = manifestPath
+        self.omit = set(os.path.abspath(path) for path in omit)
+        self.dirs = {}  # dirpath -> [mtime_ns, {name: (mtime_ns, size) or None}, [subdir names]]
+        if manifestPath is not None:
+            self.load()
+
+    @staticmethod
+    def manifestPathOf(root, kind):
+        key = hashlib.sha1(u"{}|{}".format(os.path.abspath(root), kind).encode(const.ENCODE_METHOD)).hexdigest()
+        return os.path.join(const.SCAN_MANIFEST_DIR, key + '.json')
+
+    def load(self):
+        try:
+            with open(self.manifestPath, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (manifest.get('root'), manifest.get('extensions'), manifest.get('stat')) != \
+                (self.root, list(self.extensions), self.stat):
+            return
+        self.dirs = {dirpath: [mtime, {name: tuple(value) if value else None for name, value in files.items()}, subdirs]
+                     for dirpath, (mtime, files, subdirs) in manifest['dirs'].items()}
+
+    def save(self):
+        if self.manifestPath is None:
+            return
+        dirname = os.path.dirname(self.manifestPath)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.json', dir=dirname)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'root': self.root, 'extensions': list(self.extensions), 'stat': self.stat,
+                       'dirs': self.dirs}, f)
+        os.replace(tmp_path, self.manifestPath)
+
+    def seed(self, files):
+        """start from the known `files`, {path: (mtime_ns, size)}, e.g. those of an index"""
+        for path, value in files.items():
+            dirpath, name = os.path.split(path)
+            self.dirs.setdefault(dirpath, [None, {}, []])[1][name] = value
+
+    def record(self, path, value=None):
+        """note a file written by us, so that the next rescan does not report it"""
+        dirpath, name = os.path.split(os.path.abspath(path))
+        self.dirs.setdefault(dirpath, [None, {}, []])[1][name] = value
+
+    def forget(self, path):
+        """note a file removed by us"""
+        dirpath, name = os.path.split(os.path.abspath(path))
+        if dirpath in self.dirs:
+            self.dirs[dirpath][1].pop(name, None)
+
+    def value(self, path):
+        dirpath, name = os.path.split(path)
+        entry = self.dirs.get(dirpath)
+        return entry[1].get(name) if entry is not None else None
+
+    def paths(self):
+        paths = [os.path.join(dirpath, name) for dirpath, (_, files, _) in self.dirs.items() for name in files]
+        paths.sort(key=lambda x: x.lower())
+        return paths
+
+    def scan(self, dirs=None):
+        """rescan the whole tree, or only `dirs` (e.g. the ones a watcher reported)
+
+        Returns the (added, changed, removed) paths since the previous scan.
+        """
+        added, changed, removed = [], [], []
+        visited = set()
+        force = dirs is not None
+        stack = [self.root] if dirs is None else [os.path.abspath(dirpath) for dirpath in dirs]
+        while stack:
+            dirpath = stack.pop()
+            if dirpath in visited:
+                continue
+            visited.add(dirpath)
+            stack.extend(self.scanDir(dirpath, force, added, changed, removed))
+        if dirs is None:
+            for dirpath in [dirpath for dirpath in self.dirs if dirpath not in visited]:
+                removed.extend(os.path.join(dirpath, name) for name in self.dirs.pop(dirpath)[1])
+        return added, changed, removed
+
+    def scanDir(self, dirpath, force, added, changed, removed):
+        """rescan one directory, returns the subdirectories to scan next"""
+        entry = self.dirs.get(dirpath)
+        try:
+            mtime = os.stat(dirpath).st_mtime_ns
+        except OSError:
+            self.drop(dirpath, removed)
+            return []
+        if entry is not None and entry[0] == mtime and not self.stat and not force:
+            return [os.path.join(dirpath, name) for name in entry[2]]
+
+        files, subdirs = {}, []
+        with os.scandir(dirpath) as it:
+            for dirEntry in it:
+                if dirEntry.is_dir(follow_symlinks=False):
+                    if dirEntry.path not in self.omit:
+                        subdirs.append(dirEntry.name)
+                elif dirEntry.name.lower().endswith(self.extensions):
+                    if not self.stat:
+                        files[dirEntry.name] = None
+                        continue
+                    try:
+                        stat = dirEntry.stat()
+                    except OSError:
+                        continue
+                    files[dirEntry.name] = (stat.st_mtime_ns, stat.st_size)
+
+        old, oldSubdirs = (entry[1], entry[2]) if entry is not None else ({}, [])
+        for name, value in files.items():
+            if name not in old:
+                added.append(os.path.join(dirpath, name))
+            elif old[name] != value:
+                changed.append(os.path.join(dirpath, name))
+        removed.extend(os.path.join(dirpath, name) for name in old if name not in files)
+        for name in set(oldSubdirs) - set(subdirs):
+            self.drop(os.path.join(dirpath, name), removed)
+        if time.time() - mtime / 1e9 < const.SCAN_RACY_INTERVAL:
+            mtime = None
+        self.dirs[dirpath] = [mtime, files, subdirs]
+        # a forced rescan of a directory goes down only into its new subdirectories
+        return [os.path.join(dirpath, name) for name in subdirs if not force or name not in oldSubdirs]
+
+    def drop(self, dirpath, removed):
+        entry = self.dirs.pop(dirpath, None)
+        if entry is None:
+            return
+        removed.extend(os.path.join(dirpath, name) for name in entry[1])
+        for name in entry[2]:
+            self.drop(os.path.join(dirpath, name), removed)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Tzutalin
+# Create by Jerry Yang <yangjjie94@gmail.com>
+
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+import const
+
+class DirWatcher(QObject):
+    """Reports the directories in which files were added, removed or renamed.
+
+    QFileSystemWatcher (inotify on Linux) watches the directories themselves,
+    not the files, so a directory of 50k annotations costs one watch. The
+    changes are gathered for `delay` ms, so a burst of writes makes one report.
+    """
+    changed = pyqtSignal(list)
+
+    def __init__(self, dirs=(), delay=const.UPDATE_INTERVAL):
+        super(DirWatcher, self).__init__()
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.onDirectoryChanged)
+        self.pending = set()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.flush)
+        self.setDirs(dirs)
+
+    def setDirs(self, dirs):
+        watched = self.watcher.directories()
+        if watched:
+            self.watcher.removePaths(watched)
+        dirs = list(dirs)
+        if dirs:
+            self.watcher.addPaths(dirs)
+
+    def onDirectoryChanged(self, path):
+        self.pending.add(path)
+        self.timer.start()
+
+    def flush(self):
+        dirs, self.pending = sorted(self.pending), set()
+        if dirs:
+            self.changed.emit(dirs)
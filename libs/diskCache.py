@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Tzutalin
+# Create by Jerry Yang <yangjjie94@gmail.com>
+
+import os
+import hashlib
+import tempfile
+import threading
+import numpy as np
+import const
+
+class DiskCache(object):
+    """decoded frames kept on disk between sessions
+
+    An entry is keyed by the absolute path, mtime and size of its image file
+    and by its `kind` (e.g. a preview scale), so a modified image misses
+    instead of returning stale data. Entries are .npy files, loaded
+    memory-mapped. When the entries exceed `limit` bytes, the least recently
+    used ones are removed.
+    """
+
+    def __init__(self, root=const.DISK_CACHE_DIR, limit=const.DISK_CACHE_LIMIT):
+        self.root = root
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.nbytes = None  # counted on the first put
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+
+    def key(self, filepath, kind):
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return None
+        s = u"{}|{}|{}|{}".format(os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size, kind)
+        return hashlib.sha1(s.encode(const.ENCODE_METHOD)).hexdigest()
+
+    def entryPath(self, key):
+        return os.path.join(self.root, key[:2], key + const.NPY_EXT)
+
+    def get(self, filepath, kind):
+        key = self.key(filepath, kind)
+        if key is None:
+            return None
+        path = self.entryPath(key)
+        try:
+            array = np.load(path, mmap_mode='r')
+            os.utime(path)  # mtime of an entry is its last use
+        except (OSError, ValueError):
+            return None
+        return array
+
+    def put(self, filepath, kind, array):
+        key = self.key(filepath, kind)
+        if key is None:
+            return False
+        path = self.entryPath(key)
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname, exist_ok=True)
+        # write aside and rename, so that readers never see half an entry
+        fd, tmp_path = tempfile.mkstemp(suffix=const.NPY_EXT, dir=dirname)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+        with self.lock:
+            if self.nbytes is None:
+                self.nbytes = sum(size for _, _, size in self.entries())
+            else:
+                self.nbytes += os.path.getsize(path)
+            if self.nbytes > self.limit:
+                self.trim()
+        return True
+
+    def entries(self):
+        """(mtime, path, size) of every entry"""
+        for sub in os.scandir(self.root):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(const.NPY_EXT):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    yield (stat.st_mtime, entry.path, stat.st_size)
+
+    def trim(self, ratio=0.9):
+        """remove the least recently used entries down to `ratio` of the limit"""
+        entries = sorted(self.entries())
+        self.nbytes = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self.nbytes <= self.limit * ratio:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.nbytes -= size
+
+    def clear(self):
+        with self.lock:
+            for _, path, _ in list(self.entries()):
+                os.remove(path)
+            self.nbytes = 0
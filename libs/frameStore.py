@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Tzutalin
+# Create by Jerry Yang <yangjjie94@gmail.com>
+
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import const
+
+class FrameStoreError(Exception):
+    pass
+
+class FrameStore(object):
+    """a series of frames decoded once into a memory-mapped (N, H, W) uint8 array
+
+    The array is stored raw in FRAME_STORE_FILENAME next to the first image of
+    the series, and FRAME_STORE_INDEX records its shape and the relative path,
+    mtime and size of every frame. Indexing returns views on the mapped file,
+    so reading a frame or a range of frames copies and decodes nothing.
+    """
+
+    def __init__(self, dirpath):
+        self.dirpath = dirpath
+        with open(os.path.join(dirpath, const.FRAME_STORE_INDEX), 'r') as f:
+            index = json.load(f)
+        self.shape = tuple(index['shape'])
+        self.frames = index['frames']  # [relative path, mtime_ns, size]
+        self.data = np.memmap(os.path.join(dirpath, const.FRAME_STORE_FILENAME),
+                              dtype=np.uint8, mode='r', shape=self.shape)
+        self.indices = {os.path.normpath(os.path.join(dirpath, relpath)): i
+                        for i, (relpath, _, _) in enumerate(self.frames)}
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, i):
+        return self.data[i]
+
+    def range(self, start, stop):
+        return self.data[start:stop]
+
+    def index(self, filepath):
+        return self.indices[os.path.normpath(filepath)]
+
+    def matches(self, imgList):
+        """whether the store holds exactly the frames of `imgList` as they are on disk"""
+        if len(imgList) != len(self):
+            return False
+        for filepath, (relpath, mtime_ns, size) in zip(imgList, self.frames):
+            if os.path.normpath(filepath) != os.path.normpath(os.path.join(self.dirpath, relpath)):
+                return False
+            try:
+                stat = os.stat(filepath)
+            except OSError:
+                return False
+            if (stat.st_mtime_ns, stat.st_size) != (mtime_ns, size):
+                return False
+        return True
+
+    @staticmethod
+    def dirpathOf(imgList):
+        return os.path.dirname(imgList[0])
+
+    @staticmethod
+    def exists(dirpath):
+        return (os.path.isfile(os.path.join(dirpath, const.FRAME_STORE_INDEX)) and
+                os.path.isfile(os.path.join(dirpath, const.FRAME_STORE_FILENAME)))
+
+    @staticmethod
+    def open(imgList):
+        """the store of `imgList`, or None if it is not packed or out of date"""
+        if imgList is None or len(imgList) == 0:
+            return None
+        dirpath = FrameStore.dirpathOf(imgList)
+        if not FrameStore.exists(dirpath):
+            return None
+        try:
+            store = FrameStore(dirpath)
+        except (OSError, ValueError, KeyError):
+            return None
+        return store if store.matches(imgList) else None
+
+    @staticmethod
+    def pack(imgList, workers=const.CACHE_WORKERS, progress=None):
+        """decode `imgList` into a new store, calling progress(done, total) on the way
+
+        The frames are read as they are, so that a series which is not 8-bit
+        grayscale is refused instead of being packed, and shown, in gray.
+        """
+        if imgList is None or len(imgList) == 0:
+            raise FrameStoreError("no frame to pack")
+        dirpath = FrameStore.dirpathOf(imgList)
+        first = cv2.imread(imgList[0], cv2.IMREAD_UNCHANGED)
+        if first is None or first.ndim != 2 or first.dtype != np.uint8:
+            raise FrameStoreError("cannot read {} as an 8-bit grayscale frame".format(imgList[0]))
+        shape = (len(imgList),) + first.shape
+
+        tmp_path = os.path.join(dirpath, const.FRAME_STORE_FILENAME + '.tmp')
+        data = np.memmap(tmp_path, dtype=np.uint8, mode='w+', shape=shape)
+
+        def packEach(i):
+            img = cv2.imread(imgList[i], cv2.IMREAD_UNCHANGED)
+            if img is None or img.shape != first.shape or img.dtype != np.uint8:
+                raise FrameStoreError("frame {} is not a {}x{} grayscale image".format(imgList[i], *first.shape))
+            data[i] = img
+
+        frames = []
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for done, _ in enumerate(executor.map(packEach, range(len(imgList))), 1):
+                    if progress is not None and (done % const.FRAME_STORE_PROGRESS_STEP == 0 or done == len(imgList)):
+                        progress(done, len(imgList))
+            for filepath in imgList:
+                stat = os.stat(filepath)
+                frames.append([os.path.relpath(filepath, dirpath), stat.st_mtime_ns, stat.st_size])
+            data.flush()
+        except Exception:
+            del data
+            os.remove(tmp_path)
+            raise
+        del data
+
+        if os.path.exists(os.path.join(dirpath, const.FRAME_STORE_INDEX)):
+            os.remove(os.path.join(dirpath, const.FRAME_STORE_INDEX))  # stale until the new one is written
+        os.replace(tmp_path, os.path.join(dirpath, const.FRAME_STORE_FILENAME))
+        with open(os.path.join(dirpath, const.FRAME_STORE_INDEX), 'w') as f:
+            json.dump({'shape': shape, 'dtype': 'uint8', 'frames': frames}, f)
+        return FrameStore(dirpath)
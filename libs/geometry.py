@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Tzutalin
+# Create by Jerry Yang <yangjjie94@gmail.com>
+
+"""Geometry of the shapes on numpy arrays of points, many shapes at a time.
+
+The shapes are given by their points as saved in the annotations: an
+(N, 4, 2) array for N ellipses, each by the two ends of one axis and the
+two ends of the other, as Ellipse draws them. For the tests between shapes
+of any type, each shape is turned into its outline, a closed polygon: the
+corners of a box, the vertices of a polygon, the two ends of a line and,
+for an ellipse, ELLIPSE_SEGMENTS points on each of its four quarters.
+The outlines of N shapes make an (N, K, 2) array, the shorter ones padded
+by repeating their last vertex, so that the tests run on all at once
+without QPainterPath.
+"""
+
+from collections import namedtuple
+import numpy as np
+
+ELLIPSE_SEGMENTS = 16  # per quarter of an ellipse
+
+EllipseMetrics = namedtuple('EllipseMetrics', ['diameter', 'longAxis', 'shortAxis', 'roundness', 'center'])
+
+def asPoints(points, n=None):
+    """`points` as a float (N, n, 2) array, a single shape of shape (n, 2) making N = 1"""
+    points = np.asarray(points, dtype=np.float64)
+    if points.ndim == 2:
+        points = points[np.newaxis]
+    if points.ndim != 3 or points.shape[2] != 2 or (n is not None and points.shape[1] != n):
+        raise ValueError("expected points of shape (N, {}, 2), got {}".format(n or 'n', points.shape))
+    return points
+
+def ellipseMetrics(points):
+    """EllipseMetrics of the ellipses of `points`, an (N, 4, 2) array
+
+    diameter is the geometric mean of the two axes, sqrt(|p1p2| * |p3p4|),
+    roundness the short axis over the long one, and center the crossing of
+    the two axes: an (N, 2) array, NaN where they are parallel. A shape with
+    an empty axis has a NaN roundness.
+    """
+    points = asPoints(points, 4)
+    axis1, axis2 = axes(points)
+    longAxis = np.maximum(axis1, axis2)
+    shortAxis = np.minimum(axis1, axis2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        roundness = shortAxis / longAxis
+    return EllipseMetrics(np.sqrt(axis1 * axis2), longAxis, shortAxis, roundness, crossing(points))
+
+def crossing(points):
+    """(N, 2) crossing points of the lines p1p2 and p3p4 of (N, 4, 2) `points`, NaN if parallel"""
+    p1, p2, p3, p4 = points[:, 0], points[:, 1], points[:, 2], points[:, 3]
+    d1, d2 = p2 - p1, p4 - p3
+    denominator = cross(d1, d2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(denominator != 0, cross(p3 - p1, d2) / denominator, np.nan)
+    return p1 + t[:, np.newaxis] * d1
+
+def cross(a, b):
+    """z of the cross products of the rows of (N, 2) `a` and `b`"""
+    return a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+
+def axes(points):
+    """lengths |p1p2| and |p3p4| of the two axes of (N, 4, 2) `points`"""
+    d = points[:, 1::2] - points[:, 0::2]  # (N, 2 axes, 2)
+    lengths = np.sqrt(np.einsum('ijk,ijk->ij', d, d))
+    return lengths[:, 0], lengths[:, 1]
+
+def diameters(points):
+    """diameters of the ellipses of `points`, an (N, 4, 2) array, without the rest of ellipseMetrics"""
+    axis1, axis2 = axes(asPoints(points, 4))
+    return np.sqrt(axis1 * axis2)
+
+def ellipseOutlines(points, segments=ELLIPSE_SEGMENTS):
+    """(N, 4 * segments, 2) outlines of the ellipses of (N, 4, 2) `points`
+
+    Each quarter, from the end of one axis to the end of the other around
+    the crossing c of the axes, is the arc c + u cos(t) + v sin(t) with u, v
+    the vectors from c to the two ends, as the Bezier curves of
+    Ellipse.makePath approximate it; p1, p3, p2, p4 in this order. The
+    outline of an ellipse whose axes are parallel is NaN.
+    """
+    points = asPoints(points, 4)
+    center = crossing(points)[:, np.newaxis]
+    ends = points - center
+    u, v = ends[:, [0, 2, 1, 3]], ends[:, [2, 1, 3, 0]]
+    t = np.linspace(0, np.pi / 2, segments, endpoint=False)[:, np.newaxis]
+    center = center[:, np.newaxis]
+    outline = center + u[:, :, np.newaxis] * np.cos(t) + v[:, :, np.newaxis] * np.sin(t)
+    return outline.reshape(len(points), 4 * segments, 2)
+
+def outlines(shapeTypes_, points, segments=ELLIPSE_SEGMENTS):
+    """(N, K, 2) outlines of N shapes of types `shapeTypes_` given by their `points`"""
+    shapes = [np.asarray(p, dtype=np.float64).reshape(-1, 2) for p in points]
+    if not shapes:
+        return np.zeros((0, 1, 2))
+    shapes_ = list(shapes)
+    ellipses = [i for i, (shapeType, p) in enumerate(zip(shapeTypes_, shapes))
+                if shapeType == 'ellipse' and len(p) == 4]
+    if ellipses:
+        for i, outline in zip(ellipses, ellipseOutlines(np.stack([shapes[i] for i in ellipses]), segments)):
+            shapes_[i] = outline
+    size = max(len(p) for p in shapes_)
+    result = np.empty((len(shapes_), size, 2))
+    for i, p in enumerate(shapes_):
+        if len(p) == 0:
+            result[i] = np.nan
+            continue
+        result[i, :len(p)] = p
+        result[i, len(p):] = p[-1]
+    return result
+
+def boundingBoxes(outlines_):
+    """(N, 4) boxes (x1, y1, x2, y2) of (N, K, 2) outlines"""
+    return np.concatenate([outlines_.min(axis=1), outlines_.max(axis=1)], axis=1)
+
+def areas(outlines_):
+    """(N,) areas of (N, K, 2) outlines, by the shoelace formula"""
+    x, y = outlines_[..., 0], outlines_[..., 1]
+    return 0.5 * np.abs(np.sum(x * np.roll(y, -1, axis=1) - np.roll(x, -1, axis=1) * y, axis=1))
+
+def contains(outlines_, points):
+    """(N,) whether the i-th of (N, K, 2) outlines contains the i-th of (N, 2) `points`
+
+    By the parity of the edges crossed on the way to the right of the point,
+    so that a polygon which is not convex is handled as well; a line
+    contains no point.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+    a, b = outlines_, np.roll(outlines_, -1, axis=1)
+    px, py = points[..., 0], points[..., 1]
+    crosses = (a[..., 1] > py) != (b[..., 1] > py)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = a[..., 0] + (py - a[..., 1]) * (b[..., 0] - a[..., 0]) / (b[..., 1] - a[..., 1])
+    return np.sum(crosses & (px < x), axis=1) % 2 == 1
+
+def orientation(a, b, c):
+    return (b[..., 0] - a[..., 0]) * (c[..., 1] - a[..., 1]) - (b[..., 1] - a[..., 1]) * (c[..., 0] - a[..., 0])
+
+def segmentsIntersect(a1, a2, b1, b2):
+    """whether the segments a1a2 and b1b2 meet, touching included, on broadcast arrays of points"""
+    o1, o2 = orientation(a1, a2, b1), orientation(a1, a2, b2)
+    o3, o4 = orientation(b1, b2, a1), orientation(b1, b2, a2)
+    # the boxes of the segments must overlap too, for collinear segments side by side
+    boxes = ((np.minimum(a1[..., 0], a2[..., 0]) <= np.maximum(b1[..., 0], b2[..., 0])) &
+             (np.minimum(b1[..., 0], b2[..., 0]) <= np.maximum(a1[..., 0], a2[..., 0])) &
+             (np.minimum(a1[..., 1], a2[..., 1]) <= np.maximum(b1[..., 1], b2[..., 1])) &
+             (np.minimum(b1[..., 1], b2[..., 1]) <= np.maximum(a1[..., 1], a2[..., 1])))
+    return (o1 * o2 <= 0) & (o3 * o4 <= 0) & boxes
+
+def overlaps(outlinesA, outlinesB):
+    """(N,) whether the i-th of (N, Ka, 2) `outlinesA` and the i-th of (N, Kb, 2) `outlinesB` overlap
+
+    Two shapes overlap when one lies inside the other, which a vertex of it
+    then tells, or when their edges cross. The mean of the vertices of each,
+    when inside it, settles most overlapping pairs first, so that the edges
+    are crossed, Ka * Kb tests a pair, only for the others.
+    """
+    result = contains(outlinesB, outlinesA[:, 0]) | contains(outlinesA, outlinesB[:, 0])
+    for outlines1, outlines2 in ((outlinesA, outlinesB), (outlinesB, outlinesA)):
+        centers = outlines1.mean(axis=1)
+        result |= contains(outlines1, centers) & contains(outlines2, centers)
+    rest = np.flatnonzero(~result)
+    if len(rest):
+        outlinesA, outlinesB = outlinesA[rest], outlinesB[rest]
+        a1, a2 = outlinesA[:, :, np.newaxis], np.roll(outlinesA, -1, axis=1)[:, :, np.newaxis]
+        b1, b2 = outlinesB[:, np.newaxis], np.roll(outlinesB, -1, axis=1)[:, np.newaxis]
+        result[rest] = segmentsIntersect(a1, a2, b1, b2).any(axis=(1, 2))
+    return result
+
+def boxIou(boxesA, boxesB):
+    """(N,) intersection over union of the i-th of (N, 4) `boxesA` and of `boxesB`, (x1, y1, x2, y2)"""
+    boxesA = np.asarray(boxesA, dtype=np.float64).reshape(-1, 4)
+    boxesB = np.asarray(boxesB, dtype=np.float64).reshape(-1, 4)
+    w = np.clip(np.minimum(boxesA[:, 2], boxesB[:, 2]) - np.maximum(boxesA[:, 0], boxesB[:, 0]), 0, None)
+    h = np.clip(np.minimum(boxesA[:, 3], boxesB[:, 3]) - np.maximum(boxesA[:, 1], boxesB[:, 1]), 0, None)
+    intersection = w * h
+    union = ((boxesA[:, 2] - boxesA[:, 0]) * (boxesA[:, 3] - boxesA[:, 1]) +
+             (boxesB[:, 2] - boxesB[:, 0]) * (boxesB[:, 3] - boxesB[:, 1]) - intersection)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(union > 0, intersection / union, 0.)
+
+def boxesOverlap(box, boxes):
+    """mask of the (N, 4) `boxes` (x1, y1, x2, y2) which overlap or touch `box`"""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    x1, y1, x2, y2 = box
+    return (boxes[:, 0] <= x2) & (x1 <= boxes[:, 2]) & (boxes[:, 1] <= y2) & (y1 <= boxes[:, 3])
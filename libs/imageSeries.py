@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Tzutalin
+# Create by Jerry Yang <yangjjie94@gmail.com>
+
+import os
+import re
+
+FRAME_PATTERN = re.compile(r'(\d+)$')
+
+def stem(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+def frameOf(path):
+    """frame number at the end of the file name, None if there is none"""
+    match = FRAME_PATTERN.search(stem(path))
+    return int(match.group(1)) if match else None
+
+
+class ImageSeries(object):
+    """The ordered image paths of a series, indexed by path and by stem.
+
+    It reads like the list of paths it replaces (len, iteration, indexing,
+    index()), but finds the position of a path in O(1) instead of O(N). The
+    stem, the basename without its extension, finds the image of an
+    annotation file. When several images share a stem, the first one is found.
+    """
+
+    def __init__(self, paths=()):
+        self.paths = list(paths)
+        self.byPath = {}
+        self.byStem = {}
+        for i, path in enumerate(self.paths):
+            self.byPath.setdefault(os.path.normpath(path), i)
+            self.byStem.setdefault(stem(path), i)
+
+    @staticmethod
+    def of(paths):
+        return paths if isinstance(paths, ImageSeries) else ImageSeries(paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __getitem__(self, i):
+        return self.paths[i]
+
+    def __contains__(self, path):
+        return os.path.normpath(path) in self.byPath
+
+    def index(self, path):
+        """position of `path`, raises ValueError as list.index does"""
+        try:
+            return self.byPath[os.path.normpath(path)]
+        except KeyError:
+            raise ValueError("{} is not in the series".format(path))
+
+    def get(self, path, default=None):
+        return self.byPath.get(os.path.normpath(path), default)
+
+    def indexOfStem(self, path, default=None):
+        """position of the image with the stem of `path`, e.g. of an annotation file"""
+        return self.byStem.get(stem(path), default)
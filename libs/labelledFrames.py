@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Tzutalin
+# Create by Jerry Yang <yangjjie94@gmail.com>
+
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+
+from libs.imageSeries import ImageSeries
+
+def removeSorted(frames, frame):
+    i = bisect_left(frames, frame)
+    if i < len(frames) and frames[i] == frame:
+        del frames[i]
+
+
+class LabelledFrames(object):
+    """Sorted indices of the frames of a series which have an annotation file.
+
+    The frames are also kept by label and by shape type, so that the next or
+    previous frame holding e.g. a 'Broken' label is found by bisection. An
+    annotation file belongs to the frame of the same basename.
+    """
+
+    def __init__(self, imgList, contents=None):
+        self.imgList = ImageSeries.of(imgList)
+        self.frames = []
+        self.byLabel = defaultdict(list)
+        self.byShapeType = defaultdict(list)
+        self.contents = {}  # frame -> (labels, shapeTypes)
+        if contents is not None:
+            self.build(contents)
+
+    def build(self, contents):
+        """index all the annotation files at once, {xmlPath: [(label, shapeType)]}"""
+        for xmlPath, shapes in contents.items():
+            frame = self.frameOf(xmlPath)
+            if frame is not None:
+                self.contents[frame] = (set(label for label, _ in shapes),
+                                        set(shapeType for _, shapeType in shapes))
+        self.frames = sorted(self.contents)
+        for frame in self.frames:  # in order, so the lists come out sorted
+            labels, shapeTypes = self.contents[frame]
+            for label in labels:
+                self.byLabel[label].append(frame)
+            for shapeType in shapeTypes:
+                self.byShapeType[shapeType].append(frame)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def __contains__(self, frame):
+        return frame in self.contents
+
+    def frameOf(self, xmlPath):
+        return self.imgList.indexOfStem(xmlPath)
+
+    def labels(self):
+        return sorted(label for label, frames in self.byLabel.items() if frames)
+
+    def set(self, xmlPath, shapes):
+        """record the (label, shapeType) of the shapes in the annotation file `xmlPath`"""
+        frame = self.frameOf(xmlPath)
+        if frame is None:
+            return
+        self.remove(xmlPath)
+        labels = set(label for label, _ in shapes)
+        shapeTypes = set(shapeType for _, shapeType in shapes)
+        insort(self.frames, frame)
+        for label in labels:
+            insort(self.byLabel[label], frame)
+        for shapeType in shapeTypes:
+            insort(self.byShapeType[shapeType], frame)
+        self.contents[frame] = (labels, shapeTypes)
+
+    def remove(self, xmlPath):
+        frame = self.frameOf(xmlPath)
+        if frame not in self.contents:
+            return
+        labels, shapeTypes = self.contents.pop(frame)
+        removeSorted(self.frames, frame)
+        for label in labels:
+            removeSorted(self.byLabel[label], frame)
+        for shapeType in shapeTypes:
+            removeSorted(self.byShapeType[shapeType], frame)
+
+    def candidates(self, label, shapeType):
+        """the sorted frames to search, and a test for the filter they do not cover"""
+        if label is not None:
+            frames = self.byLabel.get(label, [])
+            if shapeType is None:
+                return frames, None
+            return frames, lambda frame: shapeType in self.contents[frame][1]
+        if shapeType is not None:
+            return self.byShapeType.get(shapeType, []), None
+        return self.frames, None
+
+    def next(self, current, label=None, shapeType=None):
+        """first labelled frame after `current`, of `label` and `shapeType` if given, else None"""
+        frames, accept = self.candidates(label, shapeType)
+        for i in range(bisect_right(frames, current), len(frames)):
+            if accept is None or accept(frames[i]):
+                return frames[i]
+        return None
+
+    def prev(self, current, label=None, shapeType=None):
+        """last labelled frame before `current`, of `label` and `shapeType` if given, else None"""
+        frames, accept = self.candidates(label, shapeType)
+        for i in range(bisect_left(frames, current) - 1, -1, -1):
+            if accept is None or accept(frames[i]):
+                return frames[i]
+        return None
@@ -4,117 +4,146 @@
 # Copyright (c) 2018 Tzutalin
 # Create by Jerry Yang <yangjjie94@gmail.com>
 
-from PyQt5.QtGui import *
-from PyQt5.QtCore import *
-from PyQt5.QtWidgets import *
-from libs.labelFile import LabelFile, LabelFileError
-from libs.shape import Shape, shapeFactory
-from libs.shapeType import shapeTypes
-from libs.ustr import ustr
-import const
 import os
-from PyQt5.QtCore import pyqtSignal, QObject, QPointF, QTimer, QThread
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QObject, QPointF
 from PyQt5.QtGui import QColor
+from libs.pascal_voc_io import PascalVocReader
+from libs.shape import shapeFactory
 from libs.lib import generateColorByText
-from math import ceil
+import const
 
-class LabelsCache(QThread):
-    
-    def __init__(self, imgList):
+def makeShapes(records):
+    """Qt shapes of parsed records (shapeType, label, points, line_color, fill_color, difficult)"""
+    s = []
+    shapeFac = shapeFactory()
+    for shapeType, label, points, line_color, fill_color, difficult in records:
+        shapeFac.setType(shapeType)
+        shape = shapeFac.getShape()
+        shape.label = label
+        for x, y in points:
+            shape.addPoint(QPointF(x, y))
+        shape.difficult = difficult
+        shape.close()
+        shape.line_color = QColor(*line_color) if line_color else generateColorByText(label)
+        shape.fill_color = QColor(*fill_color) if fill_color else generateColorByText(label)
+        s.append(shape)
+    return s
+
+def mtimeOf(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class LabelsCache(QObject):
+    """Annotations of a series, parsed lazily into records.
+
+    Only the records PascalVocReader returns are kept, keyed by annotation
+    path and checked against its mtime, so a saved or edited file is parsed
+    again. Around the current frame the annotations are parsed ahead, nearest
+    first, on a worker thread; Qt shapes are made only for the frame asked for.
+    """
+
+    def __init__(self, imgList, saveDir=None, radius=const.LABELS_CACHE_RADIUS,
+                 size=const.LABELS_CACHE_SIZE):
         super(LabelsCache, self).__init__()
         self.imgPathList = imgList
         self.total = len(self.imgPathList)
-        self.labels_cache = [None for _ in range(self.total)]
-        self.indices = []
-
-        self.begin = 0
+        self.saveDir = saveDir
+        self.radius = radius
+        self.size = max(size, 2 * radius + 1)
+        self.entries = {}  # annotation path -> (mtime_ns, records, verified)
+        self.current = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
         self._stop = False
 
-    def run(self):
-
-        self.update(0, const.UPDATE_STEP)
-        for i in range(ceil((self.total-const.LOAD_WHEN_INIT)/const.UPDATE_STEP) + 1):
-            self.update()
-
     def __len__(self):
-        return len(self.imgPathList)
+        return self.total
 
     def __getitem__(self, n):
-        if self.labels_cache[n] is None:
-            self.load_each(n)
-        return self.labels_cache[n]
-
-    def __setitem__(self, n, value):
-        self.labels_cache[n] = value
+        records, _ = self.read(self.annotationPath(n))
+        return makeShapes(records) if records else None
 
     def __delitem__(self, n):
-        to_del, self.labels_cache[n] = self.labels_cache[n], None
-        del(to_del)
-
-    def update(self, start=None, stop=None):
-        begin = max(start, 0) if start is not None else self.begin
-        end = stop if stop is not None else min(begin + const.UPDATE_STEP, self.total)
-        for i in range(begin, end):
-            self.load_each(i)
-
-        if end >= self.total:
-            self.stop()
+        with self.lock:
+            self.entries.pop(self.annotationPath(n), None)
+
+    def annotationPath(self, n):
+        imgPath = self.imgPathList[n]
+        if self.saveDir is not None:
+            basename = os.path.splitext(os.path.basename(imgPath))[0]
+            return os.path.join(self.saveDir, basename + const.XML_EXT)
+        return os.path.splitext(imgPath)[0] + const.XML_EXT
+
+    def setSaveDir(self, saveDir):
+        with self.lock:
+            self.saveDir = saveDir
+            self.entries.clear()
+        self.moveTo(self.current)
+
+    def read(self, path):
+        """(records, verified) of the annotation file `path`, ([], False) if there is none"""
+        mtime = mtimeOf(path)
+        if mtime is None:
+            return [], False
+        with self.lock:
+            entry = self.entries.get(path)
+        if entry is not None and entry[0] == mtime:
+            return entry[1], entry[2]
+        reader = PascalVocReader(path)
+        records, verified = reader.getShapes(), reader.verified
+        with self.lock:
+            self.entries[path] = (mtime, records, verified)
+        return records, verified
+
+    def records(self, n):
+        return self.read(self.annotationPath(n))
+
+    def order(self, current):
+        """indices within `radius` of `current`, nearest first"""
+        order = [current]
+        for d in range(1, self.radius + 1):
+            order += [i for i in (current + d, current - d) if 0 <= i < self.total]
+        return order
+
+    def start(self):
+        self.moveTo(0)
+
+    def moveTo(self, n):
+        self.current = n
+        if self._stop or self.total == 0:
             return
-
-        self.begin = end
-
-        assert len(self) == self.total, "deletion on mistake"
-
-    def load_each(self, index):
-        filename = self.imgPathList[index]
-        filename = filename[:len(filename)-len(const.JPG_EXT)] + const.XML_EXT
-        if (self.labels_cache[index] is not None):
-            if self.updateLabelFile(filename):
-                s = []
-                shapes = self.labelFile.shapes
-                shapeFac = shapeFactory()
-                for shapeType, label, points, line_color, fill_color, difficult in shapes:
-                    shapeFac.setType(shapeType)
-                    shape = shapeFac.getShape()
-                    shape.label = label
-                    
-                    for x, y in points:
-                        shape.addPoint(QPointF(x, y))
-                    shape.difficult = difficult
-                    shape.close()
-                    if line_color:
-                        shape.line_color = QColor(*line_color)
-                    else:
-                        shape.line_color = generateColorByText(label)
-
-                    if fill_color:
-                        shape.fill_color = QColor(*fill_color)
-                    else:
-                        shape.fill_color = generateColorByText(label)
-                
-                    s.append(shape)
-                self.labels_cache[index] = s
-
-                self.indices.append(index)
-
-    def updateLabelFile(self, filename):
-        unicodeFilePath = ustr(filename)
-        if unicodeFilePath and os.path.exists(unicodeFilePath):
-            if LabelFile.isLabelFile(unicodeFilePath):
-                try:
-                    self.labelFile = LabelFile(unicodeFilePath)
-                except LabelFileError as e:
-                    print("LabelFile: LabelFileError")
-                    return False
-            else:
-                self.labelFile = None
-            return True
-        else:
-            return False
+        if self.future is not None:
+            self.future.cancel()
+        self.future = self.executor.submit(self.readAround, n)
+
+    def readAround(self, n):
+        order = self.order(n)
+        for i in order:
+            if self._stop or self.current != n:
+                return
+            self.records(i)
+        self.trim(order)
+
+    def trim(self, keep):
+        """forget the oldest entries outside `keep` beyond `size`"""
+        with self.lock:
+            if len(self.entries) <= self.size:
+                return
+            kept = set(self.annotationPath(i) for i in keep)
+            for path in [p for p in self.entries if p not in kept][:len(self.entries) - self.size]:
+                del self.entries[path]
 
     def stop(self):
         self._stop = True
+        if self.future is not None:
+            self.future.cancel()
+        self.executor.shutdown(wait=False)
 
     def stopped(self):
         return self._stop
-    
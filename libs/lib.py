@@ -2,6 +2,7 @@ from math import sqrt
 from libs.ustr import ustr
 import hashlib
 import numpy as np
+from libs.geometry import diameters
 try:
     from PyQt5.QtGui import *
     from PyQt5.QtCore import *
@@ -83,8 +84,24 @@ def distancetoline(point, line):
         return np.linalg.norm(p3 - p2)
     return np.linalg.norm(np.cross(p2 - p1, p1 - p3)) / np.linalg.norm(p2 - p1)
 
+def pointsToArray(points):
+    """(n, 2) array of the QPointF `points`"""
+    return np.array([(p.x(), p.y()) for p in points], dtype=np.float64).reshape(-1, 2)
+
 def averageDiameter(p1,p2,p3,p4):
-    return sqrt(distancetopoint(p1, p2) * distancetopoint(p3, p4))
+    return float(diameters(pointsToArray([p1, p2, p3, p4]))[0])
+
+def ndarray2qimage(array):
+    """8 bit grayscale QImage sharing the buffer of the 2D uint8 `array`
+
+    The QImage does not own the buffer, so the array is kept alive as one of
+    its attributes; QPixmap.fromImage copies it anyway when it is shown.
+    """
+    array = np.require(array, np.uint8, 'C')
+    height, width = array.shape
+    image = QImage(array.data, width, height, array.strides[0], QImage.Format_Grayscale8)
+    image.ndarray = array
+    return image
 
 def fmtShortcut(text):
     mod, key = text.split('+', 1)
@@ -4,6 +4,7 @@ import sys
 from xml.etree import ElementTree
 from xml.etree.ElementTree import Element, SubElement
 from lxml import etree
+import numpy as np
 import codecs
 from libs.shapeType import shapeTypes
 import const
@@ -142,6 +143,60 @@ class PascalVocWriter:
         out_file.close()
 
 
+class PascalVocParseError(Exception):
+    pass
+
+
+class PascalVocStreamReader(object):
+    """Streams the objects of a PascalVOC file without building its tree.
+
+    Iterating parses the file with lxml.etree.iterparse and yields
+    (shapeType, label, points, difficult) for every object, `points` being an
+    (n, 2) numpy array of `dtype`; int truncates the coordinates as
+    PascalVocReader always did. Each object is cleared once read, so memory
+    does not grow with the file. `verified` is known once iteration started.
+    A malformed file raises PascalVocParseError.
+    """
+
+    def __init__(self, filepath, dtype=int):
+        self.filepath = filepath
+        self.dtype = dtype
+        self.verified = False
+
+    def __iter__(self):
+        try:
+            context = etree.iterparse(self.filepath, events=('start', 'end'), tag=('annotation', 'object'),
+                                      encoding=const.ENCODE_METHOD)
+            for event, elem in context:
+                if elem.tag == 'annotation':
+                    if event == 'start':
+                        self.verified = elem.get('verified') == 'yes'
+                    continue
+                if event == 'end':
+                    yield self.parseObject(elem)
+                    # drop the object and the ones before it, which the tree keeps otherwise
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del elem.getparent()[0]
+        except (etree.XMLSyntaxError, OSError) as e:
+            raise PascalVocParseError("{}: {}".format(self.filepath, e))
+
+    def parseObject(self, elem):
+        shapeType = elem.findtext('shapeType')
+        label = elem.findtext('label')
+        points_item = elem.find('points')
+        if shapeType is None or label is None or points_item is None:
+            raise PascalVocParseError("{}:{}: object without shapeType, label or points".format(
+                self.filepath, elem.sourceline))
+        try:
+            points = np.array([(float(point[0].text), float(point[1].text)) for point in points_item],
+                              dtype=float).reshape(-1, 2).astype(self.dtype)
+            difficult = bool(int(elem.findtext('difficult', '0')))
+        except (IndexError, TypeError, ValueError) as e:
+            raise PascalVocParseError("{}:{}: {}".format(self.filepath, elem.sourceline, e))
+        return shapeType, label, points, difficult
+
+
 class PascalVocReader:
 
     def __init__(self, filepath):
@@ -154,10 +209,13 @@ class PascalVocReader:
         self.filepath = filepath
 
         self.verified = False
+        self.error = None
         try:
             self.parseXML()
-        except:
-            pass
+        except PascalVocParseError as e:
+            # keep the shapes read so far, as the labels of a half-written file are still worth showing
+            self.error = e
+            print("PascalVocReader: {}".format(e))
 
     def getShapes(self):
         return self.shapes
@@ -167,25 +225,9 @@ class PascalVocReader:
 
     def parseXML(self):
         assert self.filepath.endswith(const.XML_EXT), "Unsupport file format"
-        parser = etree.XMLParser(encoding=const.ENCODE_METHOD)
-        xmltree = ElementTree.parse(self.filepath, parser=parser).getroot()
-        filename = xmltree.find('filename').text
-        try:
-            verified = xmltree.attrib['verified']
-            if verified == 'yes':
-                self.verified = True
-        except KeyError:
-            self.verified = False
-
-        for object_iter in xmltree.findall('object'):
-            shapeType = object_iter.find("shapeType").text
-            points_item = object_iter.find("points")
-            points = [(int(float(point[0].text)), int(float(point[1].text))) for point in points_item]
-
-            label = object_iter.find('label').text
-            # Add chris
-            difficult = False
-            if object_iter.find('difficult') is not None:
-                difficult = bool(int(object_iter.find('difficult').text))
-            self.addShape(shapeType, label, points, difficult)
-        return True
\ No newline at end of file
+        reader = PascalVocStreamReader(self.filepath)
+        for shapeType, label, points, difficult in reader:
+            self.verified = reader.verified
+            self.addShape(shapeType, label, [tuple(point) for point in points.tolist()], difficult)
+        self.verified = reader.verified
+        return True
@@ -11,6 +11,10 @@ import numpy as np
 from PyQt5.QtCore import pyqtSignal, QPointF, QThread
 import const
 from PyQt5.QtGui import QImage
+from libs.frameStore import FrameStore
+from libs.lib import ndarray2qimage
+from libs.cache import Cache
+from libs.background import estimateBackground, RollingBackground
 
 def read(filename, default=None):
     try:
@@ -19,53 +23,125 @@ def read(filename, default=None):
     except:
         return default
 
+class PreprocessedCache(Cache):
+    """preprocessed frames of `preprocessor`, prefetched around the current index
+
+    It has its own memory budget. The frames depend on the background and on
+    beta, so the preprocessor invalidates the cache whenever one changes.
+    """
+
+    def __init__(self, preprocessor, budget=const.PREPROCESS_MEMORY_BUDGET, workers=const.CACHE_WORKERS):
+        super(PreprocessedCache, self).__init__(preprocessor.imgPathList, budget=budget, workers=workers)
+        self.preprocessor = preprocessor
+
+    def decode(self, i):
+        return self.preprocessor.process(i)
+
+
 class PreprocessThread(QThread):
-    """background subtraction and other preprossing procedure"""
+    """background subtraction and other preprossing procedure
+
+    Indexing returns the preprocessed frames through self.cache, which
+    computes them on a worker pool ahead of the user. In rolling mode the
+    windows of the rolling background take PREPROCESS_ROLLING_SHARE of the
+    memory budget and the cache the rest.
+    """
     backgroundGenerated = pyqtSignal()
+    backgroundProgress = pyqtSignal(int, int)
 
-    def __init__(self, imgList, length=const.PREPROSSESS_BACKGROUND_LENGTH, imread_format=const.IMREAD_FORMAT):
+    def __init__(self, imgList, length=const.PREPROSSESS_BACKGROUND_LENGTH, imread_format=const.IMREAD_FORMAT,
+                 beta=const.PREPROSSESS_BACKGROUND_BETA, method=const.PREPROSSESS_BACKGROUND_METHOD,
+                 mode=const.PREPROCESS_MODE_GLOBAL):
         super(PreprocessThread, self).__init__()
+        self.method = method
+        self.mode = mode
         self.imgPathList = imgList
         self.backgroundFilePath = os.path.join(os.path.dirname(self.imgPathList[0]), const.BACKGROUND_FILENAME)
         self.background = None
+        self.scaledBackground = None  # beta * background
+        self.beta = beta
         self.length = length
         self.imread_format = imread_format
-
-    def generateBackground(self):
-
-        tmp_img = cv2.imread(self.imgPathList[0], self.imread_format)    
-        background = np.zeros_like(tmp_img, dtype=np.int32)
-        for _, f in zip(range(self.length), self.imgPathList):
-            img = cv2.imread(f, self.imread_format)
-            background = np.add(background, img)
-        background = np.divide(background, min(self.length, len(self.imgPathList)))
-        cv2.imwrite(self.backgroundFilePath,background)
+        self.frameStore = FrameStore.open(self.imgPathList) if imread_format == cv2.IMREAD_GRAYSCALE else None
+        self.rolling = RollingBackground(self.load_origin, len(self.imgPathList),
+                                         budget=int(const.PREPROCESS_MEMORY_BUDGET * const.PREPROCESS_ROLLING_SHARE))
+        self.cache = PreprocessedCache(self, budget=self.cacheBudget())
+
+    def setBackground(self, background):
+        self.background = background
+        self.scaledBackground = np.multiply(background, self.beta, dtype=np.float32)
+        self.cache.invalidate()
+
+    def cacheBudget(self):
+        if self.mode == const.PREPROCESS_MODE_ROLLING:
+            return const.PREPROCESS_MEMORY_BUDGET - self.rolling.budget
+        return const.PREPROCESS_MEMORY_BUDGET
+
+    def setMode(self, mode):
+        """subtract the global background or the rolling one, see constants"""
+        if mode != self.mode:
+            self.mode = mode
+            self.cache.budget = self.cacheBudget()
+            self.cache.invalidate()
+            if mode != const.PREPROCESS_MODE_ROLLING:
+                self.rolling.clear()
+
+    def setBeta(self, beta):
+        self.beta = beta
+        if self.background is not None:
+            self.setBackground(self.background)
+
+    def generateBackground(self, refine=None):
+        background = estimateBackground(self.imgPathList, method=self.method, length=self.length,
+                                        imread_format=self.imread_format, frameStore=self.frameStore,
+                                        progress=self.backgroundProgress.emit, refine=refine)
+        cv2.imwrite(self.backgroundFilePath, background)
         return background
 
+    def refineBackground(self, background):
+        """takes an intermediate estimate, usable before all frames are read"""
+        self.setBackground(background)
+        self.backgroundGenerated.emit()
+
     def run(self):
+        background = None
         if os.path.exists(self.backgroundFilePath):
-            self.background = cv2.imread(self.backgroundFilePath, self.imread_format)
-        if self.background is None:
-            self.background = self.generateBackground()
+            background = cv2.imread(self.backgroundFilePath, self.imread_format)
+        if background is None:
+            background = self.generateBackground(refine=self.refineBackground)
+        self.setBackground(background)
         self.backgroundGenerated.emit()
 
+    def stop(self):
+        self.cache.stop()
+
     def __getitem__(self,i):
+        return self.cache[i]
+
+    def process(self, i):
         ori = self.load_origin(i)
-        result = self.backgroundSubtraction(ori)
+        if self.mode == const.PREPROCESS_MODE_ROLLING:
+            result = self.backgroundSubtraction(ori, background=self.rolling.at(i))
+        else:
+            result = self.backgroundSubtraction(ori)
         result = self.equalizeHist(result)
-        tmp_filepath = os.path.join(os.path.dirname(self.imgPathList[0]), "temp.jpg")
-        cv2.imwrite(tmp_filepath, result)
-        imageData = read(tmp_filepath, None)
-        image = QImage.fromData(imageData)
-        os.remove(tmp_filepath)
-        return image
+        return ndarray2qimage(result)
 
     def load_origin(self, i):
+        if self.frameStore is not None:
+            return self.frameStore[i]
         return cv2.imread(self.imgPathList[i], self.imread_format)
 
-    def backgroundSubtraction(self, img, beta=const.PREPROSSESS_BACKGROUND_BETA):
-        background = self.background if self.background is not None else self.generateBackground()
-        result = np.subtract(img, beta * self.background)
+    def backgroundSubtraction(self, img, beta=None, background=None):
+        if background is not None:
+            background = (self.beta if beta is None else beta) * background
+        else:
+            background = self.scaledBackground if beta is None else self.background
+            if background is None:  # until run() sets it, which invalidates the frames returned meanwhile
+                return img
+            if beta is not None:
+                background = beta * background
+        result = np.subtract(img, background, dtype=np.float32)
         result = abs(result)
 
         return result
@@ -95,16 +171,3 @@ class PreprocessThread(QThread):
     #         img = self.qimage2numpyarray(imgdata)
     #         bg = np.add(bg, img)
     #     bg = np.array(bg,dtype=int)
-
-#     def ndarray2qimage(ndarray):
-# #     qimage = QImage()
-#     if len(ndarray.shape) == 2:
-#         height, width = ndarray.shape
-#     elif len(ndarray.shape) == 3:
-#         height, width, depth = ndarray.shape
-#     if ndarray.dtype == np.uint8:
-#         bytesPerComponent = 8
-#         bytesPerLine = bytesPerComponent * width
-# #     image = cv2.cvtColor(ndarray, cv2.COLOR_GRAY2RGB) 
-#     qimage = QImage(ndarray.data, width, height, bytesPerLine, QImage.Format_RGB888) 
-#     return qimage
\ No newline at end of file
@@ -8,7 +8,8 @@ except ImportError:
     from PyQt4.QtGui import *
     from PyQt4.QtCore import *
 
-from libs.lib import struct, distance, distancetoline, distancetopoint, averageDiameter
+from libs.lib import struct, distance, distancetoline, distancetopoint, pointsToArray
+from libs.geometry import diameters
 import sys
 import copy
 import math
@@ -551,8 +552,7 @@ class Ellipse(Shape):
     #         self.params.roundity = None
 
     def getDiameter(self):
-        p1, p2, p3, p4 = self.points
-        return averageDiameter(p1,p2,p3,p4)
+        return float(diameters(pointsToArray(self.points))[0])
 
     def setOpen(self):
         self._closed = False
@@ -8,7 +8,6 @@ from PyQt5.QtCore import QThread, pyqtSignal, QPointF
 import pandas as pd
 import numpy as np
 import os
-from math import sqrt
 import xlwt
 from copy import deepcopy
 import pickle
@@ -19,10 +18,11 @@ from libs.pascal_voc_io import PascalVocReader
 # from libs.lib import distancetopoint, averageRadius
 from libs.shapeType import shapeTypes
 from libs.labelFile import LabelFile, LabelFileError
-from libs.shape import Shape, shapeFactory
+from libs.shape import Shape
 
-from libs.lib import distancetopoint
-from collections import namedtuple, OrderedDict, defaultdict
+from libs.geometry import diameters
+from libs.annotationSnapshot import AnnotationSnapshot
+from collections import OrderedDict, defaultdict
 from functools import reduce
 
 const.LABEL_DEFAULT_TRACK = 'Broken'
@@ -52,33 +52,19 @@ class NumDensityReporter(QThread):
 
     @staticmethod
     def get_report_df(filesdir, lengthValue):
+        # the ellipses come from the snapshot of the save dir, only the files changed since it was written are parsed
+        return NumDensityReporter.build_report_df(AnnotationSnapshot.open(filesdir), lengthValue)
 
-        filepaths = NumDensityReporter.scanAllFiles(filesdir)
-
-        report_df = pd.DataFrame(columns=['dir','xmlfile', 'index', 'diameter'])
-        for i_xml, xmlPath in enumerate(filepaths):
-            *dir_, _ = xmlPath.split('_')
-            dir_ = os.path.basename("_".join(dir_)) if isinstance(dir_, (list, tuple)) else os.path.basename(dir_)
-
-            xmlfilename = os.path.basename(xmlPath)
-            if os.path.isfile(xmlPath) is False:
-                continue
-            tVocParseReader = PascalVocReader(xmlPath)
-            shapes = tVocParseReader.getShapes()
-            i_label = 0
-            i_track = 0
-            i_easytrack = 0
-            for shape in shapes:
-                shapeType, label, points, _, _, difficult = shape
-                if shapeType == shapeTypes.ellipse:
-                    diameter = getDiameter(points) * lengthValue
-                    report_df = report_df.append([{
-                        'dir': dir_,
-                        'xmlfile':xmlfilename, 
-                        'index':i_label, 
-                        'diameter':diameter}])
-                    i_label += 1
-        return report_df
+    @staticmethod
+    def build_report_df(shapes_df, lengthValue):
+        """the report of the ellipses of `shapes_df`, a snapshot of the shapes, built column by column"""
+        shapes_df = shapes_df[shapes_df['shapeType'] == shapeTypes.ellipse]
+        return pd.DataFrame({
+            'dir': shapes_df['subdir'].to_numpy(),
+            'xmlfile': shapes_df['path'].map(os.path.basename).to_numpy(),
+            'index': shapes_df.groupby('path', sort=False).cumcount().to_numpy(),  # ellipses so far in each file
+            'diameter': shapes_df['diameter'].to_numpy() * lengthValue},
+            columns=['dir','xmlfile', 'index', 'diameter'])
 
     def getText(self):
 
@@ -142,186 +128,117 @@ class TrackReporter(QThread):
 
     @staticmethod
     def get_easy_track_report_df(dir, lengthValue, labelHist):
-        easy_track_df = pd.DataFrame(columns=['dir', 'xmlfilename', 'index', 'label', 'shapeType','points', 'difficult'])
-
-        filepaths = NumDensityReporter.scanAllFiles(dir)
-
-        for i_xml, xmlPath in enumerate(filepaths):
-            *dir_, _ = xmlPath.split('_')
-            dir_ = os.path.basename("_".join(dir_)) if isinstance(dir_, (list, tuple)) else os.path.basename(dir_)
-            
-            xmlfilename = os.path.basename(xmlPath)
-
-            if os.path.isfile(xmlPath) is False:
-                continue
-            tVocParseReader = PascalVocReader(xmlPath)
-            shapes = tVocParseReader.getShapes()
-            
-            i_easytrack = 0
-            for shape in shapes:
-                shapeType, label, points, _, _, difficult = shape
-
-                if label not in labelHist:
-                    easy_track_df = easy_track_df.append([{
-                            'dir':dir_,
-                            # 'subdir':subdir, 
-                            'xmlfilename':xmlfilename, 
-                            'index':i_easytrack, 
-                            'label':label,
-                            'shapeType':shapeType,
-                            'points':points,
-                            'difficult':difficult}])
-                    i_easytrack += 1
-        return easy_track_df
+        return TrackReporter.build_easy_track_report_df(AnnotationSnapshot.open(dir), labelHist)
 
-    def run(self):
+    @staticmethod
+    def build_easy_track_report_df(shapes_df, labelHist):
+        """the shapes of `shapes_df` but those of `labelHist`, built column by column"""
+        if labelHist:
+            shapes_df = shapes_df[~shapes_df['label'].isin(list(labelHist))]
+        return pd.DataFrame({
+            'dir': shapes_df['subdir'].to_numpy(),
+            'xmlfilename': shapes_df['path'].map(os.path.basename).to_numpy(),
+            'index': shapes_df.groupby('path', sort=False).cumcount().to_numpy(),
+            'label': shapes_df['label'].to_numpy(),
+            'shapeType': shapes_df['shapeType'].to_numpy(),
+            'points': shapes_df['points'].to_numpy(),
+            'difficult': shapes_df['difficult'].to_numpy()},
+            columns=['dir', 'xmlfilename', 'index', 'label', 'shapeType','points', 'difficult'])
 
-        xmls = []
-        for index, (dirpath, dirnames, filenames) in enumerate(os.walk(self.dir)):
-            xmls.extend(list(map(lambda s: os.path.join(dirpath, s), filter(lambda s: True if s.endswith(".xml") else False, filenames))))
-
-        easy_track_df = pd.DataFrame()
-        for xml in xmls:
-            tVocParseReader = PascalVocReader(xml)
-            shapes = tVocParseReader.getShapes()
-            
-            xmlfilename = os.path.basename(xml)
-            *dir_, _ = xml.split('_')
-            dir_ = os.path.basename("_".join(dir_)) if isinstance(dir_, (list, tuple)) else os.path.basename(dir_)
-            
-            i_easytrack = 0
-            for shape in shapes:
-                shapeType, label, points, _, _, difficult = shape
-                if label not in self.labelHist:
-                    easy_track_df = easy_track_df.append([{
-                            'subdir':dir_,
-                            'xmlfilename':xmlfilename, 
-                            'index':i_easytrack, 
-                            'label':label,
-                            'shapeType':shapeType,
-                            'points':points,
-                            'difficult':difficult}],
-                            ignore_index= True)
-                    i_easytrack += 1
-
-        easy_track_df.sort_values(by=["subdir", "xmlfilename", "label"]).reindex(range(len(easy_track_df)))
-
-
-        ShapeObj = namedtuple('ShapeObj', ['subdir', 'label', 'shape'])
-        shape_obj_list = []
-        shape_obj_dict_list = []
-
-        subdirs = sorted(list(easy_track_df.subdir.value_counts().keys()))
-
-        for i_subdir, subdir in enumerate(subdirs):
-            tmp_sub_df = easy_track_df[easy_track_df["subdir"] == subdir].sort_values(by="label")
-            shape_obj_list_tmp = []
-            
-            for i, row in tmp_sub_df.iterrows():
-                subdir = row.subdir
-                xmlfilename = row.xmlfilename
-                shapeType = row.shapeType
-                label = row.label.lower().strip()
-                points = row.points
-                difficult = row.difficult
-                shapeFac = shapeFactory()
-                shapeFac.setType(shapeType)
-                shape = shapeFac.getShape()
-                shape.points = [QPointF(*xy) for xy in points]
-                shape.label = label
-                shape.difficult = difficult
-                shape.close()
-                
-                shape_obj = ShapeObj(subdir, label, shape)
-                shape_obj_list_tmp.append(shape_obj)
-                
+    @staticmethod
+    def get_broken_info(easy_track_df):
+        """{n: [(diameter 1, ..., diameter n)]} of the drops broken in n, from the labels of `easy_track_df`
+
+        In each subdir a label without a space, e.g. 'broken', starts a group
+        which the labels 'broken 0', 'broken 1', ... of its pieces join.
+        """
+        groups = []  # the points of the pieces of each broken drop
+        for subdir, sub_df in easy_track_df.groupby('dir', sort=True):
+            sub_df = sub_df.sort_values(by="label", kind='stable')
             shape_obj_dict = OrderedDict()
-            for shape in shape_obj_list_tmp:
-                just_found_one = False
-                key = " "
-                if " " not in shape.label:
-                    key = shape.label
-                    shape_obj_dict[key] = []
-                    just_found_one = True
-                if shape.label.split(" ", 1)[0] in shape_obj_dict.keys():
-                    if not just_found_one:
-                        shape_obj_dict[shape.label.split(" ", 1)[0]].append(shape)
-                    
-            # 去除字典中小于1个的情况
-            to_del = []
-            for key,value in shape_obj_dict.items():
-                if len(value) <= 1:
-                    to_del.append(key)
-            for key in to_del:
-                shape_obj_dict.pop(key)
-            
-            shape_obj_list.extend(shape_obj_list_tmp)
-            shape_obj_dict_list.append(shape_obj_dict)
+            for label, points in zip(sub_df['label'], sub_df['points']):
+                label = label.lower().strip()
+                if " " not in label:
+                    shape_obj_dict[label] = []
+                    continue
+                key = label.split(" ", 1)[0]
+                if key in shape_obj_dict:
+                    shape_obj_dict[key].append(points)
 
-        broken_info_dict = defaultdict(list)
-        for shape_obj_dict_tmp in shape_obj_dict_list:
-            for _, shape_objs in shape_obj_dict_tmp.items():
-                n_break = len(shape_objs)
-                diameters = tuple(shape_obj.shape.getDiameter() for shape_obj in shape_objs)
-                if n_break in broken_info_dict.keys():
-                    broken_info_dict[n_break].append(diameters)
-                else:
-                    broken_info_dict[n_break] = [diameters]
+            # 去除字典中小于1个的情况
+            groups.extend(pieces for pieces in shape_obj_dict.values() if len(pieces) > 1)
 
-        def genSheetname(s):
-            return "broken {}".format(s)
+        # the diameters of all the pieces in one go, NaN for those which are not given by 4 points
+        pieces = np.full((sum(len(pieces) for pieces in groups), 4, 2), np.nan)
+        for i, points in enumerate(points for pieces in groups for points in pieces):
+            if len(points) == 4:
+                pieces[i] = points
+        diameters_ = diameters(pieces).tolist()
 
-        def genColname(i):
-            return "diameter {}".format(i+1)
+        broken_info_dict = defaultdict(list)
+        start = 0
+        for group in groups:
+            broken_info_dict[len(group)].append(tuple(diameters_[start:start + len(group)]))
+            start += len(group)
+        return broken_info_dict
 
+    @staticmethod
+    def get_broken_dfs(broken_info_dict):
+        """({n: diameters of the drops broken in n}, summary of the breakages two drops at a time)"""
         df_dict = dict()
-        for key, value in broken_info_dict.items():
-            columns = [genColname(i) for i in range(key)]  # range(len(value))
+        summary_columns = [[] for _ in range(6)]
+        for n_breakage, value in broken_info_dict.items():
+            columns = [genColname(i) for i in range(n_breakage)]
             df = pd.DataFrame(value, columns=columns)
             df['diameter of mother drop'] = reduce( lambda x, y: (x**3 + y**3)**(1/3), 
                                                     [df[col] for col in columns])
-            columns_frac = [col+" frac" for col in columns]
-            for col in columns_frac:
-                df[col] = df[col[:-len(" frac")]]**3 / df['diameter of mother drop']**3
-
-            df_dict[key] = df
-
-        summary_df_data = []
-        for i_df, df in df_dict.items():
-            columns = [genColname(i) for i in range(i_df)]
-            for i, row in df.iterrows():
-                drops = list(row[columns])
-                assert(len(drops) == i_df)
-                drops.sort()
-                mother_drops = [0 for _ in range(len(drops))]
-                mother_drops[0] = drops[0]
-                for i in range(len(drops)-1):
-                    drop_1 = mother_drops[i]
-                    drop_2 = drops[i+1]
-                    mother_drops[i+1] = (drop_1**3 + drop_2**3)**(1/3)
-                    drop_1_frac = drop_1**3 / mother_drops[i+1]**3
-                    drop_2_frac = drop_2**3 / mother_drops[i+1]**3
-                    n_breakage = i_df
-                    summary_df_data.append((drop_1, drop_2, mother_drops[i+1], 
-                                            drop_1_frac, drop_2_frac, n_breakage))
-        summary_df = pd.DataFrame(summary_df_data, columns=[ 'drop_1', 'drop_2', 'mothoer_drop', 
-                                            'drop_1_frac', "drop_2_frac", "n_breakage"])
+            for col in columns:
+                df[col + " frac"] = df[col]**3 / df['diameter of mother drop']**3
+            df_dict[n_breakage] = df
+
+            # the pieces merged back one at a time from the smallest: mother_drops[:, j] is made of drops[:, :j+1]
+            drops = np.sort(df[columns].to_numpy(dtype=float), axis=1)
+            mother_drops = np.cbrt(np.cumsum(drops**3, axis=1))
+            drop_1, drop_2, mother_drop = mother_drops[:, :-1], drops[:, 1:], mother_drops[:, 1:]
+            for column, values in zip(summary_columns, (drop_1, drop_2, mother_drop, drop_1**3 / mother_drop**3,
+                                                        drop_2**3 / mother_drop**3)):
+                column.append(values.ravel())
+            summary_columns[5].append(np.full(drop_1.size, n_breakage))
+
+        summary_df = pd.DataFrame(
+            dict(zip(['drop_1', 'drop_2', 'mothoer_drop', 'drop_1_frac', "drop_2_frac", "n_breakage"],
+                     [np.concatenate(column) if column else [] for column in summary_columns])),
+            columns=['drop_1', 'drop_2', 'mothoer_drop', 'drop_1_frac', "drop_2_frac", "n_breakage"])
+        return df_dict, summary_df
+
+    def run(self):
+
+        easy_track_df = TrackReporter.get_easy_track_report_df(self.dir, self.lengthValue, self.labelHist)
+        broken_info_dict = TrackReporter.get_broken_info(easy_track_df)
+        df_dict, summary_df = TrackReporter.get_broken_dfs(broken_info_dict)
 
         filename = os.path.join(os.path.dirname(self.dir), "summary-{}.xlsx".format(os.path.basename(self.dir)))
-        writer = pd.ExcelWriter(filename)
-        for i_df, df in df_dict.items():
-            df.to_excel(writer, genSheetname(i_df))
-        summary_df.to_excel(writer, "summary")
-        writer.save()
+        writeSheets(filename, brokenSheets(df_dict, summary_df))
 
         text = "\n".join(["# {i}-elem break: {num}".format(i=str(i).rjust(2), num=str(len(broken_info_dict[i])).rjust(3)) for i in range(2, 11)])
         text += "\n" + "# total: {total}".format(total=len(summary_df))
         self.finished.emit(text)
 
+def brokenSheets(df_dict, summary_df):
+    """[(sheet name, df)] of the tables of TrackReporter.get_broken_dfs"""
+    return [(genSheetname(i_df), df) for i_df, df in df_dict.items()] + [("summary", summary_df)]
+
+def writeSheets(filename, sheets):
+    """write the [(sheet name, df)] `sheets` to the workbook `filename`"""
+    with pd.ExcelWriter(filename) as writer:
+        for sheetname, df in sheets:
+            df.to_excel(writer, sheet_name=sheetname)
+
+def genSheetname(s):
+    return "broken {}".format(s)
+
+def genColname(i):
+    return "diameter {}".format(i+1)
+
 def getDiameter(pts):
-    def distance(p1, p2):
-        x1, y1 = p1
-        x2, y2 = p2
-        return sqrt( (x2-x1)**2 + (y2-y1)**2 )
-    p1, p2, p3, p4 = pts
-    return sqrt(distance(p1, p2) * distance(p3, p4))
+    return float(diameters(pts)[0])
@@ -8,19 +8,18 @@ from PyQt5.QtCore import QThread, pyqtSignal, QPointF
 import pandas as pd
 import numpy as np
 import os
-from math import sqrt
-from copy import deepcopy
+import re
 
 import const
-from libs.pascal_voc_io import PascalVocReader
 # from libs.lib import distancetopoint, averageRadius
 from libs.shapeType import shapeTypes
-from libs.statisticReport import reportGenerator
 from libs.shape import shapeFactory
 from libs.shapeType import shapeTypes
-from libs.lib import distancetopoint
+from libs.lib import pointsToArray
+from libs.geometry import ellipseMetrics, outlines, boundingBoxes, overlaps
+from libs.boxGrid import BoxGrid
+from libs.imageSeries import ImageSeries
 from collections import namedtuple, OrderedDict
-from functools import reduce
 
 const.LABEL_DEFAULT_TRACK_START = 'Broken 0'
 
@@ -34,11 +33,10 @@ class reportTrack(QThread):
 
     def __init__(self, imgList, scale=1):
         super(reportTrack, self).__init__()
-        if ((imgList is None) or 
-            (isinstance(imgList,(tuple, list)) and len(imgList) == 0)):
+        if imgList is None or len(imgList) == 0:  # a list or an ImageSeries
             return
         
-        self.imgPathList = imgList
+        self.imgPathList = ImageSeries.of(imgList)
         self.scale = scale
 
         self.csvfilename = os.path.join(os.path.dirname(self.imgPathList[0]), const.FILENAME_TRACK)
@@ -52,96 +50,34 @@ class reportTrack(QThread):
         if self.track_df is None or len(self.track_df) == 0:
             return None
 
-        self.dir = self.track_df.get_value(0,'dir')
-        self.subdir = self.track_df.get_value(0,'subdir')
+        self.dir = self.track_df.at[0,'dir']
+        self.subdir = self.track_df.at[0,'subdir']
         self.dirPath = os.path.join(self.dir, self.subdir)
 
-        self.shapeFactory = shapeFactory()
-
     def run(self):
-
-        ShapeObj = namedtuple('ShapeObj', ['i_img', 'label', 'shape'])
-        self.ShapeObjsbyFrame = OrderedDict()
         # self.track_df = pd.DataFrame(
         # columns=[
         # 'dir', 'subdir', 'imgfile', 
         # 'index', 'label', 'shapeType',
         # 'points', 'difficult'])
-        for i, row in self.track_df.iterrows():
-            imgfile = row.imgfile
-            # index = int(row.index)  # label: Broken 0/1/2/...
-            label = row.label
-            shapeType = row.shapeType
-            points = eval(row.points)
-            difficult = bool(row.difficult)
-            self.shapeFactory.setType(shapeType)
-            shape = self.shapeFactory.getShape()
-            shape.points = [QPointF(*xy) for xy in points]
-            shape.label = label
-            shape.difficult = difficult
-            shape.close()
-
-            imgfilepath = os.path.join(self.dirPath, imgfile)
-            i_imgfilepath = self.imgPathList.index(imgfilepath)
-
-            shape_obj = ShapeObj(i_imgfilepath, label, shape)
-            if i_imgfilepath in self.ShapeObjsbyFrame.keys():
-                self.ShapeObjsbyFrame[i_imgfilepath].append(shape_obj)
-            else:
-                self.ShapeObjsbyFrame[i_imgfilepath] = [shape_obj]
-
-        self.shape_obj_trees = Trees()
-
-        # init self.shape_obj_trees
-        for i_img, shape_objs in self.ShapeObjsbyFrame.items():
-            for _, shape_obj in enumerate(shape_objs):
-                if shape_obj.label == const.LABEL_DEFAULT_TRACK_START:
-                    self.shape_obj_trees.append(Tree(shape_obj))
-            break
-
-        for i_img, shape_objs in self.ShapeObjsbyFrame.items():
-            if i_img+1 in self.ShapeObjsbyFrame.keys():
-                next_shape_objs = self.ShapeObjsbyFrame[i_img+1]
-                for _, shape_obj in enumerate(shape_objs):
-                    tree, node = self.shape_obj_trees.getNode(shape_obj)
-                    if tree is not None and node is not None:  # 如果该帧的该图形已经被加到树中，到下一帧去找与它相交的图形，并加为它的孩子
-                        for _, next_shape_obj in enumerate(next_shape_objs):
-                            if intersects(shape_obj.shape.makePath(), next_shape_obj.shape.makePath()):
-                                tree.addKid(node, next_shape_obj)
-
-                    elif shape_obj.label == const.LABEL_DEFAULT_TRACK_START: # 如果该帧的图像暂时不在树中，且满足树根的条件，那么加到树根中去
-                        self.shape_obj_trees.append(Tree(shape_obj))
-        
+        i_imgs = [self.imgPathList.index(os.path.join(self.dirPath, imgfile)) for imgfile in self.track_df['imgfile']]
+        self.ShapeObjsbyFrame = shapeObjsByFrame(zip(
+            i_imgs, self.track_df['label'], self.track_df['shapeType'],
+            map(parsePoints, self.track_df['points']), self.track_df['difficult']))
+        self.shape_obj_trees = trackFrames(self.ShapeObjsbyFrame)
+
         text = self.genText()
         self.finished.emit(text)
 
     def genText(self):
-        paths_dict = self.shape_obj_trees.genPaths()
-        n_trees = len(paths_dict)
-        TreeStat = namedtuple('TreeStat', ['n_breakage', 'diameters'])
+        self.tree_stats = self.shape_obj_trees.stats()
+        n_trees = len(self.tree_stats)
         stat = ""
-        tree_stats_dict = OrderedDict()
-        for i_tree, paths in paths_dict.items():
-            diameters = [0 for _ in range(len(paths))]
-            start = paths[0][0].data.i_img
-            end = len(paths[0]) + start
-            for i_path, path in enumerate(paths):
-                end = len(path) + start if len(path) + start > end else end
-                n_fork = 0
-                for i, node in enumerate(path):
-                    for otherpath in paths:
-                        if path == otherpath:
-                            continue
-                        elif i < len(otherpath) and path[i] == otherpath[i]:
-                            n_fork = i
-                diameters[i_path] = getRadiusFromPath(path[n_fork+1:])
-                
-            tree_stats_dict[i_tree] = TreeStat( len(paths_dict[i_tree]), diameters)
-        for _, tree_stat in tree_stats_dict.items():
+        for tree_stat in self.tree_stats:
             stat += "{n_breakage}-element breakage: from {start} to {end}\n{diameters_}\n".format(
                         n_breakage=tree_stat.n_breakage, 
-                        start=start, 
-                        end=end, 
+                        start=tree_stat.start, 
+                        end=tree_stat.end, 
                         diameters_="+".join(map(lambda x:"{:.2f}".format(x), tree_stat.diameters)))
 
         text = """
@@ -153,27 +89,113 @@ total breakage #: {}
 """.format(n_trees, stat)
         return text
 
+ShapeObj = namedtuple('ShapeObj', ['i_img', 'label', 'shape'])
+
+def shapeObjsByFrame(rows, factory=None):
+    """OrderedDict {frame: [ShapeObj]} of the (frame, label, shapeType, points, difficult) `rows`, in their order"""
+    factory = shapeFactory() if factory is None else factory
+    shape_objs_by_frame = OrderedDict()
+    for i_img, label, shapeType, points, difficult in rows:
+        factory.setType(shapeType)
+        shape = factory.getShape()
+        shape.points = [QPointF(*xy) for xy in points]
+        shape.label = label
+        shape.difficult = bool(difficult)
+        shape.close()
+        shape_objs_by_frame.setdefault(i_img, []).append(ShapeObj(i_img, label, shape))
+    return shape_objs_by_frame
+
+def trackFrames(shape_objs_by_frame):
+    """Trees of the tracks through the frames of `shape_objs_by_frame`, {frame: [ShapeObj]}
+
+    A track starts at a shape labelled LABEL_DEFAULT_TRACK_START which is
+    in no tree yet, and the shapes of a tree take as kids those they overlap
+    in the next frame, frame + 1.
+    """
+    trees = Trees()
+
+    # the outlines of the shapes of a frame are computed once, for the frame and the one before it
+    frameShapes = {}
+    def shapesOf(i_img):
+        if i_img not in frameShapes:
+            frameShapes[i_img] = FrameShapes(shape_objs_by_frame[i_img])
+        return frameShapes[i_img]
+
+    # one pass over the frames: the shapes already in a tree, or starting one, take as kids those they intersect in the next frame
+    first = True
+    for i_img, shape_objs in shape_objs_by_frame.items():
+        has_next = i_img+1 in shape_objs_by_frame
+        tracked = []
+        for i_shape, shape_obj in enumerate(shape_objs):
+            tree, node = trees.getNode(shape_obj)
+            if node is None and shape_obj.label == const.LABEL_DEFAULT_TRACK_START and (first or has_next):
+                # 如果该帧的图像暂时不在树中，且满足树根的条件，那么加到树根中去
+                tree = Tree(shape_obj)
+                trees.append(tree)
+                node = tree.root
+            if node is not None and has_next:
+                tracked.append((i_shape, tree, node))
+        if tracked:  # 到下一帧去找与它相交的图形，并加为它的孩子, for all the shapes of the frame at once
+            next_shape_objs = shape_objs_by_frame[i_img+1]
+            kids = shapesOf(i_img+1).overlapping(shapesOf(i_img).outlines[[i_shape for i_shape, _, _ in tracked]])
+            for (_, tree, node), i_nexts in zip(tracked, kids):
+                for i_next in i_nexts:
+                    trees.addKid(tree, node, next_shape_objs[i_next])
+        first = False
+        frameShapes.pop(i_img, None)
+    return trees
+
 def getRadiusFromPath(path):
+    """diameter of the roundest ellipse of the nodes of `path`, 0 if there is none"""
     if path is None or len(path) == 0:
         return 0
-    for node in path:
-        radius, roundity = 0, 0
-        if node.data.shape.shapeType == shapeTypes.ellipse:
-            p1,p2,p3,p4 = node.data.shape.points
-            l1 = distancetopoint(p1,p2)
-            l2 = distancetopoint(p3,p4)
-            tmp_roundity = l1/l2 if l1/l2 < 1 else l2/l1
-            if tmp_roundity > roundity:
-                radius, roundity = sqrt(l1*l2), tmp_roundity
-    return radius
+    return roundestDiameters([path])[0]
+
+def roundestDiameters(paths):
+    """for each of `paths`, the diameter of its roundest ellipse, 0 if it has none
+
+    The metrics of the ellipses of all the paths are computed at once.
+    """
+    owners, points = [], []
+    for i_path, path in enumerate(paths):
+        for node in path:
+            if node.data.shape.shapeType == shapeTypes.ellipse and len(node.data.shape.points) == 4:
+                owners.append(i_path)
+                points.append(pointsToArray(node.data.shape.points))
+    diameters = [0] * len(paths)
+    if not points:
+        return diameters
+    metrics = ellipseMetrics(np.stack(points))
+    best = [-1.] * len(paths)
+    for i_path, roundness, diameter in zip(owners, metrics.roundness.tolist(), metrics.diameter.tolist()):
+        if roundness > best[i_path]:  # the first of the roundest; NaN, an empty axis, never wins
+            best[i_path], diameters[i_path] = roundness, diameter
+    return diameters
+
+TreeStat = namedtuple('TreeStat', ['n_breakage', 'start', 'end', 'leaves', 'fork_depths', 'diameters'])
 
 class Trees():
+    """The forest of the tracks, with the node of every shape found in O(1).
+
+    A shape is known by the identity of its data (a ShapeObj); when it was
+    added to several nodes, as the kid of several shapes, getNode() finds
+    the first one.
+    """
+
     def __init__(self):
         self.data = []
+        self.nodes = {}  # id(data) -> (tree, node)
 
     def append(self, tree):
         assert isinstance(tree, Tree)
         self.data.append(tree)
+        for node in tree.members:
+            self.nodes.setdefault(id(node.data), (tree, node))
+
+    def addKid(self, tree, node, kid_data):
+        kid = tree.addKid(node, kid_data)
+        self.nodes.setdefault(id(kid_data), (tree, kid))
+        return kid
     
     def __len__(self):
         return len(self.data)
@@ -191,11 +213,7 @@ class Trees():
         return iter(self.data)
 
     def getNode(self, data):
-        for tree in self.data:
-            for node in list(tree.members):
-                if node.data == data:
-                    return tree, node
-        return (None, None)
+        return self.nodes.get(id(data), (None, None))
 
     def genPaths(self):
         paths = OrderedDict()
@@ -204,10 +222,14 @@ class Trees():
             paths[i_tree] = path
         return paths
 
+    def stats(self):
+        """[TreeStat] of the trees, in order"""
+        return [tree.stats() for tree in self.data]
+
     def getAllNodes(self):
         nodes = []
         for tree in self.data:
-            nodes.extend(list(tree.members))
+            nodes.extend(tree.members)
         return nodes
 
     
@@ -219,36 +241,87 @@ class Tree(object):
     def __init__(self, root):  # root is a shape_obj
         self.root = root if isinstance(root, Node) else Node(root)
         assert(isinstance(self.root, Node))
-        self.members = {self.root}
+        self.members = [self.root]  # in the order they were added, one node per shape
+        self.nodes = {id(self.root.data): self.root}
+        self._stats = None  # see stats()
         # self.current = self.root
         
     def addKid(self, node, kid_data):
         assert(isinstance(kid_data, type(self.root.data)))
-        kid = Node(kid_data)
+        kid = Node(kid_data, i_layer=node.i_layer+1, parent=node)
         self.update_members(kid)
         node.kids.append(kid)
-        kid.parent = node
-        kid.i_layer = kid.parent.i_layer+1
+        self._stats = None
+        return kid
+
+    def stats(self):
+        """TreeStat of the tree, computed once until a kid is added
+
+        n_breakage is the number of paths from the root to a leaf, start the
+        frame of the root and end start + the length of the longest path.
+        leaves are in the order of genPaths(); fork_depths[i] is the depth of
+        the last node the i-th path shares with another one, 0 when it
+        shares none, and diameters[i] the diameter of the roundest ellipse of
+        the path below that fork, its branch.
+        """
+        if self._stats is None:
+            self._stats = self.computeStats()
+        return self._stats
+
+    def computeStats(self):
+        # one depth first pass, in preorder; walked backwards it gives the kids before their parent
+        order = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(reversed(node.kids))
+
+        # the paths end at the leaves which are members, a shape reached twice ending one path only
+        n_leaves = {}
+        for node in reversed(order):
+            if node.kids:
+                n_leaves[id(node)] = sum(n_leaves[id(kid)] for kid in node.kids)
+            else:
+                n_leaves[id(node)] = 1 if self.nodes.get(id(node.data)) is node else 0
+        # a node on two paths or more is a fork of the paths below it
+        fork = {id(self.root): 0}
+        for node in order[1:]:
+            fork[id(node)] = node.i_layer if n_leaves[id(node)] >= 2 else fork[id(node.parent)]
+
+        leaves = [node for node in self.members if not node.kids]
+        fork_depths = [fork[id(leaf)] for leaf in leaves]
+        branches = []
+        for leaf, depth in zip(leaves, fork_depths):
+            branch = []
+            node = leaf
+            while node is not None and node.i_layer > depth:
+                branch.append(node)
+                node = node.parent
+            branches.append(branch[::-1])
+
+        start = self.root.data.i_img
+        end = start + max([leaf.i_layer + 1 for leaf in leaves], default=0)
+        return TreeStat(len(leaves), start, end, leaves, fork_depths, roundestDiameters(branches))
 
     def update_members(self, node):
-        if isinstance(node, Node):
-            self.members.add(node)
+        # a shape reached from two shapes is a member once, by its first node
+        if isinstance(node, Node) and id(node.data) not in self.nodes:
+            self.members.append(node)
+            self.nodes[id(node.data)] = node
     
     def getNode(self, data):
         if isinstance(data, type(self.root.data)):
-            for shape_obj_node in list(self.members):
-                if data == shape_obj_node.data:
-                    return shape_obj_node
-            return None
+            return self.nodes.get(id(data))
         else:
-            assert(False, "getNode wrong input")
+            assert False, "getNode wrong input"
 
     def __str__(self):
-        return "Tree:\n"+ "\n".join([str(m) for m in list(self.members)]) + "\n\n\n"
+        return "Tree:\n"+ "\n".join([str(m) for m in self.members]) + "\n\n\n"
 
     def genPaths(self):
         paths = []
-        for node in list(self.members):
+        for node in self.members:
             if len(node.kids) == 0:
                 path = [node]
                 while node.parent is not None:
@@ -263,14 +336,18 @@ class Tree(object):
             
         return paths
         
-    def __in__(self, node):
-        return node in self.members
+    def __contains__(self, node):
+        while node.parent is not None:
+            node = node.parent
+        return node is self.root
 
     def __iter__(self):
-        return iter(self.root)
+        return iter(self.members)
     
     def __eq__(self, other):
-        return True if self.root == other.root else False
+        return self.root is other.root
+
+    __hash__ = object.__hash__
 
     # def display(self):
     #     '''''树形打印出目录结构'''  
@@ -294,7 +371,10 @@ class Tree(object):
 
 
 class Node(object):
-    def __init__(self, data, i_layer=0, parent=None, kids=None, next_=None, prev=None):
+    """A shape of a track; nodes are compared and hashed by identity, not by their data."""
+    __slots__ = ('parent', 'kids', 'data', 'i_layer')
+
+    def __init__(self, data, i_layer=0, parent=None, kids=None):
         self.parent = parent
         self.kids = [] if kids is None else kids
         self.data = data
@@ -302,13 +382,35 @@ class Node(object):
 
     def __str__(self):
         return "Node: {},\n     parent={},\n     kids={}.\n".format(self.data, self.parent, self.kids)
-
-    def __eq__(self, other):
-        return True if self.data == other.data else False
-
-    def __hash__(self):
-        return hash(self.data)
         
-def intersects(path1, path2):
-    return path1.intersects(path2)
-        
\ No newline at end of file
+NUMBER_PATTERN = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+def parsePoints(text):
+    """[(x, y)] of the points written as "[(x1, y1), (x2, y2), ...]" in track.csv, without eval"""
+    coords = [float(number) for number in NUMBER_PATTERN.findall(text)]
+    return list(zip(coords[0::2], coords[1::2]))
+
+class FrameShapes(object):
+    """The outlines of the shapes of a frame, indexed by their bounding boxes.
+
+    overlapping() tests the overlap of the outlines, with numpy, only
+    against those whose bounding box overlaps, found through a BoxGrid,
+    instead of against every shape of the frame.
+    """
+
+    def __init__(self, shape_objs):
+        self.outlines = outlines([shape_obj.shape.shapeType for shape_obj in shape_objs],
+                                 [pointsToArray(shape_obj.shape.points) for shape_obj in shape_objs])
+        self.boxes = boundingBoxes(self.outlines)
+        self.grid = BoxGrid(self.boxes)
+
+    def overlapping(self, outlines_):
+        """for each of the (N, K, 2) `outlines_`, the indices of the shapes which overlap it, in order"""
+        pairs = [(k, i) for k, box in enumerate(boundingBoxes(outlines_)) for i in self.grid.query(box)]
+        result = [[] for _ in range(len(outlines_))]
+        if pairs:
+            pairs = np.array(pairs)
+            hits = overlaps(outlines_[pairs[:, 0]], self.outlines[pairs[:, 1]])
+            for k, i in pairs[hits].tolist():
+                result[k].append(i)
+        return result
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Tzutalin
+# Create by Jerry Yang <yangjjie94@gmail.com>
+
+"""Report the breakages of a whole campaign without the GUI.
+
+The shapes of a save dir are split by experiment, the subdir the reports
+group them by (the file name up to its last '_', e.g. 420V10Q223). Each
+experiment is reported on a process pool: its broken drops, as TrackReporter
+finds them from the labels, and its tracks, as reportTrack follows them from
+frame to frame. The tables of all the experiments are then merged into one
+workbook, or into CSV files:
+
+    python -m libs.trackRunner SAVE_DIR [--out OUT] [--csv] [--exclude-label LABEL ...] [--workers N]
+"""
+
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
+import pandas as pd
+
+import libs.constants
+import const
+from libs.annotationSnapshot import AnnotationSnapshot
+from libs.statisticalReport import TrackReporter, brokenSheets, writeSheets
+from libs.trackReport import shapeObjsByFrame, trackFrames
+
+TRACK_COLUMNS = ['subdir', 'tree', 'n_breakage', 'start', 'end', 'diameters']
+EXPERIMENT_COLUMNS = ['subdir', 'n_shapes', 'n_broken', 'n_tracks']
+
+def partitions(shapes_df, labelHist=()):
+    """[(subdir, shapes of the experiment)] of `shapes_df` but the labels of `labelHist`, by subdir"""
+    if labelHist:
+        shapes_df = shapes_df[~shapes_df['label'].isin(list(labelHist))]
+    return [(subdir, df) for subdir, df in shapes_df.groupby('subdir', sort=True)]
+
+def trackExperiment(partition):
+    """(broken info, track rows) of the shapes of one experiment, `partition` = (subdir, shapes_df)
+
+    The broken info is that of TrackReporter.get_broken_info, the track rows
+    one per tree of trackFrames, (subdir, tree, n_breakage, start, end,
+    diameters), which follows the shapes by the frame number of their file;
+    the files without one are left out of the tracks.
+    """
+    subdir, shapes_df = partition
+    broken_info_dict = TrackReporter.get_broken_info(TrackReporter.build_easy_track_report_df(shapes_df, ()))
+
+    framed = shapes_df[shapes_df['frame'] >= 0].sort_values(by='frame', kind='stable')
+    trees = trackFrames(shapeObjsByFrame(zip(
+        framed['frame'].tolist(), framed['label'], framed['shapeType'], framed['points'], framed['difficult'])))
+    tracks = [(subdir, i_tree, tree_stat.n_breakage, tree_stat.start, tree_stat.end,
+               "+".join("{:.2f}".format(diameter) for diameter in tree_stat.diameters))
+              for i_tree, tree_stat in enumerate(trees.stats())]
+    # plain data only back to the parent process, not the shapes of the trees
+    return dict(broken_info_dict), tracks
+
+def runCampaign(saveDir, labelHist=(), workers=None):
+    """(df_dict, summary_df, experiments_df, tracks_df) of all the experiments under `saveDir`
+
+    df_dict and summary_df are those of TrackReporter.get_broken_dfs on the
+    broken drops of all the experiments, merged in the order of the subdirs
+    as TrackReporter would find them. The experiments are reported on a
+    pool of `workers` processes; a single one, or workers=1, in this process.
+    """
+    parts = partitions(AnnotationSnapshot.open(saveDir), labelHist)
+    if workers == 1 or len(parts) <= 1:
+        results = list(map(trackExperiment, parts))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # map yields the experiments in order, whichever worker finished first
+            results = list(executor.map(trackExperiment, parts))
+
+    broken_info_dict = defaultdict(list)
+    experiments, tracks = [], []
+    for (subdir, shapes_df), (broken_info, tracks_) in zip(parts, results):
+        for n_breakage, broken in broken_info.items():
+            broken_info_dict[n_breakage].extend(broken)
+        experiments.append((subdir, len(shapes_df), sum(len(broken) for broken in broken_info.values()), len(tracks_)))
+        tracks.extend(tracks_)
+    df_dict, summary_df = TrackReporter.get_broken_dfs(broken_info_dict)
+    return (df_dict, summary_df, pd.DataFrame(experiments, columns=EXPERIMENT_COLUMNS),
+            pd.DataFrame(tracks, columns=TRACK_COLUMNS))
+
+def campaignSheets(df_dict, summary_df, experiments_df, tracks_df):
+    """[(sheet name, df)] of the report of a campaign, those of TrackReporter first"""
+    return brokenSheets(df_dict, summary_df) + [("experiments", experiments_df), ("tracks", tracks_df)]
+
+def writeCsvs(outDir, sheets):
+    """write the [(sheet name, df)] `sheets` to `outDir`, a CSV file each"""
+    os.makedirs(outDir, exist_ok=True)
+    for sheetname, df in sheets:
+        df.to_csv(os.path.join(outDir, sheetname.replace(' ', '_') + const.CSV_EXT), encoding='utf-8')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report the breakages of all the experiments of a save dir "
+                                                 "without the GUI.")
+    parser.add_argument('dir', help="save dir of the annotation files")
+    parser.add_argument('--out', default=None,
+                        help="output workbook, or directory with --csv, default: summary-DIR beside DIR")
+    parser.add_argument('--csv', action='store_true', help="write a CSV file per table instead of a workbook")
+    parser.add_argument('--exclude-label', action='append', default=[], dest='labelHist',
+                        help="label to leave out, may be repeated")
+    parser.add_argument('--workers', type=int, default=None, help="processes, default: one per core")
+    args = parser.parse_args(argv)
+
+    saveDir = os.path.abspath(args.dir)
+    df_dict, summary_df, experiments_df, tracks_df = runCampaign(saveDir, args.labelHist, workers=args.workers)
+    sheets = campaignSheets(df_dict, summary_df, experiments_df, tracks_df)
+    out = args.out
+    if out is None:
+        out = os.path.join(os.path.dirname(saveDir), "summary-{}".format(os.path.basename(saveDir)))
+        out += '' if args.csv else '.xlsx'
+    if args.csv:
+        writeCsvs(out, sheets)
+    else:
+        writeSheets(out, sheets)
+    print("{} experiments, {} broken drops, {} tracks: {}".format(
+        len(experiments_df), int(experiments_df['n_broken'].sum()), len(tracks_df), out))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -36,7 +36,9 @@ setup(
     packages=required_packages,
     entry_points={
         'console_scripts': [
-            'labelSeries=labelSeries.labelSeries:main'
+            'labelSeries=labelSeries.labelSeries:main',
+            'labelSeries-preprocess=labelSeries.libs.batchPreprocess:main',
+            'labelSeries-track=labelSeries.libs.trackRunner:main'
         ]
     },
     include_package_data=True,
@@ -0,0 +1,15 @@
+#!/usr/bin/env python
+"""annotation files written for the tests"""
+import os
+
+from libs.pascal_voc_io import PascalVocWriter
+
+def writeAnnotation(dirPath, name, shapes, imgPath=None, verified=False):
+    """save `name`.xml in `dirPath` with the (shapeType, label, points) `shapes`, return its path"""
+    writer = PascalVocWriter('tests', name, (512, 512, 1), localImgPath=imgPath or name + '.jpg')
+    writer.verified = verified
+    for shapeType, label, points in shapes:
+        writer.addShape(shapeType, label, points, 0)
+    path = os.path.join(dirPath, name + '.xml')
+    writer.save(path)
+    return path
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""Time the construction of the report tables against the number of shapes.
+
+    python tests/benchmark_reports.py [--sizes 2000 4000 8000 16000]
+
+The tables are built column by column, so the time per shape should stay
+flat as the experiment grows; the former construction, which appended one
+row at a time to a DataFrame, is timed on the smaller sizes for comparison.
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+import libs.constants
+from libs.annotationSnapshot import tableToDataFrame
+from libs.statisticalReport import NumDensityReporter, TrackReporter
+
+def makeShapes(n_files, subdirs=10):
+    """a snapshot of `n_files` annotation files, each holding a drop broken in two or three"""
+    rng = np.random.RandomState(0)
+    table = {column: [] for column in ['path', 'subdir', 'frame', 'verified', 'mtime_ns', 'idx', 'shapeType',
+                                       'label', 'points', 'diameter', 'difficult']}
+    for i in range(n_files):
+        subdir = 'exp{}'.format(i % subdirs)
+        path = '/data/{}_{:06d}.xml'.format(subdir, i)
+        n_pieces = 2 + i % 2
+        labels = ['broken{}'.format(i)] + ['broken{} {}'.format(i, j) for j in range(n_pieces)] + ['drop']
+        for idx, label in enumerate(labels):
+            x, y = rng.randint(0, 500, 2)
+            a, b = rng.randint(5, 30, 2)
+            table['path'].append(path)
+            table['subdir'].append(subdir)
+            table['frame'].append(i)
+            table['verified'].append(False)
+            table['mtime_ns'].append(0)
+            table['idx'].append(idx)
+            table['shapeType'].append('ellipse')
+            table['label'].append(label)
+            table['points'].append([(x - a, y), (x + a, y), (x, y - b), (x, y + b)])
+            table['diameter'].append(2 * np.sqrt(a * b))
+            table['difficult'].append(False)
+    return tableToDataFrame(table)
+
+def appendRows(shapes_df, lengthValue):
+    """the report as it was built before, one DataFrame per row"""
+    report_df = pd.DataFrame(columns=['dir', 'xmlfile', 'index', 'diameter'])
+    for i, (path, subdir, diameter) in enumerate(zip(shapes_df['path'], shapes_df['subdir'], shapes_df['diameter'])):
+        report_df = pd.concat([report_df, pd.DataFrame([{'dir': subdir, 'xmlfile': os.path.basename(path),
+                                                         'index': i, 'diameter': diameter * lengthValue}])],
+                              ignore_index=True)
+    return report_df
+
+def timeit(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2000, 4000, 8000, 16000],
+                        help="numbers of annotation files")
+    parser.add_argument('--append-up-to', type=int, default=4000,
+                        help="largest size at which to time the row by row construction")
+    args = parser.parse_args(argv)
+
+    print("{:>8} {:>8} {:>14} {:>14} {:>14} {:>14}".format(
+        'files', 'shapes', 'report us/row', 'track us/row', 'broken us/row', 'append us/row'))
+    for n_files in args.sizes:
+        shapes_df = makeShapes(n_files)
+        n = len(shapes_df)
+        report = timeit(NumDensityReporter.build_report_df, shapes_df, 0.5)
+        start = time.perf_counter()
+        easy_track_df = TrackReporter.build_easy_track_report_df(shapes_df, ['drop'])
+        track = time.perf_counter() - start
+        start = time.perf_counter()
+        TrackReporter.get_broken_dfs(TrackReporter.get_broken_info(easy_track_df))
+        broken = time.perf_counter() - start
+        append = timeit(appendRows, shapes_df, 0.5) if n_files <= args.append_up_to else float('nan')
+        print("{:>8} {:>8} {:>14.2f} {:>14.2f} {:>14.2f} {:>14.2f}".format(
+            n_files, n, 1e6 * report / n, 1e6 * track / n, 1e6 * broken / n, 1e6 * append / n))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+import libs.constants
+from libs.annotationIndex import AnnotationIndex
+from annotationFiles import writeAnnotation
+
+class TestAnnotationIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, shapes):
+        return writeAnnotation(self.dir, name, shapes)
+
+    def test_update(self):
+        ellipse = [(0, 10), (40, 10), (20, 0), (20, 10)]
+        path = self.write('exp_0001', [('ellipse', 'drop', ellipse), ('box', 'Broken', [(1, 1), (5, 1), (5, 5), (1, 5)])])
+        self.write('exp_0002', [('ellipse', 'drop', ellipse)])
+
+        index = AnnotationIndex(self.dir)
+        self.assertEqual(len(index.update()), 2)
+        self.assertEqual(index.update(), [])
+        self.assertEqual(len(index.files()), 2)
+        self.assertEqual([os.path.basename(p) for p in index.files(label='Broken')], ['exp_0001.xml'])
+
+        shapes = index.shapes(shapeType='ellipse')
+        self.assertEqual(len(shapes), 2)
+        _, subdir, frame, idx, _, label, points, diameter, _ = shapes[0]
+        self.assertEqual((subdir, frame, idx, label), ('exp', 1, 0, 'drop'))
+        self.assertEqual(points, ellipse)
+        self.assertAlmostEqual(diameter, 20.0)
+        self.assertEqual(len(index.shapes(excludeLabels=['drop'])), 1)
+        self.assertEqual(sorted(index.contents([path])[path]), [('Broken', 'box'), ('drop', 'ellipse')])
+
+        os.remove(path)
+        self.assertEqual(index.update(), [path])
+        self.assertEqual(len(index.shapes()), 1)
+        index.close()
+
+    def test_errors(self):
+        ellipse = [(0, 10), (40, 10), (20, 0), (20, 10)]
+        path = self.write('exp_0001', [('ellipse', 'drop', ellipse), ('ellipse', 'Broken', ellipse)])
+        with open(path) as f:
+            content = f.read()
+        with open(path, 'w') as f:
+            f.write(content[:content.rindex('<object>')])
+
+        index = AnnotationIndex(self.dir)
+        self.assertEqual(index.update(), [path])
+        self.assertEqual(list(index.errors()), [path])
+        self.assertEqual(index.errors([path + '.missing']), {})
+        self.assertEqual([shape[5] for shape in index.shapes()], ['drop'])  # the shapes before the error
+
+        self.write('exp_0001', [('ellipse', 'drop', ellipse)])
+        index.updateFile(path)
+        self.assertEqual(index.errors(), {})
+        index.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+import libs.constants
+from libs.annotationLoader import loadAnnotations
+from annotationFiles import writeAnnotation
+
+class TestAnnotationLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for frame in range(7):
+            writeAnnotation(self.dir, 'exp_{:04d}'.format(frame),
+                            [('box', 'drop {}'.format(i), [(frame, i), (5, 1), (5, 5), (1, 5)]) for i in range(frame % 3)])
+        with open(os.path.join(self.dir, 'exp_0007.xml'), 'w') as f:
+            f.write('<annotation><object>')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check(self, annotations):
+        self.assertEqual([os.path.basename(path) for path in annotations.files],
+                         ['exp_{:04d}.xml'.format(frame) for frame in range(8)])
+        self.assertEqual(len(annotations), 6)
+        self.assertEqual(list(annotations.fileIndex), [1, 2, 2, 4, 5, 5])
+        self.assertEqual(list(annotations.idx), [0, 0, 1, 0, 0, 1])
+        self.assertEqual(annotations.points[4][0].tolist(), [5, 0])
+        self.assertEqual([label for _, label, _, _ in annotations.shapesOf(5)], ['drop 0', 'drop 1'])
+        self.assertEqual([os.path.basename(path) for path, _ in annotations.failed()], ['exp_0007.xml'])
+
+    def test_load(self):
+        self.check(loadAnnotations(self.dir, workers=1))
+        self.check(loadAnnotations(self.dir, workers=2, chunkSize=3, threads=True))
+        self.check(loadAnnotations(self.dir, workers=2, chunkSize=3))
+
+if __name__ == '__main__':
+    unittest.main()
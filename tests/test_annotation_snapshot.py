@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+import libs.constants
+from libs.annotationIndex import AnnotationIndex
+from libs.annotationSnapshot import AnnotationSnapshot
+from annotationFiles import writeAnnotation
+
+class TestAnnotationSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, shapes):
+        return writeAnnotation(self.dir, name, shapes)
+
+    def test_refresh(self):
+        ellipse = [(0, 10), (40, 10), (20, 0), (20, 10)]
+        box = [(1, 1), (5, 1), (5, 5), (1, 5)]
+        first = self.write('exp_0001', [('ellipse', 'drop', ellipse), ('box', 'Broken', box)])
+        second = self.write('exp_0002', [('ellipse', 'drop', ellipse)])
+
+        for format in ('npz', 'parquet'):
+            if format == 'parquet':
+                try:
+                    import pyarrow
+                except ImportError:
+                    continue
+            snapshot = AnnotationSnapshot(self.dir, format=format)
+            index = AnnotationIndex.open(self.dir)
+            df = snapshot.refresh(index)
+            self.assertEqual(list(df['label']), ['drop', 'Broken', 'drop'])
+            self.assertEqual(list(df['frame']), [1, 1, 2])
+            self.assertEqual(df['points'][1], box)
+            self.assertAlmostEqual(df['diameter'][0], 20.0)
+
+            loaded = snapshot.load()
+            self.assertEqual(list(loaded['path']), [first, first, second])
+            self.assertEqual(list(loaded['points']), list(df['points']))
+
+            mtime = os.path.getmtime(snapshot.path)
+            time.sleep(0.01)
+            snapshot.refresh(index)
+            self.assertEqual(os.path.getmtime(snapshot.path), mtime)
+
+            self.write('exp_0000', [('box', 'drop', box)])
+            os.remove(second)
+            index.update()
+            df = snapshot.refresh(index)
+            self.assertEqual([os.path.basename(path) for path in df['path']], ['exp_0000.xml'] + ['exp_0001.xml'] * 2)
+            self.assertEqual(list(snapshot.load()['label']), ['drop', 'drop', 'Broken'])
+            index.close()
+            os.remove(os.path.join(self.dir, 'exp_0000.xml'))
+            second = self.write('exp_0002', [('ellipse', 'drop', ellipse)])
+
+if __name__ == '__main__':
+    unittest.main()
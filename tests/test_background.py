@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+import os
+import sys
+import threading
+import unittest
+
+import numpy as np
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+import libs.constants
+import const
+from libs.background import (MeanBackground, MedianBackground, RunningBackground, RollingBackground,
+                             coarseToFine, estimateBackground)
+
+class TestEstimators(unittest.TestCase):
+
+    def setUp(self):
+        self.frames = np.random.RandomState(0).randint(0, 256, (40, 4, 5)).astype(np.uint8)
+
+    def test_mean(self):
+        estimator = MeanBackground(len(self.frames))
+        self.assertIsNone(estimator.estimate())
+        for frame in self.frames:
+            estimator.update(frame)
+        np.testing.assert_allclose(estimator.estimate(), self.frames.mean(axis=0), rtol=1e-6)
+
+    def test_median(self):
+        estimator = MedianBackground(len(self.frames), samples=8)
+        wanted = [i for i in range(len(self.frames)) if estimator.wants(i)]
+        self.assertEqual(wanted, list(range(4, 40, 5)))
+        for i in wanted:
+            estimator.update(self.frames[i])
+        np.testing.assert_allclose(estimator.estimate(), np.median(self.frames[wanted], axis=0))
+
+    def test_running(self):
+        estimator = RunningBackground(len(self.frames), alpha=0.1)
+        background = self.frames[0].astype(np.float64)
+        for frame in self.frames:
+            estimator.update(frame)
+            background = 0.9 * background + 0.1 * frame
+        np.testing.assert_allclose(estimator.estimate(), background, rtol=1e-4)
+
+    def test_coarse_to_fine(self):
+        order = coarseToFine(40)
+        self.assertEqual(sorted(order), list(range(40)))
+        self.assertEqual(order[:4], [0, 32, 16, 8])
+        # every prefix of 2^k frames is spread over the whole range, no gap over 64 / 2^k
+        for k in range(1, 6):
+            prefix = sorted(order[:2 ** k]) + [40]
+            self.assertLessEqual(max(np.diff(prefix)), 64 // 2 ** k)
+        self.assertEqual(coarseToFine(1), [0])
+
+    def test_estimate(self):
+        # from the frames read coarse to fine, as they are for the mean and the median
+        refined = []
+        background = estimateBackground([None] * len(self.frames), method='mean', workers=2,
+                                        frameStore=self.frames, refine=refined.append)
+        np.testing.assert_allclose(background, self.frames.mean(axis=0), rtol=1e-6)
+        self.assertEqual(len(refined), (len(self.frames) - 1) // const.BACKGROUND_REFINE_STEP)
+        background = estimateBackground([None] * len(self.frames), method='median', length=20, workers=2,
+                                        frameStore=self.frames)
+        np.testing.assert_allclose(background, np.median(self.frames[:20], axis=0))
+
+class TestRollingBackground(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.frames = rng.randint(0, 256, (120, 4, 5)).astype(np.uint8)
+        self.loads = []
+
+    def load(self, i):
+        self.loads.append(i)
+        return self.frames[i]
+
+    def bruteForce(self, rolling, i):
+        lo, hi = rolling.bounds(i)
+        return self.frames[lo:hi].mean(axis=0)
+
+    def test_at(self):
+        rng = np.random.RandomState(1)
+        # in order, then ahead and behind interleaved as the prefetching reads them, then seeks
+        indices = list(range(40)) + [k for j in range(60, 90) for k in (j, 119 - j)] + list(rng.randint(0, 120, 30))
+        for cursors in (1, 2, 3):
+            rolling = RollingBackground(self.load, len(self.frames), window=10, cursors=cursors)
+            for i in indices:
+                np.testing.assert_allclose(rolling.at(i), self.bruteForce(rolling, i), rtol=1e-6)
+
+    def test_cost(self):
+        rolling = RollingBackground(self.load, len(self.frames), window=10, cursors=2)
+        for i in range(40):
+            rolling.at(i)
+        self.assertEqual(self.loads, list(range(rolling.bounds(39)[1])))  # in order, every frame is read once
+        del self.loads[:]
+        for j in range(60, 90):  # ahead and behind interleaved, a window each
+            rolling.at(j)
+            rolling.at(119 - j)
+        self.assertLessEqual(len(self.loads), 60 + 2 * 10)
+
+    def test_threads(self):
+        rolling = RollingBackground(self.load, len(self.frames), window=10, cursors=2)
+        errors = []
+
+        def work(indices):
+            for i in indices:
+                if not np.allclose(rolling.at(i), self.bruteForce(rolling, i), rtol=1e-6):
+                    errors.append(i)
+
+        threads = [threading.Thread(target=work, args=(range(k, 120, 4),)) for k in range(4)]
+        threads += [threading.Thread(target=work, args=(range(119, -1, -3),))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_budget(self):
+        rng = np.random.RandomState(2)
+        indices = [k for j in range(60, 90) for k in (j, 119 - j)] + list(rng.randint(0, 120, 30))
+        # a window of 10 frames of 20 bytes and its int32 sum of 80 bytes: 280 bytes, 40 more per margin frame
+        for budget, cursors, margin in ((700, 2, 1), (100, 1, 0), (10 ** 6, 3, const.BACKGROUND_ROLLING_MARGIN)):
+            rolling = RollingBackground(self.load, len(self.frames), window=10, cursors=3, budget=budget)
+            for i in indices:
+                np.testing.assert_allclose(rolling.at(i), self.bruteForce(rolling, i), rtol=1e-6)
+                self.assertEqual(len(rolling.cursors), cursors)
+                self.assertEqual([cursor.margin for cursor in rolling.cursors], [margin] * cursors)
+                held = sum(len(cursor.frames) * 20 + cursor.sum.nbytes for cursor in rolling.cursors
+                           if cursor.sum is not None)
+                self.assertLessEqual(held, max(budget, 280))
+            rolling.clear()
+            self.assertEqual([len(cursor.frames) for cursor in rolling.cursors], [0] * cursors)
+
+    def test_short_series(self):
+        rolling = RollingBackground(self.load, 3, window=10)
+        np.testing.assert_allclose(rolling.at(1), self.frames[:3].mean(axis=0), rtol=1e-6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+import libs.constants
+import const
+from libs.batchPreprocess import preprocessSeries
+from libs.frameStore import FrameStore
+
+def preprocessed(frame, background, beta):
+    return cv2.equalizeHist(np.abs(np.subtract(frame, beta * background, dtype=np.float32)).astype(np.uint8))
+
+class TestBatchPreprocess(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.series = os.path.join(self.dir, 'series')
+        os.makedirs(self.series)
+        self.frames = np.random.RandomState(0).randint(0, 256, (12, 6, 8)).astype(np.uint8)
+        self.names = []
+        for i, frame in enumerate(self.frames):
+            self.names.append('exp_{:04d}.png'.format(i))
+            cv2.imwrite(os.path.join(self.series, self.names[-1]), frame)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read(self, outDir):
+        return [cv2.imread(os.path.join(outDir, name), cv2.IMREAD_GRAYSCALE) for name in self.names]
+
+    def test_global(self):
+        outDir = preprocessSeries(self.series, workers=2, chunkSize=5, beta=0.5)
+        self.assertEqual(outDir, self.series + const.BATCH_OUTPUT_SUFFIX)
+        self.assertTrue(os.path.exists(os.path.join(self.series, const.BACKGROUND_FILENAME)))
+        background = self.frames.mean(axis=0)
+        for frame, result in zip(self.frames, self.read(outDir)):
+            np.testing.assert_array_equal(result, preprocessed(frame, background, 0.5))
+
+    def test_rolling(self):
+        done = []
+        outDir = preprocessSeries(self.series, os.path.join(self.dir, 'out'), mode=const.PREPROCESS_MODE_ROLLING,
+                                  window=4, workers=2, chunkSize=2, beta=0.5,
+                                  progress=lambda n, total: done.append(n))
+        self.assertEqual(done[-1], len(self.frames))
+        for i, result in enumerate(self.read(outDir)):
+            lo = min(max(i - 2, 0), len(self.frames) - 4)
+            background = self.frames[lo:lo + 4].mean(axis=0)
+            np.testing.assert_array_equal(result, preprocessed(self.frames[i], background, 0.5))
+
+    def test_pack(self):
+        # the background saved beside the series is used by both runs
+        cv2.imwrite(os.path.join(self.series, const.BACKGROUND_FILENAME), self.frames.mean(axis=0))
+        outDir = preprocessSeries(self.series, os.path.join(self.dir, 'out'), pack=True, workers=2, chunkSize=5)
+        expected = preprocessSeries(self.series, os.path.join(self.dir, 'images'), workers=1)
+        store = FrameStore(outDir)
+        self.assertEqual(len(store), len(self.frames))
+        np.testing.assert_array_equal(store.range(0, len(store)), np.stack(self.read(expected)))
+
+if __name__ == '__main__':
+    unittest.main()
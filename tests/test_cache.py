@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from collections import deque
+
+import cv2
+import numpy as np
+from PyQt5.QtCore import QCoreApplication
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+import libs.constants
+from libs.cache import ReadAhead, Cache, PreviewCache, array2qimage
+from libs.diskCache import DiskCache
+
+FRAME_BYTES = 8 * 8
+
+class ArrayCache(Cache):
+    """frames of 8 x 8 gray pixels made up instead of read, each waiting for `gate` if given and `delay` s"""
+
+    def __init__(self, total, budget, gate=None, delay=0):
+        super(ArrayCache, self).__init__(['{}.png'.format(i) for i in range(total)], budget=budget, workers=1)
+        self.gate = gate
+        self.delay = delay
+        self.offset = 0  # added to the pixels, what invalidate() is called for when it changes
+        self.decoded = []
+
+    def decodeFile(self, i):
+        if self.gate is not None:
+            self.gate.wait(5)
+        time.sleep(self.delay)
+        self.decoded.append(i)
+        return array2qimage(np.full((8, 8), i + self.offset, dtype=np.uint8))
+
+    def settle(self):
+        deadline = time.time() + 5
+        while self.pending and time.time() < deadline:
+            time.sleep(0.01)
+
+class TestReadAhead(unittest.TestCase):
+
+    def test_order(self):
+        readAhead = ReadAhead()
+        self.assertEqual(readAhead.order(500, 10, 1000, now=0), [500, 501, 502, 503, 499, 504, 505, 506, 498, 507])
+
+        # backwards, near the start: the frames just ahead still come first
+        readAhead.visit(5, now=0)
+        readAhead.visit(4, now=1)
+        self.assertEqual(readAhead.order(2, 10, 1000, now=100), [2, 1, 0, 3, 4, 5, 6, 7, 8, 9])
+
+        # a jump sets the stride, a seek forgets it
+        readAhead.visit(9, now=101)
+        self.assertEqual(readAhead.order(9, 4, 1000, now=200)[:3], [9, 14, 19])
+        readAhead.visit(500, now=102)
+        self.assertEqual(readAhead.stride, 1)
+
+    def test_fast(self):
+        readAhead = ReadAhead()
+        for k in range(20):
+            readAhead.visit(k, now=k * 0.05)
+        self.assertEqual(readAhead.behindShare(now=1), 0)
+        self.assertEqual(readAhead.order(19, 5, 1000, now=1), [19, 20, 21, 22, 23])
+        # at the end of the series only what is behind is left
+        self.assertEqual(readAhead.order(998, 4, 1000, now=1), [998, 999, 997, 996])
+
+class TestCache(unittest.TestCase):
+
+    def test_budget(self):
+        cache = ArrayCache(100, budget=5 * FRAME_BYTES)
+        self.assertEqual(cache[50].pixelColor(0, 0).red(), 50)
+        cache.settle()
+        self.assertEqual(cache.capacity(), 5)
+        self.assertEqual(sorted(cache.data), [49, 50, 51, 52, 53])
+        self.assertLessEqual(cache.nbytes, cache.budget)
+        self.assertEqual(cache.peek(51).pixelColor(0, 0).red(), 51)
+        self.assertIsNone(cache.peek(60))  # not read by peek
+        self.assertNotIn(60, cache.pending)
+
+        # the frames out of the new window are evicted
+        cache.moveTo(80)
+        cache.settle()
+        self.assertEqual(sorted(cache.data), [79, 80, 81, 82, 83])
+        self.assertEqual(cache.nbytes, 5 * FRAME_BYTES)
+        cache.stop()
+
+    def test_cancel(self):
+        gate = threading.Event()
+        cache = ArrayCache(100, budget=5 * FRAME_BYTES, gate=gate)
+        cache.frameBytes = FRAME_BYTES
+        cache.moveTo(10)
+        self.assertEqual(sorted(cache.pending), [9, 10, 11, 12, 13])
+        while not cache.pending[10].running():
+            time.sleep(0.01)
+
+        # the reads queued behind the one in progress are cancelled by a seek
+        cache.moveTo(60)
+        self.assertEqual(sorted(cache.pending), [10, 59, 60, 61, 62, 63])
+        gate.set()
+        cache.settle()
+        self.assertEqual(sorted(cache.data), [59, 60, 61, 62, 63])
+        self.assertEqual(sorted(cache.decoded), [10, 59, 60, 61, 62, 63])
+        cache.stop()
+
+    def test_visits(self):
+        cache = ArrayCache(1000, budget=20 * FRAME_BYTES)
+        cache.frameBytes = FRAME_BYTES
+        cache.readAhead.visits = deque(maxlen=1000)
+        errors = []
+
+        def prefetch():  # as the pool threads do after each decode
+            for _ in range(5000):
+                try:
+                    cache.prefetch()
+                except RuntimeError as e:
+                    errors.append(e)
+                    return
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # the threads interleave at every few bytecodes
+        try:
+            thread = threading.Thread(target=prefetch)
+            thread.start()
+            k = 0
+            while thread.is_alive():  # steps, and seeks which clear the visits
+                k += 1
+                cache.moveTo(k % 3 + (0 if k % 100 else 900))
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(errors, [])
+        cache.stop()
+
+    def test_invalidate(self):
+        gate = threading.Event()
+        cache = ArrayCache(100, budget=5 * FRAME_BYTES, gate=gate)
+        cache.frameBytes = FRAME_BYTES
+        cache[20] = array2qimage(np.full((8, 8), 20, dtype=np.uint8))
+        cache.moveTo(10)
+        while not cache.pending[10].running():
+            time.sleep(0.01)
+
+        # the frame stored and the one being decoded are of the old generation, neither is kept
+        cache.offset = 100
+        cache.invalidate()
+        self.assertNotIn(20, cache)
+        self.assertEqual(cache.nbytes, 0)
+        gate.set()
+        cache.settle()
+        self.assertEqual(sorted(cache.data), [9, 10, 11, 12, 13])
+        self.assertEqual([cache.peek(i).pixelColor(0, 0).red() for i in sorted(cache.data)], [109, 110, 111, 112, 113])
+
+        # nor is a frame decoded inline across an invalidation
+        cache.stop()
+        decodeFile = cache.decodeFile
+
+        def invalidated(i):
+            cache.generation += 1  # as invalidate() does while the frame is decoded
+            return decodeFile(i)
+
+        cache.decodeFile = invalidated
+        cache.load_each(50)
+        self.assertNotIn(50, cache)
+
+    def test_queued(self):
+        cache = ArrayCache(100, budget=50 * FRAME_BYTES, delay=0.05)
+        cache.frameBytes = FRAME_BYTES
+        cache.moveTo(0)
+        self.assertIn(45, cache.pending)
+
+        # a frame queued far behind the prefetching is decoded at once, not after the 45 before it
+        start = time.time()
+        self.assertEqual(cache[45].pixelColor(0, 0).red(), 45)
+        self.assertLess(time.time() - start, 0.5)
+        cache.stop()
+
+class TestPreviewCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.imgList = []
+        for i, ext in enumerate(['jpg', 'png']):
+            path = os.path.join(self.dir, 'exp_{:04d}.{}'.format(i, ext))
+            cv2.imwrite(path, np.full((64, 48), 100 + i, dtype=np.uint8))
+            self.imgList.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_preview(self):
+        previews = PreviewCache(self.imgList, workers=1, scale=0.25)
+        self.assertEqual((previews[0].width(), previews[0].height()), (12, 16))
+        self.assertEqual((previews.fullSize(0).width(), previews.fullSize(0).height()), (48, 64))
+        # a png is not decoded at a smaller size, so its preview is the full frame
+        self.assertEqual(previews[1].size(), previews.fullSize(1))
+        previews.stop()
+
+        # from the disk cache, the full size is read from the header when it is asked for
+        diskCache = DiskCache(os.path.join(self.dir, 'cache'))
+        previews = PreviewCache(self.imgList, workers=1, diskCache=diskCache, scale=0.25)
+        previews.load_each(0)
+        previews.stop()
+        previews = PreviewCache(self.imgList, workers=1, diskCache=diskCache, scale=0.25)
+        self.assertEqual(previews.load_each(0).width(), 12)
+        self.assertNotIn(0, previews.sizes)
+        self.assertEqual(previews.fullSize(0).width(), 48)
+        previews.stop()
+
+        frames = np.zeros((2, 64, 48), dtype=np.uint8)
+        previews = PreviewCache(self.imgList, workers=1, frameStore=frames, scale=0.25)
+        self.assertEqual(previews.load_each(1).width(), 12)
+        self.assertEqual(previews.fullSize(1).width(), 48)
+        previews.stop()
+
+    def test_full_frame(self):
+        # as the window does: show the preview, then swap in the full frame once the cache loaded it
+        cache = Cache(self.imgList, workers=1)
+        previews = PreviewCache(self.imgList, workers=1, scale=0.25)
+        shown = [previews[0]]
+        loaded = threading.Event()
+
+        def fullFrameLoaded(i):
+            if i == 0 and shown[-1].size() != previews.fullSize(0):
+                shown.append(cache.peek(0))
+                loaded.set()
+
+        app = QCoreApplication.instance() or QCoreApplication([])
+        cache.loaded.connect(fullFrameLoaded)  # queued to this thread, as to the GUI thread
+        cache.moveTo(0)
+        deadline = time.time() + 5
+        while not loaded.is_set() and time.time() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        self.assertEqual([image.width() for image in shown], [12, 48])
+        self.assertEqual(shown[-1].pixelColor(0, 0).red(), 100)
+        cache.stop()
+        previews.stop()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+import libs.constants
+from libs.dirScanner import DirScanner
+
+class TestDirScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.dir, 'sub'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def touch(self, *names):
+        for name in names:
+            with open(os.path.join(self.dir, name), 'w') as f:
+                f.write(name)
+
+    def test_incremental(self):
+        self.touch('a.jpg', 'b.txt', os.path.join('sub', 'c.jpg'))
+        manifest = os.path.join(self.dir, 'manifest.json')
+        scanner = DirScanner(self.dir, ['.jpg'], manifestPath=manifest)
+        added, changed, removed = scanner.scan()
+        self.assertEqual(sorted(os.path.basename(p) for p in added), ['a.jpg', 'c.jpg'])
+        scanner.save()
+
+        # a new session starts from the manifest and finds only the differences
+        os.remove(os.path.join(self.dir, 'a.jpg'))
+        self.touch(os.path.join('sub', 'd.jpg'))
+        scanner = DirScanner(self.dir, ['.jpg'], manifestPath=manifest)
+        added, changed, removed = scanner.scan()
+        self.assertEqual([os.path.basename(p) for p in added], ['d.jpg'])
+        self.assertEqual([os.path.basename(p) for p in removed], ['a.jpg'])
+        self.assertEqual([os.path.basename(p) for p in scanner.paths()], ['c.jpg', 'd.jpg'])
+
+    def test_stat(self):
+        self.touch('a.xml')
+        scanner = DirScanner(self.dir, ['.xml'], stat=True)
+        scanner.scan()
+        path = os.path.join(self.dir, 'a.xml')
+        os.utime(path, ns=(0, 0))
+        self.assertEqual(scanner.scan([self.dir]), ([], [path], []))
+        shutil.rmtree(os.path.join(self.dir, 'sub'))
+        self.assertEqual(scanner.scan(), ([], [], []))
+
+if __name__ == '__main__':
+    unittest.main()
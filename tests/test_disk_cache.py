@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+import libs.constants
+from libs.diskCache import DiskCache
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = DiskCache(os.path.join(self.dir, 'cache'))
+        self.images = []
+        for i in range(3):
+            path = os.path.join(self.dir, '{}.png'.format(i))
+            with open(path, 'wb') as f:
+                f.write(b'image %d' % i)
+            self.images.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_key(self):
+        path = self.images[0]
+        key = self.cache.key(path, 'gray')
+        self.assertEqual(key, self.cache.key(path, 'gray'))
+        self.assertNotEqual(key, self.cache.key(path, 'preview-0.25'))
+        self.assertIsNone(self.cache.key(os.path.join(self.dir, 'missing.png'), 'gray'))
+        # a modified image is another entry
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+        self.assertNotEqual(key, self.cache.key(path, 'gray'))
+
+    def test_put_get(self):
+        array = np.arange(12, dtype=np.uint8).reshape(3, 4)
+        self.assertIsNone(self.cache.get(self.images[0], 'gray'))
+        self.assertTrue(self.cache.put(self.images[0], 'gray', array))
+        np.testing.assert_array_equal(self.cache.get(self.images[0], 'gray'), array)
+        self.assertIsNone(self.cache.get(self.images[0], 'preview-0.25'))
+        self.assertFalse(self.cache.put(os.path.join(self.dir, 'missing.png'), 'gray', array))
+
+    def test_trim(self):
+        array = np.zeros((32, 32), dtype=np.uint8)
+        for path in self.images:
+            self.cache.put(path, 'gray', array)
+        entries = {path: self.cache.entryPath(self.cache.key(path, 'gray')) for path in self.images}
+        for t, path in enumerate(self.images):
+            os.utime(entries[path], (1000 + t, 1000 + t))
+        self.cache.get(self.images[0], 'gray')  # the oldest entry is used again
+
+        size = os.path.getsize(entries[self.images[0]])
+        self.cache.limit = 2.5 * size
+        self.cache.trim(ratio=0.9)
+        self.assertEqual([os.path.exists(entries[path]) for path in self.images], [True, False, True])
+        self.assertEqual(self.cache.nbytes, 2 * size)
+
+        self.cache.clear()
+        self.assertEqual(list(self.cache.entries()), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+import libs.constants
+import const
+from libs.frameStore import FrameStore, FrameStoreError
+
+class TestFrameStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.frames = [np.full((6, 8), 10 * i, dtype=np.uint8) for i in range(4)]
+        self.imgList = []
+        for i, frame in enumerate(self.frames):
+            path = os.path.join(self.dir, 'exp_{:04d}.png'.format(i))
+            cv2.imwrite(path, frame)
+            self.imgList.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_pack_open(self):
+        self.assertIsNone(FrameStore.open(self.imgList))
+        progress = []
+        store = FrameStore.pack(self.imgList, workers=2, progress=lambda done, total: progress.append(done))
+        self.assertEqual(progress, [4])
+        self.assertEqual(len(store), 4)
+        np.testing.assert_array_equal(store[2], self.frames[2])
+        np.testing.assert_array_equal(store.range(1, 3), self.frames[1:3])
+        self.assertEqual(store.index(self.imgList[3]), 3)
+
+        store = FrameStore.open(self.imgList)
+        self.assertIsNotNone(store)
+        self.assertTrue(store.matches(self.imgList))
+        self.assertFalse(store.matches(self.imgList[:3]))
+        self.assertFalse(store.matches(self.imgList[::-1]))
+
+    def test_stale(self):
+        FrameStore.pack(self.imgList)
+        cv2.imwrite(self.imgList[1], np.zeros((6, 8), dtype=np.uint8))
+        stat = os.stat(self.imgList[1])
+        os.utime(self.imgList[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNone(FrameStore.open(self.imgList))
+
+    def test_color(self):
+        cv2.imwrite(self.imgList[0], np.zeros((6, 8, 3), dtype=np.uint8))
+        with self.assertRaises(FrameStoreError):
+            FrameStore.pack(self.imgList)
+        cv2.imwrite(self.imgList[0], self.frames[0])
+        cv2.imwrite(self.imgList[2], np.zeros((6, 8, 3), dtype=np.uint8))
+        with self.assertRaises(FrameStoreError):
+            FrameStore.pack(self.imgList)
+        self.assertFalse(FrameStore.exists(self.dir))
+        self.assertFalse(os.path.exists(os.path.join(self.dir, const.FRAME_STORE_FILENAME + '.tmp')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+import os
+import sys
+import unittest
+
+import numpy as np
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.geometry import ellipseMetrics, diameters, outlines, boundingBoxes, areas, contains, overlaps, boxIou
+from libs.boxGrid import BoxGrid
+
+class TestGeometry(unittest.TestCase):
+
+    def test_ellipse_metrics(self):
+        points = [[(0, 10), (40, 10), (20, 0), (20, 10)],
+                  [(0, 0), (6, 8), (6, 0), (0, 8)],
+                  [(0, 0), (10, 0), (0, 1), (10, 1)]]
+        metrics = ellipseMetrics(points)
+        np.testing.assert_allclose(metrics.diameter, [20, 10, 10])
+        np.testing.assert_allclose(metrics.longAxis, [40, 10, 10])
+        np.testing.assert_allclose(metrics.roundness, [0.25, 1, 1])
+        np.testing.assert_allclose(metrics.center[:2], [(20, 10), (3, 4)])
+        self.assertTrue(np.all(np.isnan(metrics.center[2])))
+        np.testing.assert_allclose(diameters(points[0]), [20])
+        with self.assertRaises(ValueError):
+            diameters([(0, 0), (1, 1)])
+
+
+    def test_outlines(self):
+        shapes = outlines(['ellipse', 'box', 'line', 'polygon'],
+                          [[(0, 10), (40, 10), (20, 0), (20, 20)],
+                           [(30, 5), (50, 5), (50, 15), (30, 15)],
+                           [(100, 0), (110, 10)],
+                           [(0, 0), (10, 0), (10, 10), (5, 2), (0, 10)]])
+        np.testing.assert_allclose(boundingBoxes(shapes), [(0, 0, 40, 20), (30, 5, 50, 15), (100, 0, 110, 10), (0, 0, 10, 10)])
+        np.testing.assert_allclose(areas(shapes)[0], np.pi * 20 * 10, rtol=0.01)
+        np.testing.assert_allclose(areas(shapes)[1:], [200, 0, 60])
+        self.assertEqual(contains(shapes, [(20, 10), (40, 10), (105, 5), (5, 8)]).tolist(), [True, True, False, False])
+
+        pairs = [(0, 1), (0, 2), (1, 3), (2, 3), (0, 3)]
+        a, b = zip(*pairs)
+        self.assertEqual(overlaps(shapes[list(a)], shapes[list(b)]).tolist(), [True, False, False, False, True])
+        # the corner of the box in the notch of the polygon touches none of its edges
+        notch = outlines(['box', 'polygon'], [[(4, 5), (6, 5), (6, 11), (4, 11)], [(0, 0), (10, 0), (10, 10), (5, 2), (0, 10)]])
+        self.assertEqual(overlaps(notch[:1], notch[1:]).tolist(), [False])
+        np.testing.assert_allclose(boxIou([(0, 0, 2, 2), (0, 0, 1, 1)], [(1, 1, 3, 3), (2, 2, 3, 3)]), [1 / 7., 0])
+
+    def test_box_grid(self):
+        rng = np.random.RandomState(0)
+        corners = rng.uniform(0, 1000, (500, 2))
+        boxes = np.hstack([corners, corners + rng.uniform(1, 40, (500, 2))])
+        boxes[0] = (0, 0, 1000, 1000)
+        grid = BoxGrid(boxes)
+        for box in [(100, 100, 130, 120), (500, 500, 500, 500), (-10, -10, 2000, 2000)]:
+            expected = [i for i, (x1, y1, x2, y2) in enumerate(boxes)
+                        if x1 <= box[2] and box[0] <= x2 and y1 <= box[3] and box[1] <= y2]
+            self.assertEqual(grid.query(box), expected)
+        self.assertEqual(BoxGrid([]).query((0, 0, 1, 1)), [])
+
+if __name__ == '__main__':
+    unittest.main()
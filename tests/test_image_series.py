@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+import os
+import sys
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.imageSeries import ImageSeries, frameOf
+
+class TestImageSeries(unittest.TestCase):
+
+    def setUp(self):
+        self.paths = ['/data/exp_0000.jpg', '/data/exp_0001.jpg', '/other/exp_0001.png', '/data/exp_0002.jpg']
+        self.series = ImageSeries(self.paths)
+
+    def test_list(self):
+        self.assertEqual(len(self.series), 4)
+        self.assertEqual(list(self.series), self.paths)
+        self.assertEqual(self.series[3], '/data/exp_0002.jpg')
+        self.assertIs(ImageSeries.of(self.series), self.series)
+        self.assertEqual(len(ImageSeries()), 0)
+
+    def test_index(self):
+        self.assertEqual(self.series.index('/other/exp_0001.png'), 2)
+        self.assertEqual(self.series.index('/data/./exp_0002.jpg'), 3)  # normalized
+        self.assertIn('/data/exp_0000.jpg', self.series)
+        self.assertNotIn('/data/exp_0003.jpg', self.series)
+        with self.assertRaises(ValueError):
+            self.series.index('/data/exp_0003.jpg')
+        self.assertEqual(self.series.get('/data/exp_0001.jpg'), 1)
+        self.assertIsNone(self.series.get('/data/exp_0003.jpg'))
+        self.assertEqual(self.series.get('/data/exp_0003.jpg', -1), -1)
+
+    def test_stem(self):
+        self.assertEqual(self.series.indexOfStem('/save/exp_0002.xml'), 3)
+        self.assertEqual(self.series.indexOfStem('/save/exp_0001.xml'), 1)  # the first image of the stem
+        self.assertIsNone(self.series.indexOfStem('/save/exp_0003.xml'))
+        self.assertEqual(frameOf('/save/exp_0012.xml'), 12)
+        self.assertIsNone(frameOf('/save/background.jpg'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+import os
+import sys
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.labelledFrames import LabelledFrames
+
+class TestLabelledFrames(unittest.TestCase):
+
+    def test_navigation(self):
+        imgs = ['/data/exp_%04d.jpg' % i for i in range(10)]
+        frames = LabelledFrames(imgs, {
+            '/save/exp_0002.xml': [('drop', 'ellipse')],
+            '/save/exp_0005.xml': [('Broken', 'box'), ('drop', 'ellipse')],
+            '/save/exp_0007.xml': [],
+            '/save/other_0001.xml': [('drop', 'ellipse')],
+        })
+        self.assertEqual(list(frames), [2, 5, 7])
+        self.assertEqual(frames.next(2), 5)
+        self.assertEqual(frames.prev(2), None)
+        self.assertEqual(frames.next(0, label='Broken'), 5)
+        self.assertEqual(frames.next(5, label='drop'), None)
+        self.assertEqual(frames.prev(9, shapeType='ellipse'), 5)
+        self.assertEqual(frames.next(0, label='drop', shapeType='box'), 5)
+        self.assertEqual(frames.prev(5, label='drop', shapeType='box'), None)
+
+        frames.set('/save/exp_0008.xml', [('Broken', 'box')])
+        frames.remove('/save/exp_0005.xml')
+        self.assertEqual(list(frames), [2, 7, 8])
+        self.assertEqual(frames.next(0, label='Broken'), 8)
+        self.assertEqual(frames.labels(), ['Broken', 'drop'])
+
+if __name__ == '__main__':
+    unittest.main()
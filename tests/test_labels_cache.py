@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+import libs.constants
+from libs.labelsCache import LabelsCache
+from annotationFiles import writeAnnotation
+
+BOX = [(1, 1), (5, 1), (5, 5), (1, 5)]
+
+class TestLabelsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.imgList = [os.path.join(self.dir, 'exp_{:04d}.jpg'.format(i)) for i in range(10)]
+        for i in range(10):
+            if i != 3:
+                self.write(i, 'drop {}'.format(i))
+        self.cache = LabelsCache(self.imgList, saveDir=self.dir, radius=2, size=5)
+
+    def tearDown(self):
+        self.cache.stop()
+        shutil.rmtree(self.dir)
+
+    def write(self, i, label, verified=False):
+        name = os.path.splitext(os.path.basename(self.imgList[i]))[0]
+        return writeAnnotation(self.dir, name, [('box', label, BOX)], imgPath=self.imgList[i], verified=verified)
+
+    def test_read(self):
+        records, verified = self.cache.records(2)
+        self.assertEqual([(shapeType, label, points) for shapeType, label, points, _, _, _ in records],
+                         [('box', 'drop 2', BOX)])
+        self.assertFalse(verified)
+        self.assertIs(self.cache.records(2)[0], records)  # parsed once
+        self.assertEqual(self.cache.records(3), ([], False))
+        self.assertIsNone(self.cache[3])
+
+        # a file saved again is parsed again
+        path = self.write(2, 'drop', verified=True)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        records, verified = self.cache.records(2)
+        self.assertEqual(records[0][1], 'drop')
+        self.assertTrue(verified)
+
+    def test_delitem(self):
+        records, _ = self.cache.records(4)
+        del self.cache[4]
+        self.assertNotIn(self.cache.annotationPath(4), self.cache.entries)
+        self.assertIsNot(self.cache.records(4)[0], records)
+        del self.cache[5]  # nothing cached, nothing to forget
+
+    def test_read_around(self):
+        self.assertEqual(self.cache.order(1), [1, 2, 0, 3])
+        self.cache.moveTo(4)
+        self.cache.future.result()
+        self.assertEqual(sorted(self.cache.entries), [self.cache.annotationPath(i) for i in (2, 4, 5, 6)])
+
+        # beyond `size` the oldest entries away from the current frame are forgotten
+        for i in (8, 0):
+            self.cache.moveTo(i)
+            self.cache.future.result()
+            self.assertLessEqual(len(self.cache.entries), self.cache.size)
+            for j in self.cache.order(i):
+                if j != 3:
+                    self.assertIn(self.cache.annotationPath(j), self.cache.entries)
+        self.assertNotIn(self.cache.annotationPath(4), self.cache.entries)
+
+if __name__ == '__main__':
+    unittest.main()
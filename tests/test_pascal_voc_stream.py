@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+import libs.constants
+from libs.pascal_voc_io import PascalVocWriter, PascalVocReader, PascalVocStreamReader, PascalVocParseError
+
+class TestPascalVocStream(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'exp_0001.xml')
+        writer = PascalVocWriter('tests', 'exp_0001', (512, 512, 1), localImgPath='exp_0001.jpg')
+        writer.verified = True
+        writer.addShape('ellipse', 'drop', [(0, 10.5), (40, 10), (20, 0), (20, 10)], 1)
+        writer.addShape('box', 'Broken', [(1, 1), (5, 1), (5, 5), (1, 5)], 0)
+        writer.save(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_stream(self):
+        reader = PascalVocStreamReader(self.path, dtype=float)
+        shapes = list(reader)
+        self.assertTrue(reader.verified)
+        self.assertEqual([(shapeType, label, difficult) for shapeType, label, _, difficult in shapes],
+                         [('ellipse', 'drop', True), ('box', 'Broken', False)])
+        self.assertEqual(shapes[0][2].shape, (4, 2))
+        np.testing.assert_allclose(shapes[0][2][0], [0, 10.5])
+
+        reader = PascalVocReader(self.path)
+        self.assertIsNone(reader.error)
+        self.assertEqual(reader.getShapes()[0][2], [(0, 10), (40, 10), (20, 0), (20, 10)])
+
+    def test_malformed(self):
+        with open(self.path) as f:
+            content = f.read()
+        with open(self.path, 'w') as f:
+            f.write(content[:content.rindex('<object>')])
+        with self.assertRaises(PascalVocParseError):
+            list(PascalVocStreamReader(self.path))
+        reader = PascalVocReader(self.path)
+        self.assertIsInstance(reader.error, PascalVocParseError)
+        self.assertEqual([shape[1] for shape in reader.getShapes()], ['drop'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+import libs.constants
+import const
+from libs.preprocessing import PreprocessThread
+
+class TestPreprocessThread(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.imgList = []
+        for i in range(6):
+            path = os.path.join(self.dir, 'exp_{:04d}.png'.format(i))
+            frame = np.full((8, 8), 50, dtype=np.uint8)
+            frame[:4] = 10 * i
+            cv2.imwrite(path, frame)
+            self.imgList.append(path)
+        self.preprocessor = PreprocessThread(self.imgList, beta=1.)
+
+    def tearDown(self):
+        self.preprocessor.stop()
+        shutil.rmtree(self.dir)
+
+    def stored(self):
+        cache = self.preprocessor.cache
+        return cache.generation, sorted(cache.data)
+
+    def test_raw_until_background(self):
+        frame = self.preprocessor.load_origin(2)
+        np.testing.assert_array_equal(self.preprocessor.backgroundSubtraction(frame), frame)
+        self.preprocessor.setBackground(np.full((8, 8), 50, dtype=np.float64))
+        np.testing.assert_array_equal(self.preprocessor.backgroundSubtraction(frame), abs(frame - 50.))
+
+    def test_invalidate(self):
+        cache = self.preprocessor.cache
+        cache[0] = self.preprocessor.process(0)
+        generation, frames = self.stored()
+        self.assertEqual(frames, [0])
+
+        # whatever changes the preprocessed frames drops those of the old generation
+        self.preprocessor.setBackground(np.full((8, 8), 50, dtype=np.float64))
+        self.assertEqual(self.stored(), (generation + 1, []))
+        cache[0] = self.preprocessor.process(0)
+        self.preprocessor.setBeta(0.5)
+        self.assertEqual(self.stored(), (generation + 2, []))
+        cache[0] = self.preprocessor.process(0)
+        self.preprocessor.setMode(const.PREPROCESS_MODE_ROLLING)
+        self.assertEqual(self.stored(), (generation + 3, []))
+        cache[0] = self.preprocessor.process(0)
+        self.preprocessor.setMode(const.PREPROCESS_MODE_ROLLING)  # unchanged
+        self.assertEqual(self.stored(), (generation + 3, [0]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+import os
+import sys
+import unittest
+
+import numpy as np
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+import libs.constants
+from libs.annotationSnapshot import tableToDataFrame
+from libs.statisticalReport import NumDensityReporter, TrackReporter
+
+def ellipse(x, d):
+    d *= 10
+    return [(x - d / 2., 0), (x + d / 2., 0), (x, -d / 2.), (x, d / 2.)]
+
+class TestStatisticalReport(unittest.TestCase):
+
+    def setUp(self):
+        rows = [('/d/a_0001.xml', 'a', 'Broken', ellipse(0, 4)),
+                ('/d/a_0002.xml', 'a', 'Broken 0', ellipse(0, 1)),
+                ('/d/a_0002.xml', 'a', 'Broken 2', ellipse(5, 3)),
+                ('/d/a_0002.xml', 'a', 'Broken 1', ellipse(9, 2)),
+                ('/d/a_0002.xml', 'a', 'drop', ellipse(20, 6)),
+                ('/d/b_0001.xml', 'b', 'Broken', ellipse(0, 4)),
+                ('/d/b_0002.xml', 'b', 'Broken 0', ellipse(0, 1))]
+        self.shapes_df = tableToDataFrame({
+            'path': [row[0] for row in rows], 'subdir': [row[1] for row in rows], 'frame': [1] * len(rows),
+            'verified': [False] * len(rows), 'mtime_ns': [0] * len(rows), 'idx': [0] * len(rows),
+            'shapeType': ['ellipse'] * len(rows), 'label': [row[2] for row in rows],
+            'points': [row[3] for row in rows], 'diameter': [float(row[3][1][0] - row[3][0][0]) for row in rows],
+            'difficult': [False] * len(rows)})
+
+    def test_report_df(self):
+        report_df = NumDensityReporter.build_report_df(self.shapes_df, 2)
+        self.assertEqual(list(report_df['index']), [0, 0, 1, 2, 3, 0, 0])
+        self.assertEqual(list(report_df['diameter']), [80, 20, 60, 40, 120, 80, 20])
+
+    def test_broken(self):
+        easy_track_df = TrackReporter.build_easy_track_report_df(self.shapes_df, ['drop'])
+        self.assertEqual(len(easy_track_df), 6)
+        broken_info_dict = TrackReporter.get_broken_info(easy_track_df)
+        self.assertEqual(list(broken_info_dict), [3])
+        np.testing.assert_allclose(broken_info_dict[3][0], [10, 20, 30])
+
+        df_dict, summary_df = TrackReporter.get_broken_dfs(broken_info_dict)
+        np.testing.assert_allclose(df_dict[3]['diameter of mother drop'], [10 * 36 ** (1 / 3.)])
+        np.testing.assert_allclose(summary_df['drop_1'], [10, 10 * 9 ** (1 / 3.)])
+        np.testing.assert_allclose(summary_df['drop_2'], [20, 30])
+        np.testing.assert_allclose(summary_df['mothoer_drop'], [10 * 9 ** (1 / 3.), 10 * 36 ** (1 / 3.)])
+        np.testing.assert_allclose(summary_df['drop_2_frac'], [8 / 9., 27 / 36.])
+        self.assertEqual(list(summary_df['n_breakage']), [3, 3])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+import os
+import sys
+import unittest
+
+import numpy as np
+from PyQt5.QtCore import QPointF
+from collections import namedtuple
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+import libs.constants
+from libs.lib import struct
+from libs.imageSeries import ImageSeries
+from libs.trackReport import Trees, Tree, parsePoints, reportTrack
+
+ShapeObj = namedtuple('ShapeObj', ['i_img', 'label', 'shape'])
+
+class TestTrees(unittest.TestCase):
+
+    def test_get_node(self):
+        root, a, b, c = [ShapeObj(i, 'Broken 0', object()) for i in range(4)]
+        trees = Trees()
+        tree = Tree(root)
+        trees.append(tree)
+        self.assertEqual(trees.getNode(root), (tree, tree.root))
+        self.assertEqual(trees.getNode(a), (None, None))
+
+        node_a = trees.addKid(tree, tree.root, a)
+        node_b = trees.addKid(tree, tree.root, b)
+        node_c = trees.addKid(tree, node_a, c)
+        trees.addKid(tree, node_b, c)  # c is reached from a and b
+        self.assertEqual(trees.getNode(c), (tree, node_c))
+        self.assertEqual(node_c.i_layer, 2)
+        self.assertEqual(len(tree.members), 4)
+        self.assertIn(node_c, tree)
+        self.assertNotIn(Tree(a).root, tree)
+        self.assertEqual([[node.data for node in path] for path in tree.genPaths()], [[root, a, c]])
+
+    def test_stats(self):
+        def ellipse(i_img, a, b):
+            shape = struct(shapeType='ellipse', points=[QPointF(-a, 0), QPointF(a, 0), QPointF(0, -b), QPointF(0, b)])
+            return ShapeObj(i_img, 'Broken 0', shape)
+        root, a = ellipse(3, 10, 10), ellipse(4, 10, 10)
+        b, c, d = ellipse(5, 8, 4), ellipse(5, 6, 6), ellipse(6, 6, 5)
+        trees = Trees()
+        tree = Tree(root)
+        trees.append(tree)
+        node_a = trees.addKid(tree, tree.root, a)
+        node_b = trees.addKid(tree, node_a, b)
+        trees.addKid(tree, node_a, c)
+        self.assertEqual(tree.stats().n_breakage, 2)
+        trees.addKid(tree, node_b, d)  # drops the cached stats
+
+        stat, = trees.stats()
+        self.assertIs(stat, tree.stats())
+        self.assertEqual((stat.n_breakage, stat.start, stat.end), (2, 3, 7))
+        self.assertEqual([leaf.data for leaf in stat.leaves], [c, d])
+        self.assertEqual(stat.fork_depths, [1, 1])
+        # the roundest ellipse below the fork: c itself, and d rather than b
+        np.testing.assert_allclose(stat.diameters, [12, 2 * np.sqrt(30)])
+
+    def test_parse_points(self):
+        self.assertEqual(parsePoints('[(1, 2.5), (-3.0, 4e1)]'), [(1, 2.5), (-3, 40)])
+
+    def test_no_images(self):
+        for imgList in (None, [], ImageSeries()):  # before a dir is opened
+            self.assertFalse(hasattr(reportTrack(imgList), 'imgPathList'))
+
+if __name__ == '__main__':
+    unittest.main()
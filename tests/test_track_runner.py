@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+import libs.constants
+from libs.trackRunner import runCampaign, writeCsvs, campaignSheets
+from annotationFiles import writeAnnotation
+
+def ellipse(x, d):
+    return [(x - d / 2, 100), (x + d / 2, 100), (x, 100 - d / 2), (x, 100 + d / 2)]
+
+class TestTrackRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        # a drop breaks in two in each experiment, the pieces of 'a' drifting apart over two frames
+        self.write('a_0001', [('Broken 0', ellipse(100, 40)), ('drop', ellipse(300, 20))])
+        self.write('a_0002', [('Broken', ellipse(100, 40)), ('Broken 1', ellipse(90, 20)),
+                              ('Broken 2', ellipse(115, 30))])
+        self.write('a_0003', [('Broken 3', ellipse(80, 20)), ('Broken 4', ellipse(125, 30))])
+        self.write('b_0001', [('Broken 0', ellipse(200, 50))])
+        self.write('b_0002', [('Broken', ellipse(200, 50)), ('Broken 1', ellipse(180, 20)),
+                              ('Broken 2', ellipse(220, 40))])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, shapes):
+        writeAnnotation(self.dir, name, [('ellipse', label, points) for label, points in shapes])
+
+    def test_campaign(self):
+        df_dict, summary_df, experiments_df, tracks_df = runCampaign(self.dir, ['drop'], workers=1)
+        self.assertEqual(list(experiments_df['subdir']), ['a', 'b'])
+        self.assertEqual(list(experiments_df['n_shapes']), [6, 4])
+        self.assertEqual(sorted(df_dict), [3, 5])
+        np.testing.assert_allclose(df_dict[3].iloc[0, :3], [50, 20, 40])
+        self.assertEqual(list(tracks_df['subdir']), ['a', 'b'])
+        self.assertEqual(list(tracks_df['n_breakage']), [2, 3])
+        self.assertEqual(list(tracks_df['start']), [1, 1])
+        self.assertEqual(list(tracks_df['end']), [4, 3])
+
+        # the same tables from a pool of processes, one experiment each
+        pooled = runCampaign(self.dir, ['drop'], workers=2)
+        for n_breakage, df in df_dict.items():
+            np.testing.assert_allclose(pooled[0][n_breakage], df)
+        for df, pooled_df in zip((summary_df, experiments_df, tracks_df), pooled[1:]):
+            self.assertTrue(df.equals(pooled_df))
+
+        outDir = os.path.join(self.dir, 'summary')
+        writeCsvs(outDir, campaignSheets(df_dict, summary_df, experiments_df, tracks_df))
+        self.assertEqual(sorted(os.listdir(outDir)),
+                         ['broken_3.csv', 'broken_5.csv', 'experiments.csv', 'summary.csv', 'tracks.csv'])
+
+if __name__ == '__main__':
+    unittest.main()